@@ -156,10 +156,20 @@ def on_load(server: PluginServerInterface, old):
     
     # 初始化聊天消息监听器
     try:
-        from .utils.chat_logger import ChatLogger
+        from .utils.chat_logger import get_chat_logger
         from .utils.utils import create_chat_logger_status_rtext
         global chat_logger
-        chat_logger = ChatLogger()
+        chat_logger = get_chat_logger()
+        chat_logger.configure(
+            write_behind=plugin_config.get('chat_write_behind', DEFALUT_CONFIG['chat_write_behind']),
+            flush_interval_ms=plugin_config.get('chat_flush_interval_ms', DEFALUT_CONFIG['chat_flush_interval_ms']),
+            flush_batch=plugin_config.get('chat_flush_batch', DEFALUT_CONFIG['chat_flush_batch']),
+            durability=plugin_config.get('chat_durability', DEFALUT_CONFIG['chat_durability']),
+            segment_size_mb=plugin_config.get('chat_segment_size_mb', DEFALUT_CONFIG['chat_segment_size_mb']),
+            retention_days=plugin_config.get('chat_retention_days', DEFALUT_CONFIG['chat_retention_days']),
+            retention_mb=plugin_config.get('chat_retention_mb', DEFALUT_CONFIG['chat_retention_mb']),
+            retention_messages=plugin_config.get('chat_retention_messages', DEFALUT_CONFIG['chat_retention_messages'])
+        )
         status_msg = create_chat_logger_status_rtext('init', True)
         server.logger.info(status_msg)
     except Exception as e:
@@ -460,6 +470,29 @@ def on_unload(server: PluginServerInterface):
     except Exception as e:
         server.logger.warning(f"停止日志捕获器时出错: {e}")
     
+    # 停止UUID在线查询线程
+    try:
+        from .utils.uuid_resolver import close_uuid_resolver
+        close_uuid_resolver()
+    except Exception as e:
+        server.logger.warning(f"停止UUID查询线程时出错: {e}")
+
+    # 停止在线状态刷新线程
+    try:
+        from .utils.presence import close_presence_service
+        close_presence_service()
+    except Exception as e:
+        server.logger.warning(f"停止在线状态服务时出错: {e}")
+
+    # 停止事件循环卡顿检测并关闭阻塞操作线程池
+    try:
+        from .web_server import loop_lag_monitor
+        from .utils.executor import close_blocking_executor
+        loop_lag_monitor.stop()
+        close_blocking_executor()
+    except Exception as e:
+        server.logger.warning(f"关闭线程池时出错: {e}")
+
     # 停止Web服务器（仅在独立模式下需要）
     try:
         if 'web_server_interface' in globals() and web_server_interface:
@@ -532,7 +565,24 @@ def on_unload(server: PluginServerInterface):
             server.logger.warning(f"清理asyncio资源时出错: {e}")
     except ImportError:
         pass
-        
+
+    # Web服务器停止后不会再有新的请求，此时写入尚未落盘的聊天记录，
+    # 避免关闭后到达的请求重新创建未配置的聊天记录器
+    try:
+        from .utils.chat_logger import close_chat_logger
+        close_chat_logger()
+        server.logger.debug("聊天记录已写入")
+    except Exception as e:
+        server.logger.warning(f"写入聊天记录时出错: {e}")
+
+    # 写入用户数据库中尚未保存的修改（Web服务器停止后不会再有新的修改）
+    try:
+        from .utils.constant import user_db
+        user_db.close()
+        server.logger.debug("用户数据已写入")
+    except Exception as e:
+        server.logger.warning(f"写入用户数据时出错: {e}")
+
     # 强制清理环境
     try:
         import gc
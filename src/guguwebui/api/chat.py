@@ -8,31 +8,37 @@ import secrets
 import time
 import random
 import string
-import concurrent.futures
+import threading
+import json
 from typing import Dict, List, Any, Optional, Tuple
 
 from mcdreforged.api.all import PluginServerInterface, RText, RTextList, RColor
-from fastapi.responses import JSONResponse
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 from ..utils.constant import user_db, DEFALUT_CONFIG
-from ..utils.chat_logger import ChatLogger
+from ..utils.chat_logger import get_chat_logger, dumps_json, encode_messages, ChatMessage
+from ..utils.chat_search import ChatQuery, CHAT_SOURCES
+from ..utils.uuid_resolver import get_uuid_resolver
+from ..utils.presence import get_presence_service
+from ..utils.stream_hub import STREAM_CLOSED
+from ..utils.executor import run_blocking
 from ..utils.utils import (
     cleanup_chat_verifications, verify_password, hash_password,
-    get_player_uuid, create_chat_message_rtext, create_chat_logger_status_rtext,
-    get_java_server_info, get_bot_list
+    create_chat_message_rtext, create_chat_logger_status_rtext,
+    get_java_server_info
 )
 
 #============================================================#
 # 全局变量定义
-# Web在线玩家心跳（基于 /api/chat/get_new_messages 请求），值为最近心跳Unix秒
-WEB_ONLINE_PLAYERS: dict[str, int] = {}
+# 聊天推送参数
+CHAT_STREAM_KEEPALIVE = 15  # 无新消息时发送心跳的间隔（秒）
+CHAT_STREAM_PRESENCE_INTERVAL = 2  # 比较在线列表快照的间隔（秒）
 
-# RCON 在线玩家缓存，降低查询频率
-RCON_ONLINE_CACHE = {
-    "names": set(),
-    "ts": 0,      # 上次刷新时间（秒）
-    "dirty": False  # 标记需要刷新
-}
+# 发言速率限制：同一会话的最短发送间隔（毫秒），上次发送时间只保存在内存中
+CHAT_SEND_INTERVAL_MS = 2000
+_last_sent_ms: Dict[str, int] = {}
+_send_rate_lock = threading.Lock()
 
 #============================================================#
 # 验证码管理功能
@@ -107,10 +113,12 @@ def check_chat_verification_status(code: str) -> Dict[str, Any]:
     # 未绑定则尚未在游戏内验证
     return {"status": "error", "message": "验证码尚未在游戏内验证"}
 
-def set_chat_user_password(code: str, password: str, server: PluginServerInterface) -> Dict[str, Any]:
+async def set_chat_user_password(code: str, password: str, server: PluginServerInterface) -> Dict[str, Any]:
     """
     设置聊天页用户密码
 
+    只有密码哈希在线程池中执行，user_db 的读写都在事件循环中进行
+
     Args:
         code: 验证码
         password: 密码
@@ -149,9 +157,15 @@ def set_chat_user_password(code: str, password: str, server: PluginServerInterfa
 
     player_id = verification["player_id"]
 
+    password_hash = await run_blocking(hash_password, password)
+
+    # 哈希期间验证码可能已被其他请求使用，重新确认
+    if user_db["chat_verification"].get(code) is not verification:
+        return {"status": "error", "message": "验证码已被使用"}
+
     # 保存用户密码
     user_db["chat_users"][player_id] = {
-        "password": hash_password(password),
+        "password": password_hash,
         "created_time": str(datetime.datetime.now(datetime.timezone.utc))
     }
     user_db.save()
@@ -170,10 +184,12 @@ def set_chat_user_password(code: str, password: str, server: PluginServerInterfa
 
 #============================================================#
 # 用户认证功能
-def chat_user_login(player_id: str, password: str, client_ip: str, server: PluginServerInterface) -> Dict[str, Any]:
+async def chat_user_login(player_id: str, password: str, client_ip: str, server: PluginServerInterface) -> Dict[str, Any]:
     """
     聊天页用户登录
 
+    只有密码校验在线程池中执行，校验之后的IP限制检查和会话写入在事件循环中连续完成
+
     Args:
         player_id: 玩家ID
         password: 密码
@@ -195,9 +211,13 @@ def chat_user_login(player_id: str, password: str, client_ip: str, server: Plugi
         return {"status": "error", "message": "用户不存在"}
 
     # 验证密码
-    if not verify_password(password, user_db["chat_users"][player_id]["password"]):
+    if not await run_blocking(verify_password, password, user_db["chat_users"][player_id]["password"]):
         return {"status": "error", "message": "密码错误"}
 
+    # 校验期间用户可能已被删除
+    if player_id not in user_db["chat_users"]:
+        return {"status": "error", "message": "用户不存在"}
+
     # 登录IP限制：同一玩家最多允许两个不同IP同时在线
     # 清理过期会话并统计该玩家的有效IP集合
     now_utc = datetime.datetime.now(datetime.timezone.utc)
@@ -242,8 +262,7 @@ def chat_user_login(player_id: str, password: str, client_ip: str, server: Plugi
     user_db["chat_sessions"][session_id] = {
         "player_id": player_id,
         "expire_time": str(expire_time),
-        "ip": client_ip,
-        "last_sent_ms": 0
+        "ip": client_ip
     }
     user_db.save()
 
@@ -328,7 +347,7 @@ def get_chat_messages_handler(limit: int = 50, offset: int = 0, after_id: Option
         Dict: 消息数据
     """
     # 导入聊天日志记录器
-    chat_logger = ChatLogger()
+    chat_logger = get_chat_logger()
 
     if after_id is not None:
         # 获取指定ID之后的新消息
@@ -340,39 +359,8 @@ def get_chat_messages_handler(limit: int = 50, offset: int = 0, after_id: Option
         # 兼容旧版本，使用offset方式
         messages = chat_logger.get_messages(limit, offset)
 
-    # 为消息补充UUID信息（优化版本 - 优先使用存储的UUID，减少网络查询）
-    try:
-        uuid_cache = {}
-        need_uuid_players = set()
-        
-        # 首先检查哪些消息需要补充UUID
-        for m in messages:
-            pid = m.get('player_id')
-            if pid and not m.get('is_plugin', False):  # 插件消息不需要UUID
-                if m.get('uuid') is None:  # 只有没有UUID的消息才需要查询
-                    need_uuid_players.add(pid)
-        
-        # 只对缺失UUID的玩家进行网络查询
-        if need_uuid_players:
-            for pid in need_uuid_players:
-                try:
-                    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-                        future = executor.submit(get_player_uuid, pid, server)
-                        uuid_val = future.result(timeout=0.5)  # 减少超时时间
-                except (concurrent.futures.TimeoutError, Exception):
-                    uuid_val = None
-                uuid_cache[pid] = uuid_val
-        
-        # 为缺失UUID的消息设置UUID
-        for m in messages:
-            pid = m.get('player_id')
-            if pid and m.get('uuid') is None and not m.get('is_plugin', False):
-                if pid in uuid_cache:
-                    m['uuid'] = uuid_cache[pid]
-                
-    except Exception:
-        # 静默失败，不影响消息返回
-        pass
+    # 为缺失UUID的消息补充UUID（只读缓存，不等待在线查询）
+    messages = _fill_missing_uuids(messages, server)
 
     return {
         "status": "success",
@@ -380,6 +368,27 @@ def get_chat_messages_handler(limit: int = 50, offset: int = 0, after_id: Option
         "has_more": len(messages) == limit
     }
 
+def _fill_missing_uuids(messages: List[Dict[str, Any]], server: PluginServerInterface = None) -> List[Dict[str, Any]]:
+    """
+    为没有UUID的玩家消息补充UUID
+
+    只查询 UUIDResolver 的缓存，未知的玩家由后台线程在线查询，之后的请求即可补全。
+    ChatMessage 由聊天记录缓存共享，补充时原地更新并重新缓存编码；其他字典复制后再修改。
+    """
+    resolver = get_uuid_resolver(server)
+    for i, m in enumerate(messages):
+        pid = m.get('player_id')
+        if not pid or m.get('uuid') is not None or m.get('is_plugin', False):
+            continue
+        uuid_val = resolver.resolve(pid, timeout=0)
+        if not uuid_val:
+            continue
+        if isinstance(m, ChatMessage):
+            m.set_uuid(uuid_val)
+        else:
+            messages[i] = {**m, 'uuid': uuid_val}
+    return messages
+
 def get_new_chat_messages_handler(after_id: int = 0, player_id_heartbeat: str = None,
                                    server: PluginServerInterface = None) -> Dict[str, Any]:
     """
@@ -394,127 +403,190 @@ def get_new_chat_messages_handler(after_id: int = 0, player_id_heartbeat: str =
         Dict: 新消息数据
     """
     # 导入聊天日志记录器
-    chat_logger = ChatLogger()
+    chat_logger = get_chat_logger()
 
     messages = chat_logger.get_new_messages(after_id)
 
-    # 为消息补充UUID信息（带超时处理）
-    try:
-        uuid_cache = {}
-
-        def get_uuid_with_timeout(player_id):
-            """带超时的UUID获取"""
-            try:
-                return get_player_uuid(player_id, server)
-            except Exception:
-                return None
-
-        # 为每个玩家并行获取UUID，单个玩家1秒超时
-        for m in messages:
-            pid = m.get('player_id')
-            if not pid:
-                continue
-            if pid in uuid_cache:
-                uuid_val = uuid_cache[pid]
-            else:
-                try:
-                    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-                        future = executor.submit(get_uuid_with_timeout, pid)
-                        uuid_val = future.result(timeout=1.0)  # 1秒超时
-                except (concurrent.futures.TimeoutError, Exception):
-                    uuid_val = None
-                uuid_cache[pid] = uuid_val
-            m['uuid'] = uuid_val
-    except Exception:
-        pass
+    # 为缺失UUID的消息补充UUID（只读缓存，不等待在线查询）
+    messages = _fill_missing_uuids(messages, server)
 
     # 记录Web在线心跳（+5秒）
-    try:
-        if isinstance(player_id_heartbeat, str) and player_id_heartbeat:
-            WEB_ONLINE_PLAYERS[player_id_heartbeat] = int(time.time()) + 5
-    except Exception:
-        pass
+    presence = get_presence_service(server)
+    presence.touch_web(player_id_heartbeat)
 
-    # 生成在线列表：游戏在线（通过 get_java_server_info），Web在线（通过心跳）
-    online_web = set(pid for pid, until in WEB_ONLINE_PLAYERS.items() if until >= int(time.time()))
-    online_game = set()
+    return {
+        "status": "success",
+        "messages": messages,
+        "last_message_id": chat_logger.get_last_message_id(),
+        "online": presence.snapshot()
+    }
 
-    # 快速获取服务器信息（1秒超时）
-    def get_server_info_with_timeout():
-        """带超时的服务器信息获取"""
-        try:
-            return get_java_server_info()
-        except Exception:
-            return {}
+def chat_json_response(result: Dict[str, Any], status_code: int = 200) -> Response:
+    """
+    把处理函数的结果编码为 JSON 响应
 
-    # 使用线程池执行器获取服务器信息，1秒超时
-    server_info = {}
-    try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(get_server_info_with_timeout)
-            server_info = future.result(timeout=1.0)  # 1秒超时
-    except (concurrent.futures.TimeoutError, Exception):
-        # 超时或异常时使用空字典
-        server_info = {}
-
-    # 快速RCON查询（1秒超时）
-    def get_rcon_online_players():
-        """带超时的RCON查询"""
-        try:
-            if hasattr(server, "is_rcon_running") and server.is_rcon_running():
-                now_sec = int(time.time())
-                if RCON_ONLINE_CACHE["dirty"] or (now_sec - int(RCON_ONLINE_CACHE["ts"]) >= 300):
-                    feedback = server.rcon_query("list")
-                    names = set()
-                    if isinstance(feedback, str) and ":" in feedback:
-                        names_part = feedback.split(":", 1)[1].strip()
-                        if names_part:
-                            for name in [n.strip() for n in names_part.split(",") if n.strip()]:
-                                names.add(name)
-                    RCON_ONLINE_CACHE["names"] = names
-                    RCON_ONLINE_CACHE["ts"] = now_sec
-                    RCON_ONLINE_CACHE["dirty"] = False
-                return set(RCON_ONLINE_CACHE["names"])
-        except Exception:
-            # RCON失败时保留旧缓存
-            return set(RCON_ONLINE_CACHE["names"])
-        return set()
+    消息列表直接拼接每条消息缓存的编码，其余字段单独序列化，避免每次请求重新序列化相同的消息
+    """
+    messages = result.get("messages")
+    if not isinstance(messages, list):
+        return JSONResponse(result, status_code=status_code)
+    rest = dumps_json({key: value for key, value in result.items() if key != "messages"})
+    body = b'{"messages":' + encode_messages(messages) + (b',' + rest[1:] if len(rest) > 2 else b'}')
+    return Response(content=body, status_code=status_code, media_type="application/json")
+
+def _format_chat_event(event: str, data: Any, event_id: Optional[int] = None) -> str:
+    """格式化 SSE 事件，消息事件的 ID 为该批最后一条消息的ID"""
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {event}\ndata: {payload}\n\n"
+
+def _format_messages_event(messages: list) -> bytes:
+    """格式化消息事件，直接拼接每条消息缓存的编码"""
+    return f"id: {messages[-1]['id']}\nevent: messages\ndata: ".encode() + encode_messages(messages) + b"\n\n"
+
+def _presence_delta(old: Dict[str, list], new: Dict[str, list]) -> Dict[str, Dict[str, list]]:
+    """计算两次在线列表之间的变化，没有变化的分类不出现在结果中"""
+    delta = {}
+    for kind, names in new.items():
+        before, after = set(old.get(kind, ())), set(names)
+        if before != after:
+            delta[kind] = {"joined": sorted(after - before), "left": sorted(before - after)}
+    return delta
+
+async def stream_chat_messages(request: Request, after_id: int = 0, player_id: str = "",
+                               server: PluginServerInterface = None):
+    """
+    通过 Server-Sent Events 推送新聊天消息和在线列表变化
 
-    # 使用线程池执行器，1秒超时
-    try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(get_rcon_online_players)
-            online_game = future.result(timeout=1.0)  # 1秒超时
-    except (concurrent.futures.TimeoutError, Exception):
-        # 超时或异常时使用缓存数据
-        online_game = set(RCON_ONLINE_CACHE["names"])
-
-    # 快速获取假人列表（1秒超时）
-    def get_bot_list_with_timeout():
-        """带超时的假人列表获取"""
+    先发送 after_id 之后的积压消息（after_id 为0时只推送之后的新消息）和完整的在线列表，
+    之后新消息写入时立即推送，在线列表每 CHAT_STREAM_PRESENCE_INTERVAL 秒比较一次共享快照，只推送变化。
+    连接期间 player_id 视为Web在线。浏览器自动重连时携带的 Last-Event-ID 请求头优先作为断点。
+    """
+    chat_logger = get_chat_logger()
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        after_id = int(last_event_id)
+    if after_id <= 0:
+        after_id = chat_logger.get_last_message_id()
+    heartbeat_player = player_id if isinstance(player_id, str) and player_id else None
+
+    # 先订阅再读取积压消息，避免两者之间写入的消息丢失
+    subscription = chat_logger.stream_hub.subscribe()
+
+    presence = get_presence_service(server)
+
+    def refresh_presence():
+        presence.touch_web(heartbeat_player, CHAT_STREAM_PRESENCE_INTERVAL + 5)
+        # 只读取内存快照，不执行任何查询
+        return presence.snapshot()
+
+    async def event_stream():
+        sent_id = after_id
         try:
-            return get_bot_list(server)
-        except Exception:
-            return []
+            yield "retry: 3000\n\n"
+
+            # 发送积压消息
+            while True:
+                messages = await run_blocking(chat_logger.get_new_messages, sent_id)
+                if not messages:
+                    break
+                sent_id = messages[-1]["id"]
+                yield _format_messages_event(messages)
+
+            online = refresh_presence()
+            yield _format_chat_event("online", online)
+            next_presence = time.monotonic() + CHAT_STREAM_PRESENCE_INTERVAL
+            last_sent = time.monotonic()
+
+            # 推送新消息和在线列表变化
+            while not subscription.overflowed:
+                timeout = max(0.0, next_presence - time.monotonic())
+                entry = await subscription.get(timeout)
+                if entry is STREAM_CLOSED:
+                    break
+
+                # 合并已到达的消息，减少写入次数
+                messages = []
+                closed = False
+                while entry is not None:
+                    if entry is STREAM_CLOSED:
+                        closed = True
+                        break
+                    # 跳过积压阶段已发送的消息
+                    if entry["id"] > sent_id:
+                        messages.append(entry)
+                        sent_id = entry["id"]
+                    entry = subscription.get_nowait()
+                if messages:
+                    yield _format_messages_event(messages)
+                    last_sent = time.monotonic()
+                if closed:
+                    break
+
+                if time.monotonic() >= next_presence:
+                    next_presence = time.monotonic() + CHAT_STREAM_PRESENCE_INTERVAL
+                    if await request.is_disconnected():
+                        break
+                    current = refresh_presence()
+                    delta = _presence_delta(online, current)
+                    online = current
+                    if delta:
+                        yield _format_chat_event("presence", delta)
+                        last_sent = time.monotonic()
+                    elif time.monotonic() - last_sent >= CHAT_STREAM_KEEPALIVE:
+                        yield ": keep-alive\n\n"
+                        last_sent = time.monotonic()
+            # 订阅队列溢出或插件重载时结束连接，由客户端携带断点重连补齐
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def search_chat_messages_handler(player: str = "", q: str = "", source: str = "",
+                                 since: Optional[float] = None, until: Optional[float] = None,
+                                 before_id: int = 0, limit: int = 50) -> Dict[str, Any]:
+    """
+    搜索聊天记录
 
-    # 使用线程池执行器获取假人列表，1秒超时
-    try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(get_bot_list_with_timeout)
-            online_bot = future.result(timeout=1.0)  # 1秒超时
-    except (concurrent.futures.TimeoutError, Exception):
-        # 超时或异常时使用空列表
-        online_bot = []
+    Args:
+        player: 玩家ID（插件消息为插件ID），不区分大小写
+        q: 消息内容包含的关键词，不区分大小写
+        source: 消息来源 game / webui / plugin
+        since: 起始时间（Unix秒）
+        until: 结束时间（Unix秒）
+        before_id: 只搜索ID小于该值的消息，用于翻页
+        limit: 最大返回条数
 
+    Returns:
+        Dict: 搜索结果，消息按ID从新到旧排列
+    """
+    if source and source.strip().lower() not in CHAT_SOURCES:
+        return {"status": "error", "message": f"未知的消息来源: {source}，可选 {' / '.join(CHAT_SOURCES)}"}
+
+    chat_logger = get_chat_logger()
+    if not chat_logger.search_ready:
+        return {"status": "error", "message": "聊天记录索引正在重建，请稍后重试", "indexing": True}
+
+    query = ChatQuery(
+        player=player,
+        keyword=q,
+        source=source,
+        since_ms=int(since * 1000) if since is not None else None,
+        until_ms=int(until * 1000) if until is not None else None,
+    )
+    # 限制单次返回条数
+    limit = max(1, min(limit, 500))
+    result = chat_logger.search_messages(query, before_id, limit)
     return {
         "status": "success",
-        "messages": messages,
-        "last_message_id": chat_logger.get_last_message_id(),
-        "online": {
-            "web": list(online_web),
-            "game": list(online_game),
-            "bot": online_bot
-        }
+        "messages": result["messages"],
+        "count": len(result["messages"]),
+        "next_before_id": result["next_before_id"],
+        "has_more": result["next_before_id"] > 0
     }
 
 def clear_chat_messages_handler(server: PluginServerInterface = None) -> Dict[str, Any]:
@@ -528,7 +600,7 @@ def clear_chat_messages_handler(server: PluginServerInterface = None) -> Dict[st
         Dict: 清空结果
     """
     # 导入聊天日志记录器
-    chat_logger = ChatLogger()
+    chat_logger = get_chat_logger()
 
     # 清空消息
     chat_logger.clear_messages()
@@ -539,11 +611,13 @@ def clear_chat_messages_handler(server: PluginServerInterface = None) -> Dict[st
 
     return {"status": "success", "message": "聊天消息已清空"}
 
-def send_chat_message_handler(message: str, player_id: str, session_id: str,
-                            server: PluginServerInterface = None) -> Dict[str, Any]:
+async def send_chat_message_handler(message: str, player_id: str, session_id: str,
+                                    server: PluginServerInterface = None) -> Dict[str, Any]:
     """
     发送聊天消息到游戏
 
+    会话检查在事件循环中进行，查询服务器状态和写入聊天记录在线程池中执行
+
     Args:
         message: 消息内容
         player_id: 玩家ID
@@ -575,17 +649,15 @@ def send_chat_message_handler(message: str, player_id: str, session_id: str,
         return {"status": "error", "message": "会话已过期，请重新登录"}
 
     # 发言速率限制：同一会话2秒/条
-    try:
-        now_ms = int(datetime.datetime.now(datetime.timezone.utc).timestamp() * 1000)
-        last_ms = int(session.get("last_sent_ms") or 0)
-        if now_ms - last_ms < 2000:
+    now_ms = int(time.time() * 1000)
+    with _send_rate_lock:
+        if now_ms - _last_sent_ms.get(session_id, 0) < CHAT_SEND_INTERVAL_MS:
             return {"status": "error", "message": "发送过于频繁，请稍后再试"}
         # 通过频控，更新发送时间
-        session["last_sent_ms"] = now_ms
-        user_db.save()
-    except Exception:
-        # 出现异常不影响正常发送
-        pass
+        _last_sent_ms[session_id] = now_ms
+        if len(_last_sent_ms) > 256:
+            for sid in [sid for sid, ms in _last_sent_ms.items() if now_ms - ms >= CHAT_SEND_INTERVAL_MS]:
+                del _last_sent_ms[sid]
 
     if not server:
         return {"status": "error", "message": "服务器接口不可用"}
@@ -598,7 +670,8 @@ def send_chat_message_handler(message: str, player_id: str, session_id: str,
     # 获取玩家UUID（如果可用）
     player_uuid = "未知"  # 默认值
     try:
-        player_uuid = get_player_uuid(player_id, server)
+        # 不等待在线查询，避免发送消息被网络请求阻塞
+        player_uuid = get_uuid_resolver(server).resolve(player_id, timeout=0)
         # 如果仍然没有找到UUID，设置为"未知"
         if not player_uuid:
             player_uuid = "未知"
@@ -628,7 +701,7 @@ def send_chat_message_handler(message: str, player_id: str, session_id: str,
 
     # 如果当前服务器内没有玩家在线，则仅记录，不下发到游戏
     try:
-        info = get_java_server_info()
+        info = await run_blocking(get_java_server_info)
         player_count_raw = info.get("server_player_count")
         player_count = int(player_count_raw) if player_count_raw is not None and str(player_count_raw).isdigit() else 0
     except Exception:
@@ -637,9 +710,9 @@ def send_chat_message_handler(message: str, player_id: str, session_id: str,
     if player_count <= 0:
         # 仅记录到聊天日志
         try:
-            chat_logger = ChatLogger()
+            chat_logger = get_chat_logger()
             # 记录RText格式的消息，标记为WebUI消息
-            chat_logger.add_message(player_id, message, rtext_data=rtext_message.to_json_object(), message_type=1, server=server)
+            await run_blocking(chat_logger.add_message, player_id, message, rtext_data=rtext_message.to_json_object(), message_type=1, server=server)
         except Exception as e:
             server.logger.warning(f"记录聊天消息失败: {e}")
         return {
@@ -651,16 +724,13 @@ def send_chat_message_handler(message: str, player_id: str, session_id: str,
     server.broadcast(rtext_message)
 
     # 记录Web在线心跳（发送者计为在线5秒）
-    try:
-        WEB_ONLINE_PLAYERS[player_id] = int(time.time()) + 5
-    except Exception:
-        pass
+    get_presence_service(server).touch_web(player_id)
 
     # 记录到聊天日志
     try:
-        chat_logger = ChatLogger()
+        chat_logger = get_chat_logger()
         # 记录RText格式的消息，标记为WebUI消息，这样前端显示时就能正确渲染
-        chat_logger.add_message(player_id, message, rtext_data=rtext_message.to_json_object(), message_type=1, server=server)
+        await run_blocking(chat_logger.add_message, player_id, message, rtext_data=rtext_message.to_json_object(), message_type=1, server=server)
     except Exception as e:
         server.logger.warning(f"记录聊天消息失败: {e}")
 
@@ -677,14 +747,16 @@ def send_chat_message_handler(message: str, player_id: str, session_id: str,
 # 事件处理功能
 def on_player_joined(server, player: str, info=None):
     """处理玩家加入事件"""
-    try:
-        RCON_ONLINE_CACHE["dirty"] = True
-    except Exception:
-        pass
+    get_presence_service(server).player_joined(player)
 
 def on_player_left(server, player: str):
     """处理玩家离开事件"""
-    try:
-        RCON_ONLINE_CACHE["dirty"] = True
-    except Exception:
-        pass
+    get_presence_service(server).player_left(player)
+
+def on_server_startup(server):
+    """处理服务器启动完成事件，立即通过 RCON 校正在线列表"""
+    get_presence_service(server).request_refresh()
+
+def on_server_stop(server, return_code: int):
+    """处理服务器停止事件，清空游戏在线列表"""
+    get_presence_service(server).server_stopped()
@@ -19,7 +19,8 @@ from ..utils.utils import (
     build_yaml_i18n_translations, get_comment, consistent_type_update,
     get_server_port
 )
-from ..utils.chat_logger import ChatLogger
+from ..utils.chat_logger import get_chat_logger
+from ..utils.executor import run_blocking
 from ..web_server import verify_token
 
 
@@ -54,7 +55,7 @@ async def get_web_config(
 
     # 获取聊天消息数量
     try:
-        chat_logger = ChatLogger()
+        chat_logger = get_chat_logger()
         chat_message_count = chat_logger.get_message_count()
 
         # 更新返回数据中的聊天消息数量
@@ -239,8 +240,13 @@ async def load_config(
             content={"success": False, "error": "服务器接口未提供"}
         )
 
+    # 文件读取和解析在线程池中执行，不阻塞事件循环
+    return await run_blocking(_load_config_file, path, translation, type_param, server.get_mcdr_language())
+
+
+def _load_config_file(path: str, translation: bool, type_param: str, mcdr_language: str) -> JSONResponse:
+    """读取并解析配置文件"""
     path_obj: Path = Path(path)
-    mcdr_language: str = server.get_mcdr_language()
 
     # 提取 config/chat_with_deepseek 目录
     config_dir = path_obj.parent
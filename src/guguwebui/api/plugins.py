@@ -14,6 +14,7 @@ from fastapi import status, Body, Depends
 from ..utils.constant import DEFALUT_CONFIG, toggleconfig, plugin_info
 from ..utils.PIM import create_installer
 from ..utils.utils import load_plugin_info, __copyFile, __copyFolder
+from ..utils.executor import run_blocking
 from ..web_server import verify_token
 
 
@@ -444,12 +445,12 @@ async def get_plugin_versions_v2(
         installer = plugin_installer
         if installer:
             server.logger.debug(f"使用已初始化的插件安装器获取版本信息")
-            versions = installer.get_plugin_versions(plugin_id, repo_url)
+            versions = await run_blocking(installer.get_plugin_versions, plugin_id, repo_url)
         else:
             # 如果没有预初始化的实例，创建临时安装器
             server.logger.info(f"使用临时创建的安装器获取版本信息")
             installer = create_installer(server)
-            versions = installer.get_plugin_versions(plugin_id, repo_url)
+            versions = await run_blocking(installer.get_plugin_versions, plugin_id, repo_url)
 
         # 记录结果
         if versions:
@@ -565,7 +566,7 @@ async def get_plugin_repository(
             server.logger.debug(f"api_get_plugin_repository: Checking repository: {repo_url}")
             try:
                 # 获取仓库元数据
-                meta_registry = pim_helper.get_cata_meta(source, ignore_ttl=False, repo_url=repo_url)
+                meta_registry = await run_blocking(pim_helper.get_cata_meta, source, ignore_ttl=False, repo_url=repo_url)
                 if not meta_registry or not hasattr(meta_registry, 'get_plugin_data'):
                     server.logger.debug(f"api_get_plugin_repository: Failed to get meta_registry or get_plugin_data for {repo_url}")
                     continue
@@ -865,7 +866,8 @@ async def get_online_plugins(
             is_configured_repo = repo_url in configured_repos
 
             # 使用PIM获取元数据，使用ignore_ttl=False以利用PIM的下载失败缓存逻辑
-            meta_registry = pim_helper.get_cata_meta(source, ignore_ttl=False, repo_url=repo_url)
+            # 缓存过期时需要下载仓库元数据，在线程池中执行
+            meta_registry = await run_blocking(pim_helper.get_cata_meta, source, ignore_ttl=False, repo_url=repo_url)
 
             # 如果没有获取到有效的仓库数据，直接返回空列表
             if not meta_registry or not hasattr(meta_registry, 'get_plugins') or not meta_registry.get_plugins():
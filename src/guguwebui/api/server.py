@@ -4,12 +4,18 @@
 """
 
 import datetime
+import json
+import re
 import traceback
+from typing import Optional
 from fastapi import Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi import status
 from ..utils.constant import server_control, user_db
+from ..utils.log_search import LogQuery
+from ..utils.stream_hub import STREAM_CLOSED
 from ..utils.utils import get_java_server_info
+from ..utils.executor import run_blocking
 from ..web_server import verify_token
 
 
@@ -50,7 +56,8 @@ async def get_server_status(
         return JSONResponse({"status": "error", "message": "Unauthorized"}, status_code=401)
 
     server_status = "online" if server.is_server_running() or server.is_server_startup() else "offline"
-    server_message = get_java_server_info()
+    # 缓存过期时需要查询服务器，在线程池中执行
+    server_message = await run_blocking(get_java_server_info)
 
     server_version = server_message.get("server_version", "")
     version_string = f"Version: {server_version}" if server_version else ""
@@ -115,9 +122,10 @@ async def get_server_logs(
     start_line: int = 0,
     max_lines: int = 100,
     server=None,
-    log_watcher=None
+    log_watcher=None,
+    before_counter: int = 0
 ) -> JSONResponse:
-    """获取服务器日志"""
+    """获取服务器日志，指定 before_counter 时返回该计数器之前的历史日志"""
     if not server:
         return JSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -129,6 +137,26 @@ async def get_server_logs(
         if max_lines > 500:
             max_lines = 500
 
+        # 向前翻页：从内存缓冲区和持久化分段中读取更早的日志
+        if before_counter > 0:
+            # 早于内存缓冲区的日志需要读取磁盘分段，在线程池中执行
+            result = await run_blocking(log_watcher.get_logs_before_counter, before_counter, max_lines)
+            return JSONResponse({
+                "status": "success",
+                "logs": [
+                    {
+                        "line_number": log["line_number"],
+                        "content": log["content"],
+                        "source": log["source"],
+                        "counter": log["counter"]
+                    }
+                    for log in result["logs"]
+                ],
+                "total_lines": result["total_lines"],
+                "first_counter": result["first_counter"],
+                "has_more": result["has_more"]
+            })
+
         # 获取合并日志
         result = log_watcher.get_merged_logs(max_lines)
 
@@ -187,7 +215,9 @@ async def get_new_logs(
             "logs": result["logs"],
             "total_lines": result["total_lines"],
             "last_counter": result["last_counter"],
-            "new_logs_count": result["new_logs_count"]
+            "new_logs_count": result["new_logs_count"],
+            "first_counter": result.get("first_counter", 1),
+            "missed_count": result.get("missed_count", 0)
         })
 
     except Exception as e:
@@ -200,6 +230,157 @@ async def get_new_logs(
         )
 
 
+async def search_logs(
+    request: Request,
+    q: str = "",
+    regex: bool = False,
+    case_sensitive: bool = False,
+    level: str = "",
+    source: str = "",
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    before_counter: int = 0,
+    limit: int = 100,
+    server=None,
+    log_watcher=None
+) -> JSONResponse:
+    """搜索服务器日志，结果按计数器从新到旧排列"""
+    if not server:
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={"success": False, "error": "服务器接口未提供"}
+        )
+
+    try:
+        query = LogQuery(
+            text=q,
+            regex=regex,
+            case_sensitive=case_sensitive,
+            level=level,
+            source=source,
+            since_ms=int(since * 1000) if since is not None else None,
+            until_ms=int(until * 1000) if until is not None else None,
+        )
+    except re.error as e:
+        return JSONResponse(
+            {"status": "error", "message": f"正则表达式无效: {e}"},
+            status_code=400
+        )
+
+    try:
+        # 限制单次返回条数
+        limit = max(1, min(limit, 500))
+        # 内存中找不到足够结果时会回退读取磁盘分段，在线程池中执行
+        result = await run_blocking(log_watcher.search_logs, query, before_counter, limit)
+        return JSONResponse({
+            "status": "success",
+            "logs": result["logs"],
+            "count": len(result["logs"]),
+            "next_before_counter": result["next_before_counter"],
+            "has_more": result["next_before_counter"] > 0
+        })
+
+    except Exception as e:
+        error_msg = f"搜索日志失败: {str(e)}\n{traceback.format_exc()}"
+        if server:
+            server.logger.error(error_msg)
+        return JSONResponse(
+            {"status": "error", "message": str(e)},
+            status_code=500
+        )
+
+# 实时日志流参数
+LOG_STREAM_BATCH_SIZE = 500  # 单个 SSE 事件最多携带的日志条数
+LOG_STREAM_KEEPALIVE = 15  # 无新日志时发送心跳的间隔（秒）
+
+
+def _format_log_event(logs: list) -> str:
+    """将一批日志格式化为 SSE 事件，事件 ID 为最后一条日志的计数器"""
+    data = json.dumps(logs, ensure_ascii=False, separators=(",", ":"))
+    return f"id: {logs[-1]['counter']}\nevent: logs\ndata: {data}\n\n"
+
+
+async def stream_logs(
+    request: Request,
+    last_counter: int = 0,
+    server=None,
+    log_watcher=None
+):
+    """通过 Server-Sent Events 推送实时日志
+
+    先发送 last_counter 之后的积压日志，再推送新写入的日志。浏览器自动重连时
+    会携带 Last-Event-ID 请求头，优先使用它作为断点。
+    """
+    if not server:
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={"success": False, "error": "服务器接口未提供"}
+        )
+
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        last_counter = int(last_event_id)
+
+    # 先订阅再读取积压日志，避免两者之间写入的日志丢失
+    subscription = log_watcher.stream_hub.subscribe()
+
+    async def event_stream():
+        sent_counter = last_counter
+        try:
+            yield "retry: 3000\n\n"
+
+            # 发送积压日志
+            while True:
+                result = log_watcher.get_logs_since_counter(sent_counter, LOG_STREAM_BATCH_SIZE)
+                if result.get("missed_count"):
+                    missed = json.dumps({"missed_count": result["missed_count"]})
+                    yield f"event: missed\ndata: {missed}\n\n"
+                if result["logs"]:
+                    yield _format_log_event(result["logs"])
+                sent_counter = result["last_counter"]
+                if result["new_logs_count"] < LOG_STREAM_BATCH_SIZE:
+                    break
+
+            # 推送新日志
+            while not subscription.overflowed:
+                entry = await subscription.get(LOG_STREAM_KEEPALIVE)
+                if entry is STREAM_CLOSED:
+                    break
+                if entry is None:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+
+                # 合并已到达的日志，减少写入次数
+                logs = []
+                closed = False
+                while entry is not None:
+                    if entry is STREAM_CLOSED:
+                        closed = True
+                        break
+                    # 跳过积压阶段已发送的日志
+                    if entry.counter > sent_counter:
+                        logs.append(entry.to_dict())
+                        sent_counter = entry.counter
+                    if len(logs) >= LOG_STREAM_BATCH_SIZE:
+                        break
+                    entry = subscription.get_nowait()
+                if logs:
+                    yield _format_log_event(logs)
+                if closed:
+                    break
+            # 订阅队列溢出或日志监视器已停止时结束连接，由客户端携带断点重连补齐
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 async def get_rcon_status(
     request: Request,
     server=None
@@ -118,6 +118,7 @@ function chatApp() {
         onlineWeb: [],
         onlineGame: [],
         onlineBot: [],
+        messageStream: null, // 新消息推送连接（EventSource）
         showOnlinePanel: false,
         
         // 离线成员缓存：存储离线时间和状态
@@ -203,13 +204,22 @@ function chatApp() {
             localStorage.setItem('chat_mc_style', String(this.mcStyleMode));
         },
         
-        // 启动消息刷新
+        // 启动消息刷新：登录后优先使用实时推送，浏览器不支持或连接被拒绝时回退到每1秒轮询
         startMessageRefresh() {
-            // 清除之前的定时器
+            // 清除之前的定时器和推送连接
+            this.stopMessageStream();
+            
+            if (this.isLoggedIn && typeof EventSource !== 'undefined') {
+                this.startMessageStream();
+                return;
+            }
+            this.startMessagePolling();
+        },
+        
+        startMessagePolling() {
             if (this.refreshInterval) {
                 clearInterval(this.refreshInterval);
             }
-            
             // 设置新的定时器，每1秒刷新一次
             this.refreshInterval = setInterval(() => {
                 if (this.isLoggedIn) {
@@ -218,12 +228,74 @@ function chatApp() {
             }, 1000);
         },
         
-        // 停止消息刷新
-        stopMessageRefresh() {
+        // 连接新消息推送（SSE），在线列表以变化量推送
+        startMessageStream() {
+            const params = new URLSearchParams({
+                after_id: this.getMaxMessageId(),
+                player_id: this.currentPlayer || ''
+            });
+            const source = new EventSource(`api/chat/stream?${params.toString()}`);
+            
+            source.addEventListener('messages', (event) => {
+                try {
+                    this.insertNewMessages(JSON.parse(event.data));
+                } catch (error) {
+                    console.error('解析聊天推送失败:', error);
+                }
+            });
+            source.addEventListener('online', (event) => {
+                try {
+                    this.applyOnlineLists(JSON.parse(event.data));
+                } catch (error) {
+                    console.error('解析在线列表失败:', error);
+                }
+            });
+            source.addEventListener('presence', (event) => {
+                try {
+                    const delta = JSON.parse(event.data);
+                    const apply = (list, change) => {
+                        if (!change) return list;
+                        const left = new Set(change.left || []);
+                        return [...list.filter(name => !left.has(name)), ...(change.joined || [])];
+                    };
+                    this.applyOnlineLists({
+                        web: apply(this.onlineWeb, delta.web),
+                        game: apply(this.onlineGame, delta.game),
+                        bot: apply(this.onlineBot, delta.bot)
+                    });
+                } catch (error) {
+                    console.error('解析在线列表变化失败:', error);
+                }
+            });
+            
+            source.onerror = () => {
+                // 服务端关闭连接后浏览器会携带 Last-Event-ID 自动重连；仅在连接被拒绝（CLOSED）时回退到轮询
+                if (source.readyState === EventSource.CLOSED && this.messageStream === source) {
+                    this.messageStream = null;
+                    if (this.isLoggedIn && !this.refreshInterval) {
+                        this.startMessagePolling();
+                    }
+                }
+            };
+            
+            this.messageStream = source;
+        },
+        
+        // 停止推送连接和轮询定时器
+        stopMessageStream() {
+            if (this.messageStream) {
+                this.messageStream.close();
+                this.messageStream = null;
+            }
             if (this.refreshInterval) {
                 clearInterval(this.refreshInterval);
                 this.refreshInterval = null;
             }
+        },
+        
+        // 停止消息刷新
+        stopMessageRefresh() {
+            this.stopMessageStream();
             if (this.statusInterval) {
                 clearInterval(this.statusInterval);
                 this.statusInterval = null;
@@ -329,46 +401,10 @@ function chatApp() {
 
                 const result = await response.json();
                 if (result.status === 'success' && result.messages && result.messages.length > 0) {
-                    // 验证消息数据的完整性
-                    const validMessages = result.messages.filter(msg =>
-                        msg && typeof msg.id === 'number' && msg.player_id && msg.message
-                    );
-
-                    if (validMessages.length > 0) {
-                        // 创建新的消息列表（确保原子性操作）
-                        const newChatMessages = [...validMessages, ...this.chatMessages];
-
-                        // 验证新列表的完整性
-                        const expectedLength = this.chatMessages.length + validMessages.length;
-                        if (newChatMessages.length === expectedLength) {
-                            // 只有在消息成功插入后才更新状态
-                            this.chatMessages = newChatMessages;
-
-                            // 更新消息计数
-                            this.messageOffset = this.chatMessages.length;
-
-                            console.log(`[Chat] 成功插入 ${validMessages.length} 条新消息，当前消息总数: ${this.chatMessages.length}`);
-                        } else {
-                            console.error(`[Chat] 消息插入失败：期望长度 ${expectedLength}，实际长度 ${newChatMessages.length}`);
-                        }
-                    } else {
-                        console.warn('[Chat] 收到消息但全部无效，跳过处理');
-                    }
+                    this.insertNewMessages(result.messages);
                 }
                 if (result.status === 'success' && result.online) {
-                    const oldOnlineWeb = [...this.onlineWeb];
-                    const oldOnlineGame = [...this.onlineGame];
-                    const oldOnlineBot = [...this.onlineBot];
-
-                    this.onlineWeb = Array.isArray(result.online.web) ? result.online.web : [];
-                    this.onlineGame = Array.isArray(result.online.game) ? result.online.game : [];
-                    this.onlineBot = Array.isArray(result.online.bot) ? result.online.bot : [];
-
-                    // 检测玩家状态变化
-                    this.detectPlayerStatusChanges(oldOnlineWeb, oldOnlineGame, oldOnlineBot);
-
-                    // 更新离线成员缓存
-                    this.updateOfflineMembers();
+                    this.applyOnlineLists(result.online);
                 }
             } catch (error) {
                 console.error('加载新消息失败:', error);
@@ -377,6 +413,56 @@ function chatApp() {
             }
         },
         
+        // 把新消息（按ID升序）插入列表顶部，跳过已有的消息
+        insertNewMessages(messages) {
+            if (!Array.isArray(messages) || messages.length === 0) return;
+            const currentMaxId = this.getMaxMessageId();
+            // 验证消息数据的完整性
+            const validMessages = messages.filter(msg =>
+                msg && typeof msg.id === 'number' && msg.id > currentMaxId && msg.player_id && msg.message
+            );
+
+            if (validMessages.length > 0) {
+                // 推送和轮询的消息按ID升序排列，列表按从新到旧显示
+                validMessages.reverse();
+                // 创建新的消息列表（确保原子性操作）
+                const newChatMessages = [...validMessages, ...this.chatMessages];
+
+                // 验证新列表的完整性
+                const expectedLength = this.chatMessages.length + validMessages.length;
+                if (newChatMessages.length === expectedLength) {
+                    // 只有在消息成功插入后才更新状态
+                    this.chatMessages = newChatMessages;
+
+                    // 更新消息计数
+                    this.messageOffset = this.chatMessages.length;
+
+                    console.log(`[Chat] 成功插入 ${validMessages.length} 条新消息，当前消息总数: ${this.chatMessages.length}`);
+                } else {
+                    console.error(`[Chat] 消息插入失败：期望长度 ${expectedLength}，实际长度 ${newChatMessages.length}`);
+                }
+            } else {
+                console.warn('[Chat] 收到消息但全部无效，跳过处理');
+            }
+        },
+        
+        // 更新在线列表并检测玩家状态变化
+        applyOnlineLists(online) {
+            const oldOnlineWeb = [...this.onlineWeb];
+            const oldOnlineGame = [...this.onlineGame];
+            const oldOnlineBot = [...this.onlineBot];
+
+            this.onlineWeb = Array.isArray(online.web) ? online.web : [];
+            this.onlineGame = Array.isArray(online.game) ? online.game : [];
+            this.onlineBot = Array.isArray(online.bot) ? online.bot : [];
+
+            // 检测玩家状态变化
+            this.detectPlayerStatusChanges(oldOnlineWeb, oldOnlineGame, oldOnlineBot);
+
+            // 更新离线成员缓存
+            this.updateOfflineMembers();
+        },
+        
         // 加载更多历史消息
         loadMoreMessages() {
             if (this.hasMoreMessages && !this.isLoadingMessages) {
@@ -49,6 +49,11 @@ document.addEventListener('alpine:init', () => {
         autoRefresh: true,
         filterText: '',
         refreshInterval: null,
+        logStream: null, // 实时日志推送连接（EventSource）
+        hasOlderLogs: true, // 服务端是否还有更早的历史日志
+        loadingOlderLogs: false,
+        searchMode: false, // 是否正在显示服务端搜索结果
+        searchNextBefore: 0, // 继续搜索更早结果时使用的计数器
         commandInput: '', // 命令输入框内容
         commandHistory: [], // 命令历史记录
         historyIndex: -1, // 当前历史记录索引
@@ -168,49 +173,101 @@ document.addEventListener('alpine:init', () => {
                 const response = await fetch(`api/new_logs?${params.toString()}`);
                 const data = await response.json();
                 
-                if (data.status === 'success') {
-                    // 如果有新日志
-                    if (data.new_logs_count > 0) {
-                        // 创建一个已有计数器ID的集合，用于去重
-                        const existingCounters = new Set(this.logs.map(log => log.counter));
-                        
-                        // 筛选出不重复的新日志
-                        const uniqueNewLogs = data.logs.filter(log => !existingCounters.has(log.counter));
-                        
-                        if (uniqueNewLogs.length > 0) {
-                            // 追加不重复的新日志到现有日志列表
-                            this.logs = [...this.logs, ...uniqueNewLogs];
-                            this.totalLines = data.total_lines || this.totalLines;
-                            
-                            // 更新最后日志计数器
-                            this.lastLogCounter = data.last_counter;
-                            
-                            // 限制日志数量，避免内存溢出
-                            const maxLogsToKeep = 1000;
-                            if (this.logs.length > maxLogsToKeep) {
-                                this.logs = this.logs.slice(this.logs.length - maxLogsToKeep);
-                            }
-                            
-                            // 如果启用了自动滚动，滚动到底部
-                            if (this.autoScroll) {
-                                this.$nextTick(() => {
-                                    const terminal = document.getElementById('terminal');
-                                    if (terminal) {
-                                        terminal.scrollTop = terminal.scrollHeight;
-                                    }
-                                });
-                            }
-                        } else {
-                            // 虽然服务器返回了新日志，但都是重复的
-                            // console.log('收到的日志都是重复的，已跳过');
-                        }
-                    }
+                if (data.status === 'success' && data.new_logs_count > 0) {
+                    this.appendLogs(data.logs, data.last_counter, data.total_lines);
                 }
             } catch (error) {
                 console.error('Error fetching new logs:', error);
             }
         },
         
+        // 追加新日志（轮询与实时推送共用）
+        appendLogs(newLogs, lastCounter, totalLines) {
+            // 创建一个已有计数器ID的集合，用于去重
+            const existingCounters = new Set(this.logs.map(log => log.counter));
+            
+            // 筛选出不重复的新日志
+            const uniqueNewLogs = newLogs.filter(log => !existingCounters.has(log.counter));
+            
+            // 更新最后日志计数器
+            if (lastCounter) {
+                this.lastLogCounter = lastCounter;
+            }
+            if (uniqueNewLogs.length === 0) {
+                return;
+            }
+            
+            // 追加不重复的新日志到现有日志列表
+            this.logs = [...this.logs, ...uniqueNewLogs];
+            this.totalLines = totalLines || this.totalLines;
+            
+            // 限制日志数量，避免内存溢出（翻阅历史日志时不裁剪）
+            const maxLogsToKeep = 1000;
+            if (this.autoScroll && this.logs.length > maxLogsToKeep) {
+                this.logs = this.logs.slice(this.logs.length - maxLogsToKeep);
+            }
+            
+            // 如果启用了自动滚动，滚动到底部
+            if (this.autoScroll) {
+                this.$nextTick(() => {
+                    const terminal = document.getElementById('terminal');
+                    if (terminal) {
+                        terminal.scrollTop = terminal.scrollHeight;
+                    }
+                });
+            }
+        },
+        
+        // 启动实时日志推送，浏览器不支持或连接被拒绝时回退到定时轮询
+        startLiveUpdates() {
+            this.stopLiveUpdates();
+            
+            if (typeof EventSource === 'undefined') {
+                this.refreshInterval = setInterval(() => this.fetchNewLogs(), 3000);
+                return;
+            }
+            
+            const params = new URLSearchParams({
+                last_counter: this.lastLogCounter || 0
+            });
+            const source = new EventSource(`api/logs/stream?${params.toString()}`);
+            
+            source.addEventListener('logs', (event) => {
+                try {
+                    const logs = JSON.parse(event.data);
+                    if (logs.length > 0) {
+                        this.appendLogs(logs, logs[logs.length - 1].counter);
+                    }
+                } catch (error) {
+                    console.error('Error parsing log stream:', error);
+                }
+            });
+            
+            source.onerror = () => {
+                // 服务端关闭连接后浏览器会自动重连；仅在连接被拒绝（CLOSED）时回退到轮询
+                if (source.readyState === EventSource.CLOSED && this.logStream === source) {
+                    this.logStream = null;
+                    if (this.autoRefresh && !this.refreshInterval) {
+                        this.refreshInterval = setInterval(() => this.fetchNewLogs(), 3000);
+                    }
+                }
+            };
+            
+            this.logStream = source;
+        },
+        
+        // 停止实时日志推送和定时轮询
+        stopLiveUpdates() {
+            if (this.logStream) {
+                this.logStream.close();
+                this.logStream = null;
+            }
+            if (this.refreshInterval) {
+                clearInterval(this.refreshInterval);
+                this.refreshInterval = null;
+            }
+        },
+        
         // 获取命令补全建议
         async fetchCommandSuggestions(input) {
             try {
@@ -361,12 +418,113 @@ document.addEventListener('alpine:init', () => {
         toggleAutoRefresh() {
             this.autoRefresh = !this.autoRefresh;
             
-            if (this.autoRefresh) {
-                // 启动定时刷新
-                this.refreshInterval = setInterval(() => this.fetchNewLogs(), 3000);
+            if (this.autoRefresh && !this.searchMode) {
+                // 先补齐暂停期间的日志，再启动实时推送
+                this.fetchNewLogs().then(() => this.startLiveUpdates());
             } else {
-                // 停止定时刷新
-                clearInterval(this.refreshInterval);
+                // 停止实时推送
+                this.stopLiveUpdates();
+            }
+        },
+        
+        // 滚动到顶部时加载更早的历史日志
+        onTerminalScroll(event) {
+            if (event.target.scrollTop < 40) {
+                this.loadOlderLogs();
+            }
+        },
+        
+        // 在服务端搜索全部历史日志（回车触发），结果替换当前显示的日志
+        async searchServerLogs(more = false) {
+            const query = this.filterText.trim();
+            if (!query) {
+                this.exitSearch();
+                return;
+            }
+            if (more && (!this.searchNextBefore || this.loadingOlderLogs)) return;
+            
+            this.loadingOlderLogs = true;
+            try {
+                const params = new URLSearchParams({ q: query, limit: 500 });
+                if (more) {
+                    params.append('before_counter', this.searchNextBefore);
+                }
+                const response = await fetch(`api/logs/search?${params.toString()}`);
+                const data = await response.json();
+                
+                if (data.status === 'success') {
+                    // 搜索期间暂停实时日志
+                    this.stopLiveUpdates();
+                    this.searchMode = true;
+                    this.searchNextBefore = data.next_before_counter;
+                    // 接口按从新到旧返回，显示时按时间顺序
+                    const results = data.logs.reverse();
+                    
+                    const terminal = document.getElementById('terminal');
+                    const previousHeight = terminal ? terminal.scrollHeight : 0;
+                    this.logs = more ? [...results, ...this.logs] : results;
+                    this.$nextTick(() => {
+                        if (!terminal) return;
+                        terminal.scrollTop = more ? terminal.scrollTop + terminal.scrollHeight - previousHeight : terminal.scrollHeight;
+                    });
+                } else {
+                    this.showNotificationMsg(data.message || this.t('common.unknown', '未知'), 'error');
+                }
+            } catch (error) {
+                console.error('Error searching logs:', error);
+            } finally {
+                this.loadingOlderLogs = false;
+            }
+        },
+        
+        // 退出搜索，恢复显示最新日志
+        exitSearch() {
+            if (!this.searchMode) return;
+            this.searchMode = false;
+            this.searchNextBefore = 0;
+            this.hasOlderLogs = true;
+            this.loadLogs().then(() => {
+                if (this.autoRefresh) {
+                    this.startLiveUpdates();
+                }
+            });
+        },
+        
+        // 加载更早的历史日志（向前翻页）
+        async loadOlderLogs() {
+            if (this.searchMode) {
+                this.searchServerLogs(true);
+                return;
+            }
+            if (this.loadingOlderLogs || !this.hasOlderLogs || this.logs.length === 0) return;
+            this.loadingOlderLogs = true;
+            
+            try {
+                const params = new URLSearchParams({
+                    before_counter: this.logs[0].counter,
+                    max_lines: 500
+                });
+                const response = await fetch(`api/server_logs?${params.toString()}`);
+                const data = await response.json();
+                
+                if (data.status === 'success') {
+                    this.hasOlderLogs = data.has_more;
+                    if (data.logs.length > 0) {
+                        // 保持当前可见位置不变
+                        const terminal = document.getElementById('terminal');
+                        const previousHeight = terminal ? terminal.scrollHeight : 0;
+                        this.logs = [...data.logs, ...this.logs];
+                        this.$nextTick(() => {
+                            if (terminal) {
+                                terminal.scrollTop += terminal.scrollHeight - previousHeight;
+                            }
+                        });
+                    }
+                }
+            } catch (error) {
+                console.error('Error loading older logs:', error);
+            } finally {
+                this.loadingOlderLogs = false;
             }
         },
         
@@ -892,22 +1050,21 @@ document.addEventListener('alpine:init', () => {
 
             this.checkLoginStatus();
             this.checkServerStatus();
-            this.loadLogs();
             this.initSelectionButton();
             
-            // 启动自动刷新
-            if (this.autoRefresh) {
-                this.refreshInterval = setInterval(() => this.fetchNewLogs(), 3000);
-            }
+            // 加载历史日志后启动实时推送
+            this.loadLogs().then(() => {
+                if (this.autoRefresh) {
+                    this.startLiveUpdates();
+                }
+            });
             
             // 每60秒自动刷新服务器状态
             setInterval(() => this.checkServerStatus(), 10001);
 
             // 处理页面关闭前清理
             window.addEventListener('beforeunload', () => {
-                if (this.refreshInterval) {
-                    clearInterval(this.refreshInterval);
-                }
+                this.stopLiveUpdates();
             });
         }
     }));
@@ -1,109 +1,821 @@
 import os
+import bisect
+import mmap
 import struct
 import datetime
 import json
+import threading
+import time
+import zlib
+from array import array
+from itertools import islice
+from collections import deque
 from typing import List, Dict, Optional
 from pathlib import Path
 
+from .chat_search import ChatQuery, ChatSearchIndex
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+from .stream_hub import StreamHub
+
+# 位置索引条目：(消息ID, 消息在 chat_messages.bin 中的字节偏移)
+POSITION_ENTRY = struct.Struct("<QQ")
+
+# 消息文件格式（v3）：
+#   文件头  [魔数 "GGCHAT"(6字节)][版本(2字节)]
+#   记录帧  [帧标记 "GGCR"(4字节)][负载长度(4字节)][负载 CRC32(4字节)][负载]
+#   负载    [消息ID(8)][毫秒时间戳(8)][消息类型(1)][玩家ID长度(2)][消息长度(4)][RText长度(4)][UUID长度(2)]
+#           [玩家ID][消息][RText JSON][UUID]
+# 消息类型: 0=玩家消息, 1=WebUI消息, 2=插件消息
+# 读取时按长度跳过记录，帧标记或 CRC 不符时向后查找下一个帧标记重新同步
+FILE_VERSION = 3
+FILE_HEADER = struct.Struct("<6sH")
+FILE_MAGIC = b"GGCHAT"
+FRAME_HEADER = struct.Struct("<4sII")
+FRAME_MAGIC = b"GGCR"
+RECORD_FIXED = struct.Struct("<QqBHIIH")
+# 单条记录负载的上限，用于排除损坏的长度字段
+MAX_RECORD_SIZE = 16 * 1024 * 1024
+
+_MESSAGE_SOURCES = {0: 'game', 1: 'webui', 2: 'plugin'}
+_MESSAGE_TYPES = {source: message_type for message_type, source in _MESSAGE_SOURCES.items()}
+
+
+def pack_record(message_id, player_id, message, timestamp_ms, rtext_data=None, message_type=0, player_uuid=None) -> bytes:
+    """把一条消息打包为带帧头和 CRC 的记录"""
+    player_id_bytes = player_id.encode('utf-8')
+    message_bytes = message.encode('utf-8')
+    rtext_bytes = json.dumps(rtext_data, ensure_ascii=False).encode('utf-8') if rtext_data is not None else b''
+    uuid_bytes = str(player_uuid).encode('utf-8') if player_uuid is not None else b''
+    payload = b''.join((
+        RECORD_FIXED.pack(message_id, timestamp_ms, message_type, len(player_id_bytes), len(message_bytes),
+                          len(rtext_bytes), len(uuid_bytes)),
+        player_id_bytes, message_bytes, rtext_bytes, uuid_bytes
+    ))
+    return FRAME_HEADER.pack(FRAME_MAGIC, len(payload), zlib.crc32(payload)) + payload
+
+
+def check_frame(view, offset, end):
+    """校验 offset 处的记录帧，有效时返回负载长度，否则返回 None"""
+    if offset + FRAME_HEADER.size > end:
+        return None
+    magic, length, crc = FRAME_HEADER.unpack_from(view, offset)
+    start = offset + FRAME_HEADER.size
+    if magic != FRAME_MAGIC or length < RECORD_FIXED.size or length > MAX_RECORD_SIZE or start + length > end:
+        return None
+    if zlib.crc32(view[start:start + length]) != crc:
+        return None
+    return length
+
+
+def decode_record(view, offset):
+    """解码 offset 处已通过校验的记录帧，返回可序列化的消息字典"""
+    pos = offset + FRAME_HEADER.size
+    message_id, timestamp_ms, message_type, player_len, message_len, rtext_len, uuid_len = RECORD_FIXED.unpack_from(view, pos)
+    pos += RECORD_FIXED.size
+    player_id = str(view[pos:pos + player_len], 'utf-8')
+    pos += player_len
+    message = str(view[pos:pos + message_len], 'utf-8')
+    pos += message_len
+    rtext_data = None
+    if rtext_len:
+        try:
+            rtext_data = json.loads(str(view[pos:pos + rtext_len], 'utf-8'))
+        except ValueError:
+            rtext_data = None
+    pos += rtext_len
+    player_uuid = str(view[pos:pos + uuid_len], 'utf-8') if uuid_len else None
+    return make_message(message_id, timestamp_ms, message_type, player_id, message, rtext_data, player_uuid)
+
+
+def dumps_json(obj) -> bytes:
+    """序列化为 UTF-8 JSON（紧凑格式，不转义非 ASCII 字符），安装了 orjson 时使用 orjson"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class ChatMessage(dict):
+    """接口返回的消息字典，首次序列化后缓存 JSON 编码，缓存中的消息每条只编码一次"""
+    __slots__ = ('_json',)
+
+    def to_json(self) -> bytes:
+        try:
+            return self._json
+        except AttributeError:
+            self._json = dumps_json(self)
+            return self._json
+
+    def set_uuid(self, player_uuid: str):
+        """补充查询到的UUID并重新编码，缓存中的消息原地更新，之后的请求不再重复查询和编码"""
+        self['uuid'] = player_uuid
+        self._json = dumps_json(self)
+
+
+def encode_messages(messages) -> bytes:
+    """把消息列表编码为 JSON 数组，ChatMessage 直接拼接缓存的编码"""
+    return b'[' + b','.join(
+        m.to_json() if isinstance(m, ChatMessage) else dumps_json(m) for m in messages
+    ) + b']'
+
+
+def make_message(message_id, timestamp_ms, message_type, player_id, message, rtext_data, player_uuid):
+    """构造接口返回的消息字典；写入和读取共用，缓存和推送直接复用同一个字典，调用方不应修改"""
+    is_plugin = message_type == 2
+    return ChatMessage({
+        'id': message_id,
+        'player_id': player_id,
+        'message': message,
+        'timestamp': timestamp_ms // 1000,
+        'timestamp_ms': timestamp_ms,
+        'timestamp_str': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(timestamp_ms // 1000)),
+        'is_rtext': rtext_data is not None,
+        'rtext_data': rtext_data,
+        'is_plugin': is_plugin,
+        'plugin_id': player_id if is_plugin else None,
+        # 插件消息没有UUID
+        'uuid': None if is_plugin else player_uuid,
+        'message_source': _MESSAGE_SOURCES.get(message_type, 'game')
+    })
+
+
+def iter_frames(data, view, offset, end):
+    """从 offset 开始迭代有效记录帧的 (偏移, 负载长度)，遇到损坏的数据时查找下一个帧标记继续"""
+    while offset < end:
+        length = check_frame(view, offset, end)
+        if length is None:
+            offset = data.find(FRAME_MAGIC, offset + 1, end)
+            if offset < 0:
+                return
+            continue
+        yield offset, length
+        offset += FRAME_HEADER.size + length
+
+
+# 写入持久性：none=只写入进程缓冲区，flush=每批写入操作系统，fsync=每批落盘
+CHAT_DURABILITY_MODES = ("none", "flush", "fsync")
+
+# 搜索时每次在锁内取出的候选消息数，读取和解码在锁外进行
+SEARCH_READ_BATCH = 256
+
+class ChatSegment:
+    """一个聊天消息分段：消息文件、位置索引文件和按需创建的只读内存映射
+
+    位置索引每条消息一项 (消息ID, 字节偏移)，只追加不重写，启动时从最后一个索引项向后扫描消息文件补全。
+    """
+
+    def __init__(self, path: Path, positions_path: Path):
+        self.path = path
+        self.positions_path = positions_path
+        self.ids = array('Q')
+        self.offsets = array('Q')
+        # 逻辑大小，活动分段包含尚未写入的待写消息
+        self.size = 0
+        self._reader = None
+        self._reader_view = None
+
+    @property
+    def first_id(self) -> Optional[int]:
+        return self.ids[0] if self.ids else None
+
+    @property
+    def last_id(self) -> Optional[int]:
+        return self.ids[-1] if self.ids else None
+
+    def load(self):
+        """读取位置索引，并从最后一条已索引消息向后扫描消息文件，补全未写入索引的消息"""
+        ids = array('Q')
+        offsets = array('Q')
+        try:
+            data = self.positions_path.read_bytes()
+            usable = len(data) - len(data) % POSITION_ENTRY.size
+            for message_id, offset in POSITION_ENTRY.iter_unpack(data[:usable]):
+                ids.append(message_id)
+                offsets.append(offset)
+        except FileNotFoundError:
+            pass
+
+        try:
+            file_size = self.path.stat().st_size
+        except FileNotFoundError:
+            file_size = 0
+        # 丢弃超出消息文件的索引项（消息文件被截断或替换）
+        while offsets and offsets[-1] >= file_size:
+            ids.pop()
+            offsets.pop()
+
+        indexed = len(ids)
+        scan_from = offsets[-1] if offsets else FILE_HEADER.size
+        if file_size > scan_from:
+            with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                view = memoryview(data)
+                try:
+                    for offset, _ in iter_frames(data, view, scan_from, file_size):
+                        message_id = RECORD_FIXED.unpack_from(view, offset + FRAME_HEADER.size)[0]
+                        if not ids or message_id > ids[-1]:
+                            ids.append(message_id)
+                            offsets.append(offset)
+                finally:
+                    view.release()
+
+        self.ids = ids
+        self.offsets = offsets
+        # 损坏或写了一半的尾部保留在文件中，新消息写在真实的文件末尾，读取时按帧标记跳过
+        self.size = file_size
+
+        # 索引与磁盘内容不一致（首次迁移、异常退出或截断）时重写一次索引文件
+        try:
+            positions_size = self.positions_path.stat().st_size
+        except FileNotFoundError:
+            positions_size = 0
+        if len(ids) != indexed or len(ids) * POSITION_ENTRY.size != positions_size:
+            self.rewrite_positions()
+        return self
+
+    def rewrite_positions(self):
+        """按内存中的位置索引重写索引文件"""
+        buffer = bytearray()
+        for message_id, offset in zip(self.ids, self.offsets):
+            buffer += POSITION_ENTRY.pack(message_id, offset)
+        tmp_path = self.positions_path.with_name(self.positions_path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(buffer)
+        os.replace(tmp_path, self.positions_path)
+
+    def view(self):
+        """返回覆盖整个分段的只读 memoryview，文件增长后重新映射；分段为空时返回 None"""
+        if self.size <= FILE_HEADER.size:
+            return None
+        if self._reader is None or len(self._reader) < self.size:
+            self.close_reader()
+            with open(self.path, 'rb') as f:
+                self._reader = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._reader_view = memoryview(self._reader)
+        return self._reader_view
+
+    def close_reader(self):
+        # 先释放 memoryview，否则 mmap 无法关闭；Windows 下映射中的文件也无法重命名或删除
+        if self._reader_view is not None:
+            self._reader_view.release()
+            self._reader_view = None
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def read(self, start, end):
+        """按位置索引解码段内第 start 到 end-1 条消息（按ID升序），只读取这些消息所在的字节"""
+        start = max(0, start)
+        end = min(end, len(self.ids))
+        messages = []
+        if start >= end:
+            return messages
+        view = self.view()
+        if view is None:
+            return messages
+        size = len(view)
+        for i in range(start, end):
+            offset = self.offsets[i]
+            # 位置索引只指向写入时的记录起点，仍校验 CRC 以排除损坏的记录
+            if check_frame(view, offset, size) is not None:
+                messages.append(decode_record(view, offset))
+        return messages
+
+    def remove(self):
+        self.close_reader()
+        for path in (self.path, self.positions_path):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+
 class ChatLogger:
-    """聊天消息记录器，将消息保存到二进制文件中"""
+    """聊天消息记录器，将消息保存到二进制文件中
+
+    最新的消息写入活动分段 chat_messages.bin，超过分段大小后移入 chat_archive 目录，
+    文件名为 "{第一条消息ID}-{归档日期}.bin"；后台按保留天数、总大小和消息数删除或压缩旧分段。
+    """
     
     def __init__(self, data_dir=None):
         if data_dir is None:
             data_dir = Path("guguwebui_static")
         self.data_dir = Path(data_dir)
         self.chat_messages_file = self.data_dir / "chat_messages.bin"
-        self.chat_index_file = self.data_dir / "chat_index.json"
-        self.message_positions_file = self.data_dir / "message_positions.json"  # 新增：消息位置索引
+        self.message_positions_file = self.data_dir / "message_positions.bin"
+        self.archive_dir = self.data_dir / "chat_archive"
+        # 旧版本的 JSON 索引，启动时由消息文件重建二进制索引后删除
+        self.legacy_index_files = (self.data_dir / "chat_index.json", self.data_dir / "message_positions.json")
         
         # 确保数据目录存在
         self.data_dir.mkdir(parents=True, exist_ok=True)
         
-        # 初始化索引
-        self._init_index()
+        # 写入与缓存操作的锁，事件监听线程和 HTTP 接口共享同一实例
+        self._lock = threading.RLock()
+        
+        # 分段：已归档的分段按消息ID升序排列，活动分段在最后；消息总数和下一个ID都由位置索引推导
+        self._archived: List[ChatSegment] = []
+        self._active = ChatSegment(self.chat_messages_file, self.message_positions_file)
+        self._next_message_id = 1
+        self._load_segments()
+        
+        # 写入：消息先放入待写队列（对读取方立即可见），同步模式下立即写入，
+        # 异步模式下由后台线程每隔 flush_interval 秒或凑满 flush_batch 条时批量写入
+        self._data_file = None
+        self._positions_writer = None
+        self._pending_data = []
+        self._pending_positions = []
+        self._write_behind = False
+        self._flush_interval = 0.2
+        self._flush_batch = 64
+        self._durability = "flush"
+        self._writer_thread = None
+        self._writer_stop = False
+        self._writer_wakeup = threading.Event()
+        self._batch_ready = threading.Event()
         
-        # 消息计数器
-        self._message_counter = self._get_next_message_id()
+        # 保留策略
+        self._segment_bytes = 8 * 1024 * 1024
+        self._retention_bytes = 256 * 1024 * 1024
+        self._retention_days = 180
+        self._retention_messages = 200000
+        self._retention_thread = None
         
-        # 内存缓存：最近的消息（最多缓存1000条）
-        self._message_cache = []
+        # 内存缓存：最近的消息（最多缓存1000条），按消息ID升序，另存一份ID用于二分查找
         self._cache_max_size = 1000
+        self._message_cache = deque(maxlen=self._cache_max_size)
+        self._cache_ids = deque(maxlen=self._cache_max_size)
         self._cache_loaded = False
         
-        # 消息位置索引缓存
-        self._positions_cache = {}
-        self._positions_loaded = False
-    
-    def _init_index(self):
-        """初始化索引文件"""
-        if not self.chat_index_file.exists():
-            index = {
-                "message_count": 0,
-                "next_message_id": 1,
-                "file_size": 0
-            }
-            self._write_index(index)
-    
-    def _read_index(self):
-        """读取索引文件"""
+        # 新消息推送，用于 /api/chat/stream
+        self.stream_hub = StreamHub()
+        
+        # 搜索索引：新消息写入时增量更新，已有的消息在后台线程中从所有分段重建
+        self._search_index = ChatSearchIndex()
+        self._index_ready = threading.Event()
+        self._index_generation = 0
+        threading.Thread(target=self._build_search_index, name="GUGUWebUI-Chat-Index", daemon=True).start()
+    
+    def _load_segments(self):
+        """加载归档分段和活动分段"""
+        self._migrate_legacy_file()
+        
+        archived = []
+        if self.archive_dir.is_dir():
+            for path in self.archive_dir.glob("*.bin"):
+                if not path.stem.split('-')[0].isdigit():
+                    continue
+                segment = ChatSegment(path, path.with_suffix('.idx'))
+                try:
+                    segment.load()
+                except OSError as e:
+                    print(f"加载聊天记录分段 {path.name} 失败: {e}")
+                    continue
+                if segment.ids:
+                    archived.append(segment)
+        archived.sort(key=lambda s: s.first_id)
+        self._archived = archived
+        self._active.load()
+        
+        last_ids = [s.last_id for s in self._segments() if s.ids]
+        self._next_message_id = max(last_ids) + 1 if last_ids else 1
+        
+        for path in self.legacy_index_files:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"删除旧版聊天索引失败: {e}")
+    
+    def _segments(self) -> List[ChatSegment]:
+        return self._archived + [self._active]
+    
+    def _migrate_legacy_file(self):
+        """消息文件没有 v3 文件头时，先转换为当前格式并丢弃旧的位置索引"""
         try:
-            with open(self.chat_index_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            # 如果索引文件损坏，重新初始化
-            self._init_index()
-            return self._read_index()
-    
-    def _write_index(self, index):
-        """写入索引文件"""
-        with open(self.chat_index_file, 'w', encoding='utf-8') as f:
-            json.dump(index, f, ensure_ascii=False, indent=2)
-    
-    def _load_positions_index(self):
-        """加载消息位置索引"""
-        if self._positions_loaded:
-            return self._positions_cache
-            
+            with open(self.chat_messages_file, 'rb') as f:
+                header = f.read(FILE_HEADER.size)
+        except FileNotFoundError:
+            return
+        if not header or is_current_format(header):
+            return
+        count = migrate_chat_file(self.chat_messages_file)
+        print(f"已将 {count} 条聊天消息转换为新格式，原文件备份为 {self.chat_messages_file.name}{LEGACY_BACKUP_SUFFIX}")
         try:
-            if self.message_positions_file.exists():
-                with open(self.message_positions_file, 'r', encoding='utf-8') as f:
-                    self._positions_cache = json.load(f)
-            else:
-                self._positions_cache = {}
-        except (FileNotFoundError, json.JSONDecodeError):
-            self._positions_cache = {}
+            self.message_positions_file.unlink()
+        except FileNotFoundError:
+            pass
+    
+    def configure(self, write_behind=False, flush_interval_ms=200, flush_batch=64, durability="flush",
+                  segment_size_mb=8, retention_days=180, retention_mb=256, retention_messages=200000):
+        """设置写入和保留策略
+
+        Args:
+            write_behind: 是否由后台线程批量写入，避免在事件线程中逐条写文件
+            flush_interval_ms: 批量写入的最长间隔（毫秒）
+            flush_batch: 待写消息达到该数量时立即写入
+            durability: 每批写入后的持久化方式，见 CHAT_DURABILITY_MODES
+            segment_size_mb: 活动分段超过该大小后归档
+            retention_days: 归档分段的保留天数
+            retention_mb: 所有分段的总大小上限
+            retention_messages: 保留的消息条数上限
+        """
+        with self._lock:
+            self._flush_interval = max(1, flush_interval_ms) / 1000
+            self._flush_batch = max(1, flush_batch)
+            self._durability = durability if durability in CHAT_DURABILITY_MODES else "flush"
+            self._write_behind = write_behind
+            self._segment_bytes = max(1, segment_size_mb) * 1024 * 1024
+            self._retention_days = max(1, retention_days)
+            self._retention_bytes = max(1, retention_mb) * 1024 * 1024
+            self._retention_messages = max(1, retention_messages)
+            if not write_behind:
+                self._flush_pending()
+        if write_behind:
+            self._start_writer()
+        else:
+            self._stop_writer()
+        # 启动时按新的策略清理一次
+        self._schedule_retention()
+    
+    def close(self):
+        """写入所有待写消息并关闭文件，插件卸载时调用"""
+        self._stop_writer()
+        thread = self._retention_thread
+        if thread is not None:
+            thread.join(timeout=5)
+        with self._lock:
+            self._write_behind = False
+            self._flush_pending()
+            self._close_files()
+            for segment in self._archived:
+                segment.close_reader()
+        # 断开推送连接，客户端重连到重载后的新实例
+        self.stream_hub.close()
+    
+    def _start_writer(self):
+        if self._writer_thread is not None and self._writer_thread.is_alive():
+            return
+        self._writer_stop = False
+        self._writer_thread = threading.Thread(target=self._writer_loop, name="GUGUWebUI-Chat-Writer", daemon=True)
+        self._writer_thread.start()
+    
+    def _stop_writer(self):
+        thread = self._writer_thread
+        if thread is None:
+            return
+        self._writer_stop = True
+        self._writer_wakeup.set()
+        self._batch_ready.set()
+        thread.join(timeout=2)
+        self._writer_thread = None
+    
+    def _writer_loop(self):
+        """后台写入线程：没有待写消息时阻塞，收到第一条后等待凑满一批或到达间隔再写入"""
+        while not self._writer_stop:
+            self._writer_wakeup.wait()
+            if self._writer_stop:
+                break
+            self._batch_ready.wait(self._flush_interval)
+            with self._lock:
+                self._writer_wakeup.clear()
+                self._batch_ready.clear()
+                self._flush_pending()
+        with self._lock:
+            self._flush_pending()
+    
+    def _flush_pending(self):
+        """把待写消息写入活动分段，超过分段大小时归档，调用方需持有 self._lock"""
+        if not self._pending_data:
+            return
+        data = b''.join(self._pending_data)
+        positions = b''.join(self._pending_positions)
+        self._pending_data.clear()
+        self._pending_positions.clear()
+        try:
+            if self._data_file is None:
+                self._data_file = open(self.chat_messages_file, 'ab')
+                self._positions_writer = open(self.message_positions_file, 'ab')
+            # 先写消息再写索引，异常退出时启动扫描可以补全缺失的索引
+            self._data_file.write(data)
+            self._positions_writer.write(positions)
+            if self._durability != "none":
+                self._data_file.flush()
+                self._positions_writer.flush()
+            if self._durability == "fsync":
+                os.fsync(self._data_file.fileno())
+                os.fsync(self._positions_writer.fileno())
+        except OSError as e:
+            print(f"写入聊天消息失败: {e}")
+            # 本批消息已无法确认写入位置，按磁盘上的实际内容重建索引；消息ID不回退，避免与缓存中的消息重复
+            self._close_files()
+            self._active.load()
+            return
         
-        self._positions_loaded = True
-        return self._positions_cache
+        if self._active.size >= self._segment_bytes:
+            self._rotate()
+    
+    def _rotate(self):
+        """把活动分段移入归档目录并开始新的活动分段，调用方需持有 self._lock 且没有待写消息"""
+        active = self._active
+        if not active.ids:
+            return
+        self._close_files()
+        stem = f"{active.first_id:012d}-{time.strftime('%Y%m%d')}"
+        archived = ChatSegment(self.archive_dir / f"{stem}.bin", self.archive_dir / f"{stem}.idx")
+        try:
+            self.archive_dir.mkdir(parents=True, exist_ok=True)
+            # 先移动位置索引：中途失败时活动分段仍可由消息文件扫描重建索引
+            os.replace(active.positions_path, archived.positions_path)
+            os.replace(active.path, archived.path)
+        except OSError as e:
+            print(f"归档聊天记录分段失败: {e}")
+            self._active.load()
+            return
+        archived.ids = active.ids
+        archived.offsets = active.offsets
+        archived.size = active.size
+        self._archived.append(archived)
+        self._active = ChatSegment(self.chat_messages_file, self.message_positions_file)
+        self._schedule_retention()
+    
+    def _schedule_retention(self):
+        """在后台线程中执行保留策略，避免在写入路径上删除或压缩文件"""
+        thread = self._retention_thread
+        if thread is not None and thread.is_alive():
+            return
+        self._retention_thread = threading.Thread(
+            target=self._enforce_retention, name="GUGUWebUI-Chat-Retention", daemon=True
+        )
+        self._retention_thread.start()
     
-    def _save_positions_index(self):
-        """保存消息位置索引"""
+    def _enforce_retention(self):
+        """删除过期或超出大小、条数上限的归档分段；条数超限只涉及最旧分段的一部分时压缩该分段"""
+        # 重建搜索索引时需要读取全部分段，完成后再删除
+        self._index_ready.wait()
         try:
-            with open(self.message_positions_file, 'w', encoding='utf-8') as f:
-                json.dump(self._positions_cache, f, ensure_ascii=False)
+            expire_before = time.time() - self._retention_days * 86400
+            compact = None
+            with self._lock:
+                total_bytes = sum(s.size for s in self._segments())
+                total_messages = sum(len(s.ids) for s in self._segments())
+                while self._archived:
+                    oldest = self._archived[0]
+                    try:
+                        expired = self._archived_time(oldest) < expire_before
+                    except OSError:
+                        expired = True
+                    over_messages = total_messages - len(oldest.ids) >= self._retention_messages
+                    if not expired and total_bytes <= self._retention_bytes and not over_messages:
+                        break
+                    oldest.remove()
+                    self._archived.pop(0)
+                    total_bytes -= oldest.size
+                    total_messages -= len(oldest.ids)
+                
+                excess = total_messages - self._retention_messages
+                if self._archived and excess > 0 and excess * 2 >= len(self._archived[0].ids):
+                    oldest = self._archived[0]
+                    compact = (oldest, oldest.ids[excess:], oldest.offsets[excess:])
+            
+            if compact is not None:
+                self._compact_segment(*compact)
+            with self._lock:
+                first_ids = [s.first_id for s in self._segments() if s.ids]
+                self._search_index.discard_before(first_ids[0] if first_ids else self._next_message_id)
         except Exception as e:
-            print(f"保存位置索引失败: {e}")
+            print(f"清理聊天记录失败: {e}")
     
-    def _add_position_to_index(self, message_id, file_position):
-        """添加消息位置到索引"""
-        self._load_positions_index()
-        self._positions_cache[str(message_id)] = file_position
-        
-        # 限制索引大小，只保留最近的10000条消息位置
-        if len(self._positions_cache) > 10000:
-            # 按消息ID排序，删除最老的消息位置
-            sorted_ids = sorted(self._positions_cache.keys(), key=int)
-            for old_id in sorted_ids[:-10000]:
-                del self._positions_cache[old_id]
+    @staticmethod
+    def _archived_time(segment) -> float:
+        """归档分段中最新消息的时间上限：取文件名中的归档日期当天结束时，压缩会重写文件，不能使用修改时间"""
+        try:
+            day = time.strptime(segment.path.stem.split('-', 1)[1], '%Y%m%d')
+            return time.mktime(day) + 86400
+        except (IndexError, ValueError):
+            # 文件名不含日期时回退为修改时间
+            return segment.path.stat().st_mtime
+    
+    def _compact_segment(self, segment, keep_ids, keep_offsets):
+        """把分段中需要保留的消息复制到新的分段文件，再替换原分段；归档分段只读，复制时无需持有锁"""
+        stem = f"{keep_ids[0]:012d}-{segment.path.stem.split('-', 1)[-1]}"
+        compacted = ChatSegment(self.archive_dir / f"{stem}.c.tmp", self.archive_dir / f"{stem}.idx.tmp")
+        with open(segment.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            view = memoryview(data)
+            try:
+                size = len(data)
+                with open(compacted.path, 'wb') as out:
+                    out.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION))
+                    position = FILE_HEADER.size
+                    for message_id, offset in zip(keep_ids, keep_offsets):
+                        length = check_frame(view, offset, size)
+                        if length is None:
+                            continue
+                        end = offset + FRAME_HEADER.size + length
+                        out.write(view[offset:end])
+                        compacted.ids.append(message_id)
+                        compacted.offsets.append(position)
+                        position += end - offset
+                compacted.size = position
+            finally:
+                view.release()
+        compacted.rewrite_positions()
         
-        self._save_positions_index()
+        with self._lock:
+            if segment not in self._archived:
+                # 复制期间分段已被清空或删除
+                compacted.remove()
+                return
+            final = ChatSegment(self.archive_dir / f"{stem}.bin", self.archive_dir / f"{stem}.idx")
+            segment.remove()
+            os.replace(compacted.positions_path, final.positions_path)
+            os.replace(compacted.path, final.path)
+            final.ids, final.offsets, final.size = compacted.ids, compacted.offsets, compacted.size
+            self._archived[self._archived.index(segment)] = final
+    
+    def _sync_active(self):
+        """读取活动分段前写入待写消息，并把写入缓冲区交给操作系统，保证映射中能看到全部已索引的消息"""
+        self._flush_pending()
+        if self._data_file is not None:
+            self._data_file.flush()
+    
+    def _read_after(self, after_id, limit):
+        """读取ID大于 after_id 的最早 limit 条消息（按ID升序）"""
+        self._sync_active()
+        messages = []
+        for segment in self._segments():
+            if not segment.ids or segment.last_id <= after_id:
+                continue
+            pos = bisect.bisect_right(segment.ids, after_id)
+            messages.extend(segment.read(pos, pos + limit - len(messages)))
+            if len(messages) >= limit:
+                break
+        return messages
+    
+    def _read_before(self, before_id, limit):
+        """读取ID小于 before_id 的最近 limit 条消息（按ID升序），开销只与 limit 有关"""
+        self._sync_active()
+        parts = []
+        remaining = limit
+        for segment in reversed(self._segments()):
+            if remaining <= 0:
+                break
+            if not segment.ids or segment.first_id >= before_id:
+                continue
+            pos = bisect.bisect_left(segment.ids, before_id)
+            start = max(0, pos - remaining)
+            parts.append(segment.read(start, pos))
+            remaining -= pos - start
+        return [message for part in reversed(parts) for message in part]
+    
+    def _read_range(self, offset, limit):
+        """跳过最早的 offset 条消息，读取之后的 limit 条（按ID升序）"""
+        self._sync_active()
+        messages = []
+        for segment in self._segments():
+            count = len(segment.ids)
+            if offset >= count:
+                offset -= count
+                continue
+            messages.extend(segment.read(offset, offset + limit - len(messages)))
+            offset = 0
+            if len(messages) >= limit:
+                break
+        return messages
+    
+    def _read_message(self, message_id):
+        """按消息ID读取一条消息，消息不存在（已被删除或损坏）时返回 None，调用方需先调用 _sync_active"""
+        for segment in reversed(self._segments()):
+            if not segment.ids or segment.first_id > message_id:
+                continue
+            pos = bisect.bisect_left(segment.ids, message_id)
+            if pos < len(segment.ids) and segment.ids[pos] == message_id:
+                messages = segment.read(pos, pos + 1)
+                return messages[0] if messages else None
+            return None
+        return None
+    
+    def _locate_message(self, message_id):
+        """返回消息所在分段的文件路径和字节偏移，消息不存在时返回 None，调用方需持有锁"""
+        for segment in reversed(self._segments()):
+            if not segment.ids or segment.first_id > message_id:
+                continue
+            pos = bisect.bisect_left(segment.ids, message_id)
+            if pos < len(segment.ids) and segment.ids[pos] == message_id:
+                return segment.path, segment.offsets[pos]
+            return None
+        return None
+    
+    def _read_located(self, message_ids, locations):
+        """
+        在锁外按 _locate_message 返回的位置读取消息，结果与 message_ids 一一对应
+
+        读取期间分段可能被轮转、压缩或删除，文件无法打开或偏移处不是该消息时，在锁内按消息ID重新读取。
+        """
+        messages = [None] * len(message_ids)
+        by_path = {}
+        for i, location in enumerate(locations):
+            if location is not None:
+                by_path.setdefault(location[0], []).append(i)
+        retry = []
+        for path, indexes in by_path.items():
+            try:
+                with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    view = memoryview(data)
+                    try:
+                        size = len(data)
+                        for i in indexes:
+                            offset = locations[i][1]
+                            message = None
+                            if check_frame(view, offset, size) is not None:
+                                message = decode_record(view, offset)
+                            if message is not None and message['id'] == message_ids[i]:
+                                messages[i] = message
+                            else:
+                                retry.append(i)
+                    finally:
+                        view.release()
+            except (OSError, ValueError):
+                retry.extend(indexes)
+        if retry:
+            with self._lock:
+                self._sync_active()
+                for i in retry:
+                    messages[i] = self._read_message(message_ids[i])
+        return messages
+    
+    def _build_search_index(self):
+        """从所有分段重建启动前已有消息的搜索索引，期间写入的消息进入当前索引，完成后合并"""
+        try:
+            with self._lock:
+                generation = self._index_generation
+                segments = [(s.path, s.ids, s.offsets) for s in self._segments() if s.ids]
+                end_id = self._next_message_id
+                self._sync_active()
+            built = ChatSearchIndex()
+            for path, ids, offsets in segments:
+                for attempt in range(3):
+                    try:
+                        self._index_segment(built, path, ids, offsets, end_id)
+                        break
+                    except OSError as e:
+                        # 重建期间活动分段可能被轮转到归档目录，归档分段沿用同一个位置索引数组，据此找到新路径后重试
+                        with self._lock:
+                            moved = next((seg.path for seg in self._segments() if seg.ids is ids), None)
+                        if moved is None or attempt == 2:
+                            print(f"读取聊天记录分段 {path.name} 失败: {e}")
+                            break
+                        path = moved
+            with self._lock:
+                if generation == self._index_generation:
+                    built.extend(self._search_index)
+                    self._search_index = built
+        except Exception as e:
+            print(f"重建聊天记录搜索索引失败: {e}")
+        finally:
+            self._index_ready.set()
+    
+    @staticmethod
+    def _index_segment(index, path, ids, offsets, end_id):
+        # 位置索引只追加，这里只读取开始重建时已有的消息；保留策略在重建完成前不会删除分段
+        count = bisect.bisect_left(ids, end_id)
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            view = memoryview(data)
+            try:
+                size = len(data)
+                for i in range(count):
+                    offset = offsets[i]
+                    if check_frame(view, offset, size) is None:
+                        continue
+                    message = decode_record(view, offset)
+                    index.add(message['id'], message['timestamp_ms'], _MESSAGE_TYPES[message['message_source']],
+                              message['player_id'], message['message'])
+            finally:
+                view.release()
+    
+    def _close_files(self):
+        self._active.close_reader()
+        for f in (self._data_file, self._positions_writer):
+            if f is not None:
+                try:
+                    f.close()
+                except OSError:
+                    pass
+        self._data_file = None
+        self._positions_writer = None
     
     def _add_to_cache(self, message):
-        """添加消息到内存缓存"""
+        """添加消息到内存缓存，超出容量时自动丢弃最旧的消息"""
         self._message_cache.append(message)
-        # 保持缓存大小
-        if len(self._message_cache) > self._cache_max_size:
-            self._message_cache = self._message_cache[-self._cache_max_size:]
+        self._cache_ids.append(message['id'])
+    
+    def _cache_slice(self, start, end):
+        """返回缓存中第 start 到 end-1 条消息（按ID升序）"""
+        cache = self._message_cache
+        return [cache[i] for i in range(max(0, start), min(end, len(cache)))]
     
     def _load_cache_from_file(self):
         """从文件加载最近的消息到缓存"""
@@ -111,275 +823,25 @@ class ChatLogger:
             return
             
         try:
-            # 获取最近的消息填充缓存
-            self._message_cache = self._get_recent_messages_from_file(self._cache_max_size)
-            self._cache_loaded = True
+            # 获取最近的消息填充缓存，缓存按消息ID升序排列，新消息追加在末尾
+            for message in self._read_before(self._next_message_id, self._cache_max_size):
+                self._add_to_cache(message)
         except Exception as e:
             print(f"加载缓存失败: {e}")
-            self._message_cache = []
-            self._cache_loaded = True
+            self._message_cache.clear()
+            self._cache_ids.clear()
+        self._cache_loaded = True
     
     def _get_recent_messages_from_file(self, limit):
-        """从文件末尾获取最近的消息"""
-        if not self.chat_messages_file.exists():
-            return []
-        
-        messages = []
+        """从文件末尾获取最近的消息（按ID降序）"""
         try:
-            # 采用反向读取策略
-            file_size = self.chat_messages_file.stat().st_size
-            chunk_size = min(file_size, 1024 * 1024)  # 最多读取1MB
-            
-            with open(self.chat_messages_file, 'rb') as f:
-                if file_size <= chunk_size:
-                    # 小文件直接读取全部
-                    data = f.read()
-                    messages = self._parse_all_messages_from_data(data)
-                else:
-                    # 大文件从末尾开始读取
-                    f.seek(file_size - chunk_size)
-                    data = f.read()
-                    messages = self._parse_all_messages_from_data(data)
-            
-            # 按时间排序并取最近的
-            messages.sort(key=lambda x: x['timestamp'], reverse=True)
-            return messages[:limit]
-            
+            messages = self._read_before(self._next_message_id, limit)
+            messages.reverse()
+            return messages
         except Exception as e:
             print(f"读取最近消息失败: {e}")
             return []
     
-    def _parse_all_messages_from_data(self, data):
-        """从二进制数据解析所有消息"""
-        messages = []
-        offset = 0
-        
-        while offset < len(data):
-            message, new_offset = self._unpack_message(data, offset)
-            if message is None:
-                break
-            
-            # 转换为可序列化格式
-            serializable_message = {
-                'id': message['id'],
-                'player_id': message['player_id'],
-                'message': message['message'],
-                'timestamp': int(message['timestamp'].timestamp()),
-                'timestamp_ms': int(message['timestamp'].timestamp() * 1000),
-                'timestamp_str': message['timestamp_str'],
-                'is_rtext': message.get('is_rtext', False),
-                'rtext_data': message.get('rtext_data', None),
-                'is_plugin': message.get('is_plugin', False),
-                'plugin_id': message.get('plugin_id', None),
-                'uuid': message.get('uuid', None),
-                'message_source': message.get('message_source', 'game')
-            }
-            messages.append(serializable_message)
-            offset = new_offset
-            
-        return messages
-    
-    def _get_next_message_id(self):
-        """获取下一个消息ID"""
-        index = self._read_index()
-        return index.get("next_message_id", 1)
-    
-    def _pack_message(self, message_id, player_id, message, timestamp, rtext_data=None, message_type=0, player_uuid=None):
-        """打包消息数据为二进制格式
-        
-        新格式(v2): [版本(1字节)][消息ID(8字节)][时间戳(8字节)][消息类型(1字节)][玩家ID长度(4字节)][玩家ID][消息长度(4字节)][消息][RText数据长度(4字节)][RText数据][UUID长度(4字节)][UUID]
-        旧格式(v1): [消息ID(8字节)][时间戳(8字节)][消息类型(1字节)][玩家ID长度(4字节)][玩家ID][消息长度(4字节)][消息][RText数据长度(4字节)][RText数据]
-        
-        消息类型: 0=玩家消息, 1=WebUI消息, 2=插件消息
-        版本: 1=旧格式(兼容), 2=新格式(包含UUID)
-        """
-        if not isinstance(player_id, str) or not isinstance(message, str):
-            raise ValueError("player_id 和 message 必须是字符串")
-        
-        if not player_id.strip() or not message.strip():
-            raise ValueError("player_id 和 message 不能为空")
-        
-        # 使用新格式(版本2)
-        version = 2
-        version_bytes = struct.pack('B', version)
-        timestamp_bytes = struct.pack('Q', int(timestamp.timestamp() * 1000))  # 毫秒时间戳
-        message_id_bytes = struct.pack('Q', message_id)  # 消息ID
-        player_id_bytes = player_id.encode('utf-8')
-        message_bytes = message.encode('utf-8')
-        
-        # 处理RText数据
-        rtext_bytes = b''
-        if rtext_data is not None:
-            rtext_json = json.dumps(rtext_data, ensure_ascii=False)
-            rtext_bytes = rtext_json.encode('utf-8')
-        
-        # 处理UUID数据
-        uuid_bytes = b''
-        if player_uuid is not None:
-            uuid_bytes = str(player_uuid).encode('utf-8')
-        
-        return (version_bytes +  # 版本号 (1字节)
-                message_id_bytes + timestamp_bytes + 
-                struct.pack('B', message_type) +  # 消息类型 (1字节)
-                struct.pack('I', len(player_id_bytes)) + player_id_bytes + 
-                struct.pack('I', len(message_bytes)) + message_bytes +
-                struct.pack('I', len(rtext_bytes)) + rtext_bytes +
-                struct.pack('I', len(uuid_bytes)) + uuid_bytes)  # UUID字段
-    
-    def _unpack_message(self, data, offset):
-        """从二进制数据中解包消息（支持新旧格式）
-        
-        返回: (消息字典, 新的偏移量)
-        """
-        try:
-            original_offset = offset
-            
-            # 尝试检测是否为新格式（版本2）
-            # 新格式第一个字节是版本号，旧格式第一个字节是消息ID的低位
-            is_new_format = False
-            player_uuid = None
-            
-            # 检查第一个字节，如果是1或2，可能是版本号
-            if offset < len(data):
-                first_byte = data[offset]
-                if first_byte in [1, 2]:  # 版本1或版本2
-                    # 进一步验证：检查消息ID是否合理
-                    if offset + 9 <= len(data):  # 版本号(1) + 消息ID(8)
-                        potential_msg_id = struct.unpack('Q', data[offset+1:offset+9])[0]
-                        # 如果消息ID看起来合理（不是极大值），则认为是新格式
-                        if 0 < potential_msg_id < 10**10:  # 合理的消息ID范围
-                            is_new_format = True
-                            version = first_byte
-                            offset += 1  # 跳过版本字节
-            
-            # 读取消息ID (8字节)
-            if offset + 8 > len(data):
-                return None, original_offset
-            
-            message_id = struct.unpack('Q', data[offset:offset+8])[0]
-            offset += 8
-            
-            # 读取时间戳 (8字节)
-            if offset + 8 > len(data):
-                return None, original_offset
-            
-            timestamp_ms = struct.unpack('Q', data[offset:offset+8])[0]
-            offset += 8
-            
-            # 读取消息类型 (1字节)
-            if offset + 1 > len(data):
-                # 旧格式消息，默认为玩家消息
-                message_type = 0
-            else:
-                message_type = struct.unpack('B', data[offset:offset+1])[0]
-                offset += 1
-            
-            # 读取玩家ID长度 (4字节)
-            if offset + 4 > len(data):
-                return None, original_offset
-            
-            player_id_len = struct.unpack('I', data[offset:offset+4])[0]
-            offset += 4
-            
-            # 读取玩家ID
-            if offset + player_id_len > len(data):
-                return None, original_offset
-            
-            player_id = data[offset:offset+player_id_len].decode('utf-8')
-            offset += player_id_len
-            
-            # 读取消息长度 (4字节)
-            if offset + 4 > len(data):
-                return None, original_offset
-            
-            message_len = struct.unpack('I', data[offset:offset+4])[0]
-            offset += 4
-            
-            # 读取消息内容
-            if offset + message_len > len(data):
-                return None, original_offset
-            
-            message = data[offset:offset+message_len].decode('utf-8')
-            offset += message_len
-            
-            # 读取RText数据长度 (4字节)
-            if offset + 4 > len(data):
-                # 旧格式消息，没有RText数据
-                rtext_data = None
-            else:
-                rtext_len = struct.unpack('I', data[offset:offset+4])[0]
-                offset += 4
-                
-                # 读取RText数据
-                if offset + rtext_len > len(data):
-                    rtext_data = None
-                else:
-                    if rtext_len > 0:
-                        try:
-                            rtext_json = data[offset:offset+rtext_len].decode('utf-8')
-                            rtext_data = json.loads(rtext_json)
-                        except (UnicodeDecodeError, json.JSONDecodeError):
-                            rtext_data = None
-                    else:
-                        rtext_data = None
-                    offset += rtext_len
-            
-            # 读取UUID数据（仅新格式有）
-            if is_new_format and offset + 4 <= len(data):
-                uuid_len = struct.unpack('I', data[offset:offset+4])[0]
-                offset += 4
-                
-                # 读取UUID
-                if offset + uuid_len <= len(data):
-                    if uuid_len > 0:
-                        try:
-                            player_uuid = data[offset:offset+uuid_len].decode('utf-8')
-                        except UnicodeDecodeError:
-                            player_uuid = None
-                    offset += uuid_len
-            
-            # 转换时间戳
-            timestamp = datetime.datetime.fromtimestamp(timestamp_ms / 1000, tz=datetime.timezone.utc)
-            
-            result = {
-                'id': message_id,
-                'player_id': player_id,
-                'message': message,
-                'timestamp': timestamp,
-                'timestamp_str': timestamp.strftime('%Y-%m-%d %H:%M:%S')
-            }
-            
-            # 根据消息类型设置相关字段
-            if message_type == 2:  # 插件消息
-                result['is_plugin'] = True
-                result['plugin_id'] = player_id
-                result['uuid'] = None  # 插件消息没有UUID
-                result['message_source'] = 'plugin'
-            elif message_type == 1:  # WebUI消息
-                result['is_plugin'] = False
-                result['plugin_id'] = None
-                result['uuid'] = player_uuid  # WebUI消息也可能有UUID
-                result['message_source'] = 'webui'
-            else:  # 玩家消息 (message_type == 0)
-                result['is_plugin'] = False
-                result['plugin_id'] = None
-                result['uuid'] = player_uuid  # 从二进制文件中读取的UUID
-                result['message_source'] = 'game'
-            
-            # 如果有RText数据，添加到结果中
-            if rtext_data is not None:
-                result['is_rtext'] = True
-                result['rtext_data'] = rtext_data
-            else:
-                result['is_rtext'] = False
-                result['rtext_data'] = None
-            
-            return result, offset
-            
-        except (struct.error, UnicodeDecodeError, ValueError) as e:
-            print(f"解析消息失败: {e}")
-            return None, original_offset
-    
     def add_message(self, player_id, message, timestamp=None, rtext_data=None, message_type=0, player_uuid=None, server=None):
         """添加新消息
         
@@ -404,55 +866,13 @@ class ChatLogger:
         # 获取UUID（仅对玩家消息和WebUI消息）
         if player_uuid is None and message_type in [0, 1] and server is not None:
             try:
-                from ..utils.utils import get_player_uuid
-                import concurrent.futures
-                
-                with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-                    future = executor.submit(get_player_uuid, player_id, server)
-                    player_uuid = future.result(timeout=1.0)  # 1秒超时
+                from .uuid_resolver import get_uuid_resolver
+                # 只读缓存，未知的玩家在后台在线查询，不阻塞事件线程
+                player_uuid = get_uuid_resolver(server).resolve(player_id, timeout=0)
             except Exception:
                 player_uuid = None  # 获取失败时设为None
         
-        # 获取下一个消息ID
-        message_id = self._get_next_message_id()
-        
-        # 打包消息（包含UUID）
-        packed_message = self._pack_message(message_id, player_id, message, timestamp, rtext_data, message_type, player_uuid)
-        
-        # 记录当前文件位置（追加前）
-        current_position = self.chat_messages_file.stat().st_size if self.chat_messages_file.exists() else 0
-        
-        # 追加到文件
-        with open(self.chat_messages_file, 'ab') as f:
-            f.write(packed_message)
-        
-        # 添加位置索引
-        self._add_position_to_index(message_id, current_position)
-        
-        # 更新索引
-        index = self._read_index()
-        index["message_count"] += 1
-        index["next_message_id"] = message_id + 1
-        index["file_size"] = self.chat_messages_file.stat().st_size
-        self._write_index(index)
-        
-        # 添加到内存缓存
-        self._add_to_cache({
-            'id': message_id,
-            'player_id': player_id,
-            'message': message,
-            'timestamp': int(timestamp.timestamp()),
-            'timestamp_ms': int(timestamp.timestamp() * 1000),
-            'timestamp_str': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-            'is_rtext': rtext_data is not None,
-            'rtext_data': rtext_data,
-            'is_plugin': message_type == 2,
-            'plugin_id': player_id if message_type == 2 else None,
-            'uuid': player_uuid,  # 使用获取到的UUID
-            'message_source': 'plugin' if message_type == 2 else ('webui' if message_type == 1 else 'game')
-        })
-        
-        return message_id
+        return self._append_message(player_id, message, timestamp, rtext_data, message_type, player_uuid)
     
     def add_plugin_message(self, plugin_id, message, message_type="info", timestamp=None, rtext_data=None, target_players=None, metadata=None):
         """添加插件消息"""
@@ -465,46 +885,51 @@ class ChatLogger:
         if timestamp is None:
             timestamp = datetime.datetime.now(datetime.timezone.utc)
         
-        # 获取下一个消息ID
-        message_id = self._get_next_message_id()
-        
-        # 打包消息，插件消息使用特殊的格式（插件消息不需要UUID）
-        packed_message = self._pack_message(message_id, plugin_id, message, timestamp, rtext_data, message_type=2, player_uuid=None)
-        
-        # 记录当前文件位置（追加前）
-        current_position = self.chat_messages_file.stat().st_size if self.chat_messages_file.exists() else 0
-        
-        # 追加到文件
-        with open(self.chat_messages_file, 'ab') as f:
-            f.write(packed_message)
-        
-        # 添加位置索引
-        self._add_position_to_index(message_id, current_position)
-        
-        # 更新索引
-        index = self._read_index()
-        index["message_count"] += 1
-        index["next_message_id"] = message_id + 1
-        index["file_size"] = self.chat_messages_file.stat().st_size
-        self._write_index(index)
-        
-        # 添加到内存缓存
-        self._add_to_cache({
-            'id': message_id,
-            'player_id': plugin_id,
-            'message': message,
-            'timestamp': int(timestamp.timestamp()),
-            'timestamp_ms': int(timestamp.timestamp() * 1000),
-            'timestamp_str': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-            'is_rtext': rtext_data is not None,
-            'rtext_data': rtext_data,
-            'is_plugin': True,
-            'plugin_id': plugin_id,
-            'uuid': None,
-            'message_source': 'plugin'
-        })
-        
-        return message_id
+        # 插件消息不需要UUID
+        return self._append_message(plugin_id, message, timestamp, rtext_data, message_type=2, player_uuid=None)
+
+    def _append_message(self, player_id, message, timestamp, rtext_data, message_type, player_uuid):
+        """写入一条消息并更新索引与缓存，返回消息ID"""
+        with self._lock:
+            message_id = self._next_message_id
+            
+            # 打包消息
+            timestamp_ms = int(timestamp.timestamp() * 1000)
+            packed_message = pack_record(message_id, player_id, message, timestamp_ms,
+                                         rtext_data, message_type, player_uuid)
+            active = self._active
+            # 新文件先写入文件头
+            if active.size == 0:
+                self._pending_data.append(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION))
+                active.size = FILE_HEADER.size
+            
+            # 消息文件和 16 字节的位置索引都只追加，不重写任何文件
+            current_position = active.size
+            self._pending_data.append(packed_message)
+            self._pending_positions.append(POSITION_ENTRY.pack(message_id, current_position))
+            
+            active.ids.append(message_id)
+            active.offsets.append(current_position)
+            active.size = current_position + len(packed_message)
+            self._next_message_id = message_id + 1
+            self._search_index.add(message_id, timestamp_ms, message_type, player_id, message)
+            
+            if not self._write_behind:
+                self._flush_pending()
+            elif len(self._pending_data) >= self._flush_batch:
+                self._writer_wakeup.set()
+                self._batch_ready.set()
+            else:
+                self._writer_wakeup.set()
+            
+            entry = make_message(message_id, timestamp_ms, message_type, player_id, message, rtext_data, player_uuid)
+            # 添加到内存缓存（缓存未加载时由首次读取从文件加载，避免重复）
+            if self._cache_loaded:
+                self._add_to_cache(entry)
+            # 在锁内发布，保证推送顺序与消息ID一致
+            self.stream_hub.publish(entry)
+            
+            return message_id
 
     def get_messages(self, limit=50, offset=0, after_id=None, before_id=None):
         """获取消息（优化版本）
@@ -515,9 +940,12 @@ class ChatLogger:
             after_id: 只返回ID大于此值的消息（新消息）
             before_id: 只返回ID小于此值的消息（历史消息）
         """
-        if not self.chat_messages_file.exists():
-            return []
+        with self._lock:
+            if self._next_message_id == 1:
+                return []
+            return self._get_messages_locked(limit, offset, after_id, before_id)
 
+    def _get_messages_locked(self, limit, offset, after_id, before_id):
         try:
             # 优化1：新消息查询 - 优先使用缓存
             if after_id is not None:
@@ -540,16 +968,19 @@ class ChatLogger:
 
     def _get_new_messages_optimized(self, after_id, limit):
         """优化的新消息获取"""
+        # 没有新消息时直接返回，轮询的常见情况无需访问缓存和文件
+        if after_id >= self.get_last_message_id():
+            return []
+        
         # 首先检查缓存
         self._load_cache_from_file()
         
-        # 从缓存中筛选新消息
-        new_messages = [msg for msg in self._message_cache if msg['id'] > after_id]
+        # 缓存按ID升序，二分查找第一条ID大于 after_id 的消息
+        pos = bisect.bisect_right(self._cache_ids, after_id)
         
-        if len(new_messages) >= limit:
-            # 缓存中有足够的新消息
-            new_messages.sort(key=lambda x: x['id'])
-            return new_messages[:limit]
+        # 缓存已覆盖 after_id 之后的全部消息；否则缓存之前还有更早的新消息，需从文件读取
+        if self._cache_ids and self._cache_ids[0] <= after_id + 1:
+            return self._cache_slice(pos, pos + limit)
         
         # 缓存不足，需要从文件读取
         return self._get_messages_from_file_after_id(after_id, limit)
@@ -559,10 +990,12 @@ class ChatLogger:
         # 首先尝试从缓存获取
         self._load_cache_from_file()
         
-        if len(self._message_cache) >= limit:
-            # 缓存中有足够的消息
-            sorted_messages = sorted(self._message_cache, key=lambda x: x['timestamp'], reverse=True)
-            return sorted_messages[:limit]
+        count = len(self._message_cache)
+        if count >= limit:
+            # 缓存中有足够的消息，取末尾 limit 条按ID降序返回
+            messages = self._cache_slice(count - limit, count)
+            messages.reverse()
+            return messages
         
         # 缓存不足，从文件读取
         return self._get_recent_messages_from_file(limit)
@@ -572,125 +1005,90 @@ class ChatLogger:
         # 首先检查缓存
         self._load_cache_from_file()
         
-        # 从缓存中筛选历史消息
-        historical_messages = [msg for msg in self._message_cache if msg['id'] < before_id]
+        # 二分查找第一条ID不小于 before_id 的消息，之前的都是历史消息
+        pos = bisect.bisect_left(self._cache_ids, before_id)
         
-        if len(historical_messages) >= limit:
+        if pos >= limit:
             # 缓存中有足够的历史消息
-            historical_messages.sort(key=lambda x: x['timestamp'], reverse=True)
-            return historical_messages[:limit]
+            messages = self._cache_slice(pos - limit, pos)
+            messages.reverse()
+            return messages
         
         # 缓存不足，使用位置索引优化文件读取
         return self._get_historical_messages_from_file(before_id, limit)
 
     def _get_messages_from_file_after_id(self, after_id, limit):
-        """从文件获取指定ID之后的消息"""
-        positions = self._load_positions_index()
-        messages = []
-        
+        """从文件获取指定ID之后的消息（按ID升序）"""
         try:
-            with open(self.chat_messages_file, 'rb') as f:
-                # 尝试使用位置索引快速定位
-                start_position = 0
-                if str(after_id) in positions:
-                    start_position = positions[str(after_id)]
-                
-                # 找到一个合适的起始位置
-                for msg_id in sorted([int(k) for k in positions.keys()]):
-                    if msg_id > after_id:
-                        start_position = positions[str(msg_id)]
-                        break
-                
-                f.seek(start_position)
-                data = f.read()
-                
-                offset = 0
-                while offset < len(data) and len(messages) < limit:
-                    message, new_offset = self._unpack_message(data, offset)
-                    if message is None:
-                        break
-                    
-                    if message['id'] > after_id:
-                        serializable_message = self._convert_to_serializable(message)
-                        messages.append(serializable_message)
-                    
-                    offset = new_offset
-                    
+            return self._read_after(after_id, limit)
         except Exception as e:
             print(f"从文件读取新消息失败: {e}")
-            
-        return messages
+            return []
 
     def _get_historical_messages_from_file(self, before_id, limit):
-        """从文件获取历史消息"""
-        # 为了效率，这里还是采用从末尾读取然后筛选的方式
+        """从文件获取ID小于 before_id 的最近 limit 条消息（按ID降序），开销只与 limit 有关"""
         try:
-            file_size = self.chat_messages_file.stat().st_size
-            chunk_size = min(file_size, 2 * 1024 * 1024)  # 读取最多2MB
-            
-            with open(self.chat_messages_file, 'rb') as f:
-                if file_size <= chunk_size:
-                    data = f.read()
-                else:
-                    f.seek(file_size - chunk_size)
-                    data = f.read()
-                
-                all_messages = self._parse_all_messages_from_data(data)
-                historical_messages = [msg for msg in all_messages if msg['id'] < before_id]
-                historical_messages.sort(key=lambda x: x['timestamp'], reverse=True)
-                return historical_messages[:limit]
-                
+            messages = self._read_before(before_id, limit)
+            messages.reverse()
+            return messages
         except Exception as e:
             print(f"从文件读取历史消息失败: {e}")
             return []
 
     def _get_messages_with_offset(self, limit, offset):
-        """传统的offset方式读取消息（兼容性）"""
+        """传统的offset方式读取消息（兼容性）：跳过最早的 offset 条，返回之后的 limit 条"""
         try:
-            with open(self.chat_messages_file, 'rb') as f:
-                data = f.read()
-            
-            messages = []
-            offset_pos = 0
-            messages_read = 0
-            max_attempts = offset + limit + 100  # 防止无限循环
-            attempt_count = 0
-            
-            while offset_pos < len(data) and messages_read < (offset + limit) and attempt_count < max_attempts:
-                message, offset_pos = self._unpack_message(data, offset_pos)
-                if message is None:
-                    break
-                
-                messages_read += 1
-                if messages_read > offset:
-                    serializable_message = self._convert_to_serializable(message)
-                    messages.append(serializable_message)
-                
-                attempt_count += 1
-            
-            messages.sort(key=lambda x: x['timestamp'], reverse=True)
+            messages = self._read_range(offset, limit)
+            messages.reverse()
             return messages
-            
         except Exception as e:
             print(f"使用offset读取消息失败: {e}")
             return []
 
-    def _convert_to_serializable(self, message):
-        """将消息转换为可序列化格式"""
-        return {
-            'id': message['id'],
-            'player_id': message['player_id'],
-            'message': message['message'],
-            'timestamp': int(message['timestamp'].timestamp()),
-            'timestamp_ms': int(message['timestamp'].timestamp() * 1000),
-            'timestamp_str': message['timestamp_str'],
-            'is_rtext': message.get('is_rtext', False),
-            'rtext_data': message.get('rtext_data', None),
-            'is_plugin': message.get('is_plugin', False),
-            'plugin_id': message.get('plugin_id', None),
-            'uuid': message.get('uuid', None),
-            'message_source': message.get('message_source', 'game')
-        }
+    @property
+    def search_ready(self):
+        """启动后搜索索引是否已重建完成，完成前搜索结果不包含启动前的消息"""
+        return self._index_ready.is_set()
+    
+    def search_messages(self, query: ChatQuery, before_id=0, limit=50, max_scan=20000):
+        """
+        搜索聊天记录，结果按消息ID从新到旧排列
+
+        Args:
+            query (ChatQuery): 搜索条件
+            before_id (int): 只搜索ID小于该值的消息，0 表示从最新的消息开始
+            limit (int): 最大返回条数
+            max_scan (int): 单次请求最多确认的候选消息数，超出后通过 next_before_id 继续
+
+        Returns:
+            dict: 匹配的消息和继续搜索用的消息ID（0 表示已搜索完毕）
+        """
+        results = []
+        scanned = 0
+        with self._lock:
+            end_id = self._next_message_id
+            if before_id > 0:
+                end_id = min(before_id, end_id)
+        while scanned < max_scan:
+            # 倒排列表在写入时会被修改，只在锁内取出一批候选消息的位置，读取和解码在锁外进行
+            with self._lock:
+                self._sync_active()
+                candidates = self._search_index.iter_candidates(query, end_id)
+                batch = list(islice(candidates, min(SEARCH_READ_BATCH, max_scan - scanned)))
+                following = next(candidates, None)
+                locations = [self._locate_message(message_id) for message_id in batch]
+            for message_id, message in zip(batch, self._read_located(batch, locations)):
+                scanned += 1
+                if message is not None and query.match(message):
+                    results.append(message)
+                    if len(results) >= limit:
+                        return {"messages": results, "next_before_id": message_id}
+            if following is None:
+                break
+            end_id = following + 1
+        else:
+            return {"messages": results, "next_before_id": end_id}
+        return {"messages": results, "next_before_id": 0}
     
     def get_new_messages(self, after_id):
         """获取指定ID之后的新消息"""
@@ -698,43 +1096,268 @@ class ChatLogger:
     
     def get_message_count(self):
         """获取消息总数"""
-        index = self._read_index()
-        return index.get("message_count", 0)
+        with self._lock:
+            return sum(len(segment.ids) for segment in self._segments())
     
     def get_last_message_id(self):
         """获取最后一条消息的ID"""
-        index = self._read_index()
-        return index.get("next_message_id", 1) - 1
+        with self._lock:
+            return self._next_message_id - 1
     
     def clear_messages(self):
         """清空所有消息"""
-        if self.chat_messages_file.exists():
-            self.chat_messages_file.unlink()
+        with self._lock:
+            self._clear_messages_locked()
+    
+    def _clear_messages_locked(self):
+        # 丢弃待写消息并关闭文件句柄，Windows 下打开的文件无法删除
+        self._pending_data.clear()
+        self._pending_positions.clear()
+        self._close_files()
         
-        # 清理位置索引文件
-        if self.message_positions_file.exists():
-            self.message_positions_file.unlink()
+        # 删除所有分段及其位置索引
+        for segment in self._segments():
+            segment.remove()
         
-        # 重置索引
-        index = {
-            "message_count": 0,
-            "next_message_id": 1,
-            "file_size": 0
-        }
-        self._write_index(index)
+        # 重置索引，正在后台重建的搜索索引作废
+        self._archived = []
+        self._active = ChatSegment(self.chat_messages_file, self.message_positions_file)
+        self._next_message_id = 1
+        self._search_index = ChatSearchIndex()
+        self._index_generation += 1
         
         # 清理内存缓存
-        self._message_cache = []
+        self._message_cache.clear()
+        self._cache_ids.clear()
         self._cache_loaded = False
-        self._positions_cache = {}
-        self._positions_loaded = False
     
     def get_file_size(self):
-        """获取消息文件大小"""
-        if self.chat_messages_file.exists():
-            return self.chat_messages_file.stat().st_size
-        return 0
+        """获取所有分段的消息文件总大小"""
+        with self._lock:
+            return sum(segment.size for segment in self._segments())
+
 
+LEGACY_BACKUP_SUFFIX = ".legacy.bak"
 
 
+def is_current_format(header: bytes) -> bool:
+    """文件头是否为当前格式"""
+    if len(header) < FILE_HEADER.size:
+        return False
+    magic, version = FILE_HEADER.unpack_from(header)
+    return magic == FILE_MAGIC and version == FILE_VERSION
 
+
+def migrate_chat_file(path) -> int:
+    """
+    把旧版（v1/v2）消息文件转换为当前格式，原文件保留为同名的 .legacy.bak 备份。
+
+    旧格式无法从损坏处恢复，遇到第一条无法解析的记录即停止。返回转换的消息数。
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    count = 0
+    with open(path, 'rb') as src, open(tmp_path, 'wb') as dst:
+        data = src.read()
+        dst.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION))
+        offset = 0
+        while offset < len(data):
+            message, new_offset = _unpack_legacy_record(data, offset)
+            if message is None or new_offset <= offset:
+                break
+            message_type = {'plugin': 2, 'webui': 1}.get(message.get('message_source'), 0)
+            dst.write(pack_record(
+                message['id'], message['player_id'], message['message'],
+                int(message['timestamp'].timestamp() * 1000), message.get('rtext_data'),
+                message_type, message.get('uuid')
+            ))
+            count += 1
+            offset = new_offset
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.replace(path, path.with_name(path.name + LEGACY_BACKUP_SUFFIX))
+    os.replace(tmp_path, path)
+    return count
+
+
+_chat_logger = None
+_chat_logger_lock = threading.Lock()
+
+
+def get_chat_logger() -> ChatLogger:
+    """获取进程内共享的聊天记录器
+
+    插件事件监听和各 HTTP 接口使用同一个实例，消息缓存和位置索引在请求之间保留在内存中。
+    """
+    global _chat_logger
+    if _chat_logger is None:
+        with _chat_logger_lock:
+            if _chat_logger is None:
+                _chat_logger = ChatLogger()
+    return _chat_logger
+
+
+def close_chat_logger():
+    """写入待写消息并释放共享实例，插件卸载时调用"""
+    global _chat_logger
+    with _chat_logger_lock:
+        if _chat_logger is not None:
+            _chat_logger.close()
+            _chat_logger = None
+
+
+def _unpack_legacy_record(data, offset):
+    """从旧版（v1/v2，无帧头）数据中解包消息，仅用于迁移
+
+    旧格式没有文件头和帧标记，只能根据第一个字节和消息ID是否合理猜测是 v1 还是 v2。
+
+    返回: (消息字典, 新的偏移量)
+    """
+    try:
+        original_offset = offset
+        
+        # 尝试检测是否为新格式（版本2）
+        # 新格式第一个字节是版本号，旧格式第一个字节是消息ID的低位
+        is_new_format = False
+        player_uuid = None
+        
+        # 检查第一个字节，如果是1或2，可能是版本号
+        if offset < len(data):
+            first_byte = data[offset]
+            if first_byte in [1, 2]:  # 版本1或版本2
+                # 进一步验证：检查消息ID是否合理
+                if offset + 9 <= len(data):  # 版本号(1) + 消息ID(8)
+                    potential_msg_id = struct.unpack('Q', data[offset+1:offset+9])[0]
+                    # 如果消息ID看起来合理（不是极大值），则认为是新格式
+                    if 0 < potential_msg_id < 10**10:  # 合理的消息ID范围
+                        is_new_format = True
+                        version = first_byte
+                        offset += 1  # 跳过版本字节
+        
+        # 读取消息ID (8字节)
+        if offset + 8 > len(data):
+            return None, original_offset
+        
+        message_id = struct.unpack('Q', data[offset:offset+8])[0]
+        offset += 8
+        
+        # 读取时间戳 (8字节)
+        if offset + 8 > len(data):
+            return None, original_offset
+        
+        timestamp_ms = struct.unpack('Q', data[offset:offset+8])[0]
+        offset += 8
+        
+        # 读取消息类型 (1字节)
+        if offset + 1 > len(data):
+            # 旧格式消息，默认为玩家消息
+            message_type = 0
+        else:
+            message_type = struct.unpack('B', data[offset:offset+1])[0]
+            offset += 1
+        
+        # 读取玩家ID长度 (4字节)
+        if offset + 4 > len(data):
+            return None, original_offset
+        
+        player_id_len = struct.unpack('I', data[offset:offset+4])[0]
+        offset += 4
+        
+        # 读取玩家ID
+        if offset + player_id_len > len(data):
+            return None, original_offset
+        
+        player_id = data[offset:offset+player_id_len].decode('utf-8')
+        offset += player_id_len
+        
+        # 读取消息长度 (4字节)
+        if offset + 4 > len(data):
+            return None, original_offset
+        
+        message_len = struct.unpack('I', data[offset:offset+4])[0]
+        offset += 4
+        
+        # 读取消息内容
+        if offset + message_len > len(data):
+            return None, original_offset
+        
+        message = data[offset:offset+message_len].decode('utf-8')
+        offset += message_len
+        
+        # 读取RText数据长度 (4字节)
+        if offset + 4 > len(data):
+            # 旧格式消息，没有RText数据
+            rtext_data = None
+        else:
+            rtext_len = struct.unpack('I', data[offset:offset+4])[0]
+            offset += 4
+            
+            # 读取RText数据
+            if offset + rtext_len > len(data):
+                rtext_data = None
+            else:
+                if rtext_len > 0:
+                    try:
+                        rtext_json = data[offset:offset+rtext_len].decode('utf-8')
+                        rtext_data = json.loads(rtext_json)
+                    except (UnicodeDecodeError, json.JSONDecodeError):
+                        rtext_data = None
+                else:
+                    rtext_data = None
+                offset += rtext_len
+        
+        # 读取UUID数据（仅新格式有）
+        if is_new_format and offset + 4 <= len(data):
+            uuid_len = struct.unpack('I', data[offset:offset+4])[0]
+            offset += 4
+            
+            # 读取UUID
+            if offset + uuid_len <= len(data):
+                if uuid_len > 0:
+                    try:
+                        player_uuid = data[offset:offset+uuid_len].decode('utf-8')
+                    except UnicodeDecodeError:
+                        player_uuid = None
+                offset += uuid_len
+        
+        # 转换时间戳
+        timestamp = datetime.datetime.fromtimestamp(timestamp_ms / 1000, tz=datetime.timezone.utc)
+        
+        result = {
+            'id': message_id,
+            'player_id': player_id,
+            'message': message,
+            'timestamp': timestamp,
+            'timestamp_str': timestamp.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        
+        # 根据消息类型设置相关字段
+        if message_type == 2:  # 插件消息
+            result['is_plugin'] = True
+            result['plugin_id'] = player_id
+            result['uuid'] = None  # 插件消息没有UUID
+            result['message_source'] = 'plugin'
+        elif message_type == 1:  # WebUI消息
+            result['is_plugin'] = False
+            result['plugin_id'] = None
+            result['uuid'] = player_uuid  # WebUI消息也可能有UUID
+            result['message_source'] = 'webui'
+        else:  # 玩家消息 (message_type == 0)
+            result['is_plugin'] = False
+            result['plugin_id'] = None
+            result['uuid'] = player_uuid  # 从二进制文件中读取的UUID
+            result['message_source'] = 'game'
+        
+        # 如果有RText数据，添加到结果中
+        if rtext_data is not None:
+            result['is_rtext'] = True
+            result['rtext_data'] = rtext_data
+        else:
+            result['is_rtext'] = False
+            result['rtext_data'] = None
+        
+        return result, offset
+        
+    except (struct.error, UnicodeDecodeError, ValueError) as e:
+        print(f"解析消息失败: {e}")
+        return None, original_offset
@@ -0,0 +1,161 @@
+import bisect
+from array import array
+from typing import Dict, Iterator, Optional
+
+from .log_search import LogIndex
+
+# 搜索参数中的消息来源与消息类型的对应关系（0=游戏, 1=WebUI, 2=插件）
+CHAT_SOURCES = {"game": 0, "webui": 1, "plugin": 2}
+
+
+class ChatQuery:
+    """聊天记录搜索条件：玩家、关键词、来源和时间范围"""
+
+    def __init__(
+        self,
+        player: str = "",
+        keyword: str = "",
+        source: str = "",
+        since_ms: Optional[int] = None,
+        until_ms: Optional[int] = None,
+    ):
+        self.player = player.strip().lower()
+        self.keyword = keyword.strip()
+        self.source = source.strip().lower()
+        self.since_ms = since_ms
+        self.until_ms = until_ms
+        # 未知来源由调用方校验后返回400
+        self.message_type = CHAT_SOURCES.get(self.source) if self.source else None
+        self._needle = self.keyword.lower()
+
+    def match(self, message: dict) -> bool:
+        """确认解码后的消息是否满足所有条件"""
+        if self.since_ms is not None and message["timestamp_ms"] < self.since_ms:
+            return False
+        if self.until_ms is not None and message["timestamp_ms"] > self.until_ms:
+            return False
+        if self.player and message["player_id"].lower() != self.player:
+            return False
+        if self.source and message["message_source"] != self.source:
+            return False
+        return not self._needle or self._needle in message["message"].lower()
+
+
+class ChatSearchIndex:
+    """聊天记录的增量索引
+
+    玩家 → 消息ID、消息类型 → 消息ID 的倒排列表，消息内容的词倒排复用终端日志的 LogIndex，
+    另按消息ID记录单调不减的毫秒时间戳，把时间范围换算为消息ID范围。
+    所有列表都按消息ID升序追加，修改和迭代都需持有 ChatLogger 的锁。
+    """
+
+    def __init__(self):
+        self.tokens = LogIndex()
+        self.players: Dict[str, array] = {}
+        self.sources: Dict[int, array] = {}
+        self.ids = array("Q")
+        self.times = array("q")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, message_id: int, timestamp_ms: int, message_type: int, player_id: str, message: str):
+        player = player_id.lower()
+        postings = self.players.get(player)
+        if postings is None:
+            postings = self.players[player] = array("Q")
+        postings.append(message_id)
+        postings = self.sources.get(message_type)
+        if postings is None:
+            postings = self.sources[message_type] = array("Q")
+        postings.append(message_id)
+        self.tokens.add(message_id, message)
+        self.ids.append(message_id)
+        # 系统时间回拨时沿用上一条的时间，保证可以二分查找
+        self.times.append(max(timestamp_ms, self.times[-1]) if self.times else timestamp_ms)
+
+    def extend(self, other: "ChatSearchIndex"):
+        """追加另一个索引的全部条目，other 中的消息ID需全部大于本索引"""
+        for player, postings in other.players.items():
+            self.players.setdefault(player, array("Q")).extend(postings)
+        for message_type, postings in other.sources.items():
+            self.sources.setdefault(message_type, array("Q")).extend(postings)
+        self.tokens.extend(other.tokens)
+        self.ids.extend(other.ids)
+        for timestamp_ms in other.times:
+            self.times.append(max(timestamp_ms, self.times[-1]) if self.times else timestamp_ms)
+
+    def discard_before(self, first_id: int):
+        """删除消息ID小于 first_id 的条目（消息已被保留策略删除）"""
+        if not self.ids or self.ids[0] >= first_id:
+            return
+        for mapping in (self.players, self.sources):
+            empty = []
+            for key, postings in mapping.items():
+                del postings[:bisect.bisect_left(postings, first_id)]
+                if not postings:
+                    empty.append(key)
+            for key in empty:
+                del mapping[key]
+        self.tokens.compact(first_id)
+        pos = bisect.bisect_left(self.ids, first_id)
+        del self.ids[:pos]
+        del self.times[:pos]
+
+    def clear(self):
+        self.tokens.clear()
+        self.players.clear()
+        self.sources.clear()
+        self.ids = array("Q")
+        self.times = array("q")
+
+    def iter_candidates(self, query: ChatQuery, before_id: int) -> Iterator[int]:
+        """
+        按消息ID从新到旧迭代可能满足条件、且ID小于 before_id 的消息
+
+        时间范围先换算为消息ID范围；玩家和来源条件直接由倒排列表判断，
+        关键词只用于缩小候选范围，调用方仍需用 ChatQuery.match 逐条确认。
+        """
+        if query.until_ms is not None:
+            pos = bisect.bisect_right(self.times, query.until_ms)
+            before_id = min(before_id, self.ids[pos - 1] + 1 if pos else 0)
+        first_id = 0
+        if query.since_ms is not None:
+            pos = bisect.bisect_left(self.times, query.since_ms)
+            if pos >= len(self.ids):
+                return iter(())
+            first_id = self.ids[pos]
+
+        filters = []
+        if query.player:
+            filters.append(self.players.get(query.player, array("Q")))
+        if query.message_type is not None:
+            filters.append(self.sources.get(query.message_type, array("Q")))
+        filters.sort(key=len)
+
+        if filters:
+            driver = self._descending(filters.pop(0), before_id)
+        else:
+            driver = None
+            if query.keyword:
+                driver = self.tokens.iter_candidates(query.keyword, before_id)
+            if driver is None:
+                driver = self._descending(self.ids, before_id)
+        return self._filtered(driver, filters, first_id)
+
+    @staticmethod
+    def _descending(postings: array, before_id: int) -> Iterator[int]:
+        for i in range(bisect.bisect_left(postings, before_id) - 1, -1, -1):
+            yield postings[i]
+
+    @staticmethod
+    def _filtered(driver: Iterator[int], filters, first_id: int) -> Iterator[int]:
+        for message_id in driver:
+            if message_id < first_id:
+                return
+            for postings in filters:
+                pos = bisect.bisect_left(postings, message_id)
+                if pos >= len(postings) or postings[pos] != message_id:
+                    break
+            else:
+                yield message_id
@@ -3,6 +3,7 @@ import ipaddress
 import logging
 from typing import Dict, Any, Tuple, List
 from .constant import DEFALUT_CONFIG
+from .chat_logger import CHAT_DURABILITY_MODES
 
 class ConfigValidator:
     """配置验证器，用于验证配置项的类型、格式和值范围"""
@@ -88,7 +89,8 @@ class ConfigValidator:
         # 验证布尔值配置
         bool_configs = [
             'disable_other_admin', 'allow_temp_password', 'force_standalone',
-            'ssl_enabled', 'public_chat_enabled', 'public_chat_to_game_enabled'
+            'ssl_enabled', 'public_chat_enabled', 'public_chat_to_game_enabled',
+            'log_persist', 'log_capture_stdout', 'chat_write_behind'
         ]
         for key in bool_configs:
             value = config.get(key)
@@ -153,7 +155,10 @@ class ConfigValidator:
         
         # 验证整数配置
         int_configs = [
-            'chat_verification_expire_minutes', 'chat_session_expire_hours'
+            'chat_verification_expire_minutes', 'chat_session_expire_hours',
+            'log_buffer_size', 'log_segment_size_mb', 'log_retention_mb', 'log_retention_days',
+            'chat_flush_interval_ms', 'chat_flush_batch', 'chat_segment_size_mb', 'chat_retention_mb',
+            'chat_retention_days', 'chat_retention_messages', 'blocking_pool_size'
         ]
         for key in int_configs:
             value = config.get(key)
@@ -164,6 +169,18 @@ class ConfigValidator:
                 self.warnings.append(f"{key} 值超出范围，期望 > 0，实际: {value}")
                 validated_config[key] = DEFALUT_CONFIG[key]
         
+        # 验证聊天记录持久化方式
+        chat_durability = config.get('chat_durability')
+        if chat_durability not in CHAT_DURABILITY_MODES:
+            self.warnings.append(f"chat_durability 取值错误，期望 {' / '.join(CHAT_DURABILITY_MODES)}，实际: {chat_durability}")
+            validated_config['chat_durability'] = DEFALUT_CONFIG['chat_durability']
+
+        # 验证事件循环卡顿检测阈值（0 表示不启用）
+        loop_lag_warn_ms = config.get('loop_lag_warn_ms')
+        if not isinstance(loop_lag_warn_ms, int) or isinstance(loop_lag_warn_ms, bool) or loop_lag_warn_ms < 0:
+            self.warnings.append(f"loop_lag_warn_ms 取值错误，期望 >= 0 的整数，实际: {loop_lag_warn_ms}")
+            validated_config['loop_lag_warn_ms'] = DEFALUT_CONFIG['loop_lag_warn_ms']
+        
         # 验证AI模型配置
         ai_model = config.get('ai_model')
         if ai_model and not isinstance(ai_model, str):
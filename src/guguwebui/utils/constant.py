@@ -13,6 +13,7 @@ ALGORITHM = "HS256"
 SECRET_KEY = "guguwebui" 
 STATIC_PATH = "./guguwebui_static"
 USER_DB_PATH = Path(STATIC_PATH) / "db.json"
+LOG_STORE_PATH = Path(STATIC_PATH) / "logs"
 PATH_DB_PATH = Path("./config") / "guguwebui" / "config_path.json"
 
 CSS_FILE = Path(STATIC_PATH) / "custom" / "overall.css"
@@ -63,6 +64,22 @@ DEFALUT_CONFIG = {
     "public_chat_to_game_enabled": False,  # 公开聊天页发送消息到游戏
     "chat_verification_expire_minutes": 10,  # 聊天页验证码过期时间（分钟）
     "chat_session_expire_hours": 24,  # 聊天页会话过期时间（小时）
+    "log_buffer_size": 20000,  # 终端日志缓冲区容量（行），超出后覆盖最旧的日志
+    "log_persist": True,  # 是否将终端日志持久化到 guguwebui_static/logs，重载后保留历史
+    "log_segment_size_mb": 16,  # 单个日志分段文件大小上限（MB），超出后轮转
+    "log_retention_mb": 256,  # 日志分段总大小上限（MB），超出后删除最旧的分段
+    "log_retention_days": 7,  # 日志分段保留天数
+    "log_capture_stdout": False,  # 是否额外解析标准输出/错误中的行（与日志拦截重复，仅在缺少日志时开启）
+    "chat_write_behind": True,  # 聊天记录由后台线程批量写入，不阻塞事件线程
+    "chat_flush_interval_ms": 200,  # 聊天记录批量写入的最长间隔（毫秒）
+    "chat_flush_batch": 64,  # 待写聊天记录达到该条数时立即写入
+    "chat_durability": "flush",  # 聊天记录写入后的持久化方式：none / flush / fsync
+    "chat_segment_size_mb": 8,  # 聊天记录活动分段大小上限（MB），超出后归档到 chat_archive
+    "chat_retention_mb": 256,  # 聊天记录总大小上限（MB），超出后删除最旧的归档分段
+    "chat_retention_days": 180,  # 聊天记录归档分段保留天数
+    "chat_retention_messages": 200000,  # 保留的聊天记录条数上限
+    "blocking_pool_size": 8,  # 执行密码校验、文件读写、网络请求等阻塞操作的线程数
+    "loop_lag_warn_ms": 0,  # 开发调试用：事件循环被阻塞超过该毫秒数时记录警告，0 表示不检测
     "icp_records": []  # ICP备案信息，最多两个，每个包含 icp 和 url 字段
     # 示例配置（请在 config.json 中添加）：
     # "icp_records": [
@@ -71,7 +88,8 @@ DEFALUT_CONFIG = {
     # ]
 }
 
-user_db = table(USER_DB_PATH, default_content=DEFALUT_DB)
+# 修改后由后台线程合并写入，插件卸载时调用 user_db.close() 写入剩余修改
+user_db = table(USER_DB_PATH, default_content=DEFALUT_DB, write_behind=True)
 
 class LoginData(BaseModel):
     username: Optional[str] = None
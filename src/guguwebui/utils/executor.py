@@ -0,0 +1,110 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+# 阻塞操作线程池的默认大小
+BLOCKING_POOL_SIZE = 8
+# 事件循环卡顿检测的采样间隔（秒）
+LOOP_LAG_INTERVAL = 0.1
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_size = BLOCKING_POOL_SIZE
+_executor_lock = threading.Lock()
+
+
+def configure_blocking_executor(max_workers: int):
+    """设置线程池大小，大小变化时替换现有线程池（已提交的任务继续执行）"""
+    global _executor, _executor_size
+    max_workers = max(1, int(max_workers))
+    with _executor_lock:
+        if max_workers == _executor_size:
+            return
+        _executor_size = max_workers
+        old, _executor = _executor, None
+    if old is not None:
+        old.shutdown(wait=False)
+
+
+def get_blocking_executor() -> ThreadPoolExecutor:
+    """获取执行阻塞操作（密码校验、文件读写、子进程、网络请求等）的共享线程池"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=_executor_size, thread_name_prefix="GUGUWebUI-Worker")
+    return _executor
+
+
+def close_blocking_executor():
+    """关闭线程池，不等待正在执行的任务，插件卸载时调用"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+async def run_blocking(func: Callable, *args, **kwargs):
+    """在共享线程池中执行阻塞函数并等待结果，避免阻塞事件循环"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_blocking_executor(), functools.partial(func, *args, **kwargs))
+
+
+class LoopLagMonitor:
+    """事件循环卡顿检测（开发调试用）
+
+    在事件循环中每隔 LOOP_LAG_INTERVAL 秒调度一次，实际唤醒时间比预期晚 threshold_ms 以上时
+    说明有代码阻塞了事件循环，记录一条警告。threshold_ms 为0时不启用。
+    """
+
+    def __init__(self, logger=None, threshold_ms: int = 0):
+        self.logger = logger
+        self.threshold_ms = threshold_ms
+        self._task = None
+        self._loop = None
+
+    def ensure_started(self):
+        """在当前事件循环中启动检测任务，需在事件循环线程中调用"""
+        if self.threshold_ms <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        self._loop = loop
+        self._task = loop.create_task(self._run())
+
+    def stop(self):
+        task, loop = self._task, self._loop
+        self._task = self._loop = None
+        if task is not None and not task.done():
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self.threshold_ms > 0:
+            start = loop.time()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            lag_ms = (loop.time() - start - LOOP_LAG_INTERVAL) * 1000
+            if lag_ms >= self.threshold_ms and self.logger is not None:
+                self.logger.warning(f"事件循环被阻塞约 {lag_ms:.0f} ms")
+
+
+class LoopLagMiddleware:
+    """ASGI 中间件：收到第一个请求时在服务器的事件循环中启动卡顿检测
+
+    独立运行和挂载到 fastapi_mcdr 时都不依赖应用的 startup 事件。
+    """
+
+    def __init__(self, app, monitor: LoopLagMonitor):
+        self.app = app
+        self.monitor = monitor
+
+    async def __call__(self, scope, receive, send):
+        self.monitor.ensure_started()
+        await self.app(scope, receive, send)
@@ -0,0 +1,239 @@
+import bisect
+import heapq
+import re
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# 分词：连续的字母、数字、下划线和中文等 Unicode 单词字符为一个词，不区分大小写
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class LogIndex:
+    """终端日志的增量倒排索引
+
+    词 → 按计数器递增的倒排列表。日志写入时追加，只覆盖内存缓冲区中仍保留的日志；
+    每写入 compact_interval 条清理一次已被环形缓冲区覆盖的计数器。
+    查询时按需维护排序后的词表和反转词表，前缀、后缀匹配通过二分查找完成。
+    """
+
+    def __init__(self, compact_interval: int = 20000):
+        self.compact_interval = max(1, compact_interval)
+        self._postings: Dict[str, array] = {}
+        self._since_compact = 0
+        self._sorted_tokens: List[str] = []
+        self._sorted_reversed: List[str] = []
+        # 上次排序后新增的词；有词被删除时需要重建排序词表
+        self._new_tokens: List[str] = []
+        self._tokens_removed = False
+
+    def __len__(self) -> int:
+        return len(self._postings)
+
+    def add(self, counter: int, content: str):
+        for token in set(tokenize(content)):
+            # 纯数字（坐标、耗时、tick 等）几乎都是唯一值，会让词表膨胀，不建立索引
+            if token.isdigit():
+                continue
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = array("Q")
+                self._new_tokens.append(token)
+            postings.append(counter)
+        self._since_compact += 1
+
+    def extend(self, other: "LogIndex"):
+        """追加另一个索引的倒排项，other 中的计数器需全部大于本索引"""
+        for token, postings in other._postings.items():
+            mine = self._postings.get(token)
+            if mine is None:
+                self._postings[token] = array("Q", postings)
+                self._new_tokens.append(token)
+            else:
+                mine.extend(postings)
+        self._since_compact += other._since_compact
+
+    def needs_compact(self) -> bool:
+        return self._since_compact >= self.compact_interval
+
+    def compact(self, first_counter: int):
+        """删除计数器小于 first_counter 的倒排项"""
+        self._since_compact = 0
+        empty = []
+        for token, postings in self._postings.items():
+            if postings and postings[0] < first_counter:
+                pos = bisect.bisect_left(postings, first_counter)
+                del postings[:pos]
+                if not postings:
+                    empty.append(token)
+        for token in empty:
+            del self._postings[token]
+        if empty:
+            self._tokens_removed = True
+
+    def clear(self):
+        self._postings.clear()
+        self._since_compact = 0
+        self._sorted_tokens = []
+        self._sorted_reversed = []
+        self._new_tokens = []
+        self._tokens_removed = False
+
+    def to_dict(self) -> Dict[str, List[int]]:
+        """导出倒排列表，用于持久化"""
+        return {token: postings.tolist() for token, postings in self._postings.items()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, List[int]]) -> "LogIndex":
+        """从 to_dict 的结果恢复只读索引，排序词表立即建立，之后可在多个线程中同时查询"""
+        index = cls()
+        index._postings = {token: array("Q", postings) for token, postings in data.items()}
+        index._tokens_removed = True
+        index._sort_vocabulary()
+        return index
+
+    def _sort_vocabulary(self):
+        """把新增的词并入排序词表，有词被删除时整体重建"""
+        if self._tokens_removed:
+            self._sorted_tokens = sorted(self._postings)
+            self._sorted_reversed = sorted(token[::-1] for token in self._postings)
+            self._tokens_removed = False
+        elif self._new_tokens:
+            # 已排序的列表追加一段后再排序，Timsort 只需合并两段
+            self._sorted_tokens.extend(self._new_tokens)
+            self._sorted_tokens.sort()
+            self._sorted_reversed.extend(token[::-1] for token in self._new_tokens)
+            self._sorted_reversed.sort()
+        self._new_tokens = []
+
+    @staticmethod
+    def _with_prefix(sorted_tokens: List[str], prefix: str) -> List[str]:
+        start = end = bisect.bisect_left(sorted_tokens, prefix)
+        while end < len(sorted_tokens) and sorted_tokens[end].startswith(prefix):
+            end += 1
+        return sorted_tokens[start:end]
+
+    def _matching_tokens(self, query_token: str, open_left: bool, open_right: bool) -> List[str]:
+        """查找可能包含查询词的索引词，任意片段只能遍历词表"""
+        if not open_left and not open_right:
+            return [query_token] if query_token in self._postings else []
+        if open_left and open_right:
+            return [token for token in self._postings if query_token in token]
+        self._sort_vocabulary()
+        if open_left:
+            return [token[::-1] for token in self._with_prefix(self._sorted_reversed, query_token[::-1])]
+        return self._with_prefix(self._sorted_tokens, query_token)
+
+    def iter_candidates(self, text: str, end_counter: int) -> Optional[Iterator[int]]:
+        """
+        按计数器从新到旧迭代可能包含子串 text、且计数器小于 end_counter 的日志，无法用索引缩小范围时返回 None。
+
+        子串中间的词在日志中一定是完整的词；开头的词可能是日志中某个词的后缀，结尾的词可能是前缀，
+        只有一个词时可能是任意片段。对每个查询词找出所有可能的原词，选倒排总长度最短的查询词，
+        惰性合并其倒排列表。纯数字查询词不参与筛选。结果只是候选，调用方仍需逐条确认；迭代期间需持有写入日志时的锁。
+        """
+        lowered = text.lower()
+        best = None
+        best_size = None
+        for m in _TOKEN_PATTERN.finditer(lowered):
+            if m.group().isdigit():
+                # 纯数字未建立索引，只能在确认阶段匹配
+                continue
+            tokens = self._matching_tokens(m.group(), m.start() == 0, m.end() == len(lowered))
+            size = sum(len(self._postings[token]) for token in tokens)
+            if best_size is None or size < best_size:
+                best, best_size = tokens, size
+                if size == 0:
+                    break
+        if best is None:
+            return None
+        return self._merge_descending([self._postings[token] for token in best], end_counter)
+
+    @staticmethod
+    def _merge_descending(posting_lists: List[array], end_counter: int) -> Iterator[int]:
+        def descending(postings):
+            for i in range(bisect.bisect_left(postings, end_counter) - 1, -1, -1):
+                yield postings[i]
+
+        if len(posting_lists) == 1:
+            yield from descending(posting_lists[0])
+            return
+
+        last = None
+        for counter in heapq.merge(*(descending(p) for p in posting_lists), reverse=True):
+            # 同一条日志可能同时出现在多个原词的倒排中
+            if counter != last:
+                last = counter
+                yield counter
+
+
+# JSON 序列化时会被转义的字符，查询中含有这些字符时不能直接在原始行上预筛选
+_JSON_ESCAPED = re.compile(r'["\\\x00-\x1f]')
+
+
+class LogQuery:
+    """日志搜索条件：子串或正则、级别、来源和时间范围"""
+
+    def __init__(
+        self,
+        text: str = "",
+        regex: bool = False,
+        case_sensitive: bool = False,
+        level: str = "",
+        source: str = "",
+        since_ms: Optional[int] = None,
+        until_ms: Optional[int] = None,
+    ):
+        self.text = text
+        self.regex = regex
+        self.case_sensitive = case_sensitive
+        self.levels = {lvl.strip().upper() for lvl in level.split(",") if lvl.strip()}
+        self.source = source.lower()
+        self.since_ms = since_ms
+        self.until_ms = until_ms
+
+        self._pattern = None
+        self._needle = text if case_sensitive else text.lower()
+        if text and regex:
+            # 由调用方处理 re.error
+            self._pattern = re.compile(text, 0 if case_sensitive else re.IGNORECASE)
+
+    @property
+    def uses_index(self) -> bool:
+        """是否可以用倒排索引预筛选（仅限子串搜索）"""
+        return bool(self.text) and not self.regex
+
+    def match_text(self, content: str) -> bool:
+        if not self.text:
+            return True
+        if self._pattern is not None:
+            return self._pattern.search(content) is not None
+        if self.case_sensitive:
+            return self._needle in content
+        return self._needle in content.lower()
+
+    def match(self, timestamp_ms: int, source: str, level: str, content: str) -> bool:
+        if self.since_ms is not None and timestamp_ms < self.since_ms:
+            return False
+        if self.until_ms is not None and timestamp_ms > self.until_ms:
+            return False
+        if self.levels and level.upper() not in self.levels:
+            return False
+        if self.source and self.source not in source.lower():
+            return False
+        return self.match_text(content)
+
+    def raw_prefilter(self, line: str) -> bool:
+        """在未解析的持久化行上快速排除不可能匹配的日志"""
+        if not self.text or self._pattern is not None or _JSON_ESCAPED.search(self.text):
+            return True
+        if self.case_sensitive:
+            return self._needle in line
+        return self._needle in line.lower()
+
+    def filter_records(self, records: Iterable[tuple]) -> List[tuple]:
+        """过滤持久化记录 (计数器, 毫秒时间戳, 来源, 级别, 内容)"""
+        return [r for r in records if self.match(r[1], r[2], r[3], r[4])]
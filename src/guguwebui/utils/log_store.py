@@ -0,0 +1,444 @@
+import bisect
+import json
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from .log_search import LogIndex
+
+# 一条持久化日志：(计数器, 毫秒时间戳, 来源, 级别, 内容)
+LogRecord = Tuple[int, int, str, str, str]
+
+SEGMENT_SUFFIX = ".log"
+INDEX_SUFFIX = ".idx"
+TOKEN_INDEX_SUFFIX = ".tok"
+# 稀疏索引条目：(计数器, 字节偏移)
+INDEX_ENTRY = struct.Struct("<QQ")
+# 同时缓存在内存中的分段词索引数量
+TOKEN_INDEX_CACHE_SIZE = 4
+
+
+class LogSegment:
+    """一个日志分段文件及其稀疏索引
+
+    分段文件每行一条 JSON 数组形式的日志记录，文件名为段内第一条日志的计数器；
+    同名的 .idx 文件每隔 index_interval 条记录保存一个 (计数器, 字节偏移)，用于按计数器定位。
+    分段封存（轮转）后在后台生成 .tok 词索引：词 → 包含该词的块号，块为相邻两个稀疏索引点之间的记录。
+    """
+
+    def __init__(self, path: Path, first_counter: int):
+        self.path = path
+        self.index_path = path.with_suffix(INDEX_SUFFIX)
+        self.token_index_path = path.with_suffix(TOKEN_INDEX_SUFFIX)
+        self.first_counter = first_counter
+        self.last_counter = first_counter - 1
+        self.size = 0
+        self.index_counters: List[int] = []
+        self.index_offsets: List[int] = []
+
+    def add_index(self, counter: int, offset: int):
+        self.index_counters.append(counter)
+        self.index_offsets.append(offset)
+
+    def offset_for(self, counter: int) -> int:
+        """返回不晚于指定计数器的最近索引点的字节偏移"""
+        pos = bisect.bisect_right(self.index_counters, counter) - 1
+        return self.index_offsets[pos] if pos >= 0 else 0
+
+    def block_span(self, block: int) -> Tuple[int, int]:
+        """返回第 block 个块的 (起始偏移, 结束偏移)"""
+        end = self.index_offsets[block + 1] if block + 1 < len(self.index_offsets) else self.size
+        return self.index_offsets[block], end
+
+    def load_index(self):
+        """读取稀疏索引，并从最后一个索引点向后扫描得到段内最后一条日志"""
+        self.index_counters = []
+        self.index_offsets = []
+        self.size = self.path.stat().st_size
+        try:
+            data = self.index_path.read_bytes()
+            usable = len(data) - len(data) % INDEX_ENTRY.size
+            for counter, offset in INDEX_ENTRY.iter_unpack(data[:usable]):
+                if offset >= self.size:
+                    break
+                self.add_index(counter, offset)
+        except OSError:
+            pass
+
+        # 从最后一个索引点扫描到文件末尾，截断异常退出时写了一半的行
+        offset = self.index_offsets[-1] if self.index_offsets else 0
+        valid_end = offset
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    counter = json.loads(line)[0]
+                except (ValueError, IndexError):
+                    break
+                if not self.index_offsets:
+                    self.add_index(counter, valid_end)
+                self.last_counter = counter
+                valid_end += len(line)
+        if valid_end < self.size:
+            with open(self.path, "r+b") as f:
+                f.truncate(valid_end)
+            self.size = valid_end
+
+
+class LogSegmentStore:
+    """按分段文件持久化的终端日志存储
+
+    日志按计数器顺序追加到当前分段，超过分段大小后轮转；读取时通过稀疏索引 seek 到目标位置，
+    无需把历史日志载入内存。已封存的分段由后台线程生成词索引，搜索时只读取可能匹配的块。
+    旧分段按总大小和保留天数删除。
+    """
+
+    def __init__(
+        self,
+        directory,
+        segment_bytes: int = 16 * 1024 * 1024,
+        max_bytes: int = 256 * 1024 * 1024,
+        max_age_days: int = 7,
+        index_interval: int = 128,
+    ):
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.index_interval = index_interval
+
+        self.segments: List[LogSegment] = []
+        self._file = None
+        self._index_file = None
+        self._since_index = 0
+        self._lock = threading.Lock()
+        # 等待生成词索引的分段和后台线程
+        self._token_queue = deque()
+        self._token_worker: Optional[threading.Thread] = None
+        # 最近使用的分段词索引，由 _token_lock 保护
+        self._token_cache: "OrderedDict[Path, LogIndex]" = OrderedDict()
+        self._token_lock = threading.Lock()
+        # 写入失败后停止持久化，避免在日志写入路径上反复出错
+        self.last_error: Optional[Exception] = None
+        self.closed = False
+
+    @property
+    def first_counter(self) -> int:
+        """最早一条持久化日志的计数器，没有日志时为 last_counter + 1"""
+        for segment in self.segments:
+            if segment.last_counter >= segment.first_counter:
+                return segment.first_counter
+        return self.last_counter + 1
+
+    @property
+    def last_counter(self) -> int:
+        """最新一条持久化日志的计数器，没有日志时为 0"""
+        return self.segments[-1].last_counter if self.segments else 0
+
+    def open(self):
+        """加载已有分段，准备追加写入"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        segments = []
+        for path in self.directory.glob(f"*{SEGMENT_SUFFIX}"):
+            if path.stem.isdigit():
+                segments.append(LogSegment(path, int(path.stem)))
+        segments.sort(key=lambda s: s.first_counter)
+
+        loaded = []
+        for segment in segments:
+            try:
+                segment.load_index()
+                loaded.append(segment)
+            except OSError:
+                continue
+        with self._lock:
+            self.segments = loaded
+            self._enforce_retention()
+            # 最新分段会继续写入，只为之前的分段补建词索引
+            for segment in self.segments[:-1]:
+                if not segment.token_index_path.exists():
+                    self._schedule_token_index(segment)
+        return self
+
+    def append(self, counter: int, timestamp_ms: int, source: str, level: str, content: str) -> bool:
+        """追加一条日志，计数器必须大于已写入的最后一条"""
+        if self.last_error is not None or self.closed:
+            return False
+        line = json.dumps([counter, timestamp_ms, source, level, content], ensure_ascii=False, separators=(",", ":"))
+        data = (line + "\n").encode("utf-8")
+        with self._lock:
+            try:
+                segment = self.segments[-1] if self.segments else None
+                if segment is None or self._file is None or segment.size >= self.segment_bytes:
+                    segment = self._rotate(counter)
+
+                if self._since_index == 0:
+                    entry = INDEX_ENTRY.pack(counter, segment.size)
+                    self._index_file.write(entry)
+                    segment.add_index(counter, segment.size)
+                self._since_index = (self._since_index + 1) % self.index_interval
+
+                self._file.write(data)
+                segment.size += len(data)
+                segment.last_counter = counter
+                return True
+            except OSError as e:
+                self.last_error = e
+                self._close_files()
+                return False
+
+    def read_range(self, start_counter: int, end_counter: int) -> List[LogRecord]:
+        """读取计数器位于 [start_counter, end_counter) 的日志"""
+        with self._lock:
+            self._flush_files()
+            segments = [
+                s for s in self.segments
+                if s.last_counter >= start_counter and s.first_counter < end_counter
+            ]
+
+        records: List[LogRecord] = []
+        for segment in segments:
+            try:
+                with open(segment.path, "rb") as f:
+                    f.seek(segment.offset_for(start_counter))
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue
+                        counter = record[0]
+                        if counter >= end_counter:
+                            break
+                        if counter >= start_counter:
+                            records.append(tuple(record))
+            except OSError:
+                # 分段在读取期间被保留策略删除
+                continue
+        return records
+
+    def scan_backwards(self, before_counter: int, line_filter=None, since_ms: Optional[int] = None,
+                       max_segments: int = 4, index_text: Optional[str] = None) -> Tuple[List[LogRecord], int]:
+        """
+        从新到旧扫描计数器小于 before_counter 的日志，用于搜索。
+
+        每次最多扫描 max_segments 个分段；line_filter 在解析 JSON 前对原始行做快速排除。
+        指定 index_text（内容包含的子串）时，已有词索引的分段只读取可能包含该子串的块。
+
+        Returns:
+            (记录列表（从新到旧）, 继续扫描时使用的 before_counter，已扫描到最早的日志时为 0)
+        """
+        with self._lock:
+            self._flush_files()
+            segments = [s for s in self.segments if s.first_counter < before_counter and s.last_counter >= s.first_counter]
+            active = self.segments[-1] if self.segments else None
+
+        records: List[LogRecord] = []
+        next_before = 0
+        scanned = 0
+        for segment in reversed(segments):
+            if scanned >= max_segments:
+                next_before = segment.last_counter + 1
+                break
+            scanned += 1
+            if since_ms is not None:
+                try:
+                    # 分段最后写入时间早于起始时间，其中及更早的分段都不可能匹配
+                    if segment.path.stat().st_mtime * 1000 < since_ms:
+                        break
+                except OSError:
+                    continue
+
+            candidates = None
+            if index_text and segment is not active:
+                token_index = self._get_token_index(segment)
+                if token_index is not None:
+                    end_block = bisect.bisect_left(segment.index_counters, before_counter)
+                    candidates = token_index.iter_candidates(index_text, end_block)
+
+            try:
+                with open(segment.path, "rb") as f:
+                    if candidates is None:
+                        records.extend(reversed(self._filter_lines(f, line_filter, before_counter)))
+                        continue
+                    # 候选块按从新到旧排列
+                    for block in candidates:
+                        start, end = segment.block_span(block)
+                        f.seek(start)
+                        lines = f.read(end - start).splitlines()
+                        records.extend(reversed(self._filter_lines(lines, line_filter, before_counter)))
+            except OSError:
+                continue
+        return records, next_before
+
+    @staticmethod
+    def _filter_lines(lines: Iterable[bytes], line_filter, before_counter: int) -> List[LogRecord]:
+        """解析原始行中计数器小于 before_counter 且通过 line_filter 的记录（从旧到新）"""
+        matched = []
+        for raw in lines:
+            line = raw.decode("utf-8", errors="replace")
+            if line_filter is not None and not line_filter(line):
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record[0] >= before_counter:
+                break
+            matched.append(tuple(record))
+        return matched
+
+    def read_tail(self, count: int) -> List[LogRecord]:
+        """读取最近的 count 条日志"""
+        last = self.last_counter
+        return self.read_range(max(self.first_counter, last - count + 1), last + 1)
+
+    def flush(self):
+        with self._lock:
+            self._flush_files()
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            self._close_files()
+            self._token_queue.clear()
+        with self._token_lock:
+            self._token_cache.clear()
+
+    def _rotate(self, first_counter: int) -> LogSegment:
+        """开始一个新的分段，调用方需持有 self._lock"""
+        self._close_files()
+        segment = self.segments[-1] if self.segments else None
+        # 复用当前分段：重新打开（如重载后）且未超过分段大小时继续写入
+        if segment is None or segment.size >= self.segment_bytes:
+            if segment is not None:
+                # 上一个分段不再写入，为其生成词索引
+                self._schedule_token_index(segment)
+            path = self.directory / f"{first_counter:012d}{SEGMENT_SUFFIX}"
+            segment = LogSegment(path, first_counter)
+            self.segments.append(segment)
+            self._since_index = 0
+            self._enforce_retention()
+        else:
+            # 从下一个记录开始补充索引点，保证续写部分可被定位
+            self._since_index = 0
+        self._file = open(segment.path, "ab")
+        self._index_file = open(segment.index_path, "ab")
+        return segment
+
+    def _enforce_retention(self):
+        """按总大小和保留天数删除旧分段（始终保留最新分段），调用方需持有 self._lock"""
+        expire_before = time.time() - self.max_age_days * 86400
+        total = sum(s.size for s in self.segments)
+        while len(self.segments) > 1:
+            oldest = self.segments[0]
+            try:
+                expired = oldest.path.stat().st_mtime < expire_before
+            except OSError:
+                expired = True
+            if total <= self.max_bytes and not expired:
+                break
+            for path in (oldest.path, oldest.index_path, oldest.token_index_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= oldest.size
+            self.segments.pop(0)
+            with self._token_lock:
+                self._token_cache.pop(oldest.path, None)
+
+    def _schedule_token_index(self, segment: LogSegment):
+        """把已封存的分段加入词索引生成队列，调用方需持有 self._lock"""
+        self._token_queue.append(segment)
+        if self._token_worker is None or not self._token_worker.is_alive():
+            self._token_worker = threading.Thread(
+                target=self._token_index_loop, name="GUGUWebUI-LogTokenIndex", daemon=True
+            )
+            self._token_worker.start()
+
+    def _token_index_loop(self):
+        while True:
+            with self._lock:
+                if self.closed or not self._token_queue:
+                    self._token_worker = None
+                    return
+                segment = self._token_queue.popleft()
+            try:
+                self._build_token_index(segment)
+            except (OSError, ValueError):
+                # 分段已被删除或内容损坏，搜索时回退为逐行扫描
+                continue
+            with self._lock:
+                removed = segment not in self.segments
+            if removed:
+                # 生成期间分段被保留策略删除
+                try:
+                    os.remove(segment.token_index_path)
+                except OSError:
+                    pass
+
+    def _build_token_index(self, segment: LogSegment):
+        """读取分段内容生成词索引文件，块号对应稀疏索引点的序号"""
+        index = LogIndex()
+        with open(segment.path, "rb") as f:
+            for block in range(len(segment.index_offsets)):
+                start, end = segment.block_span(block)
+                f.seek(start)
+                contents = []
+                for raw in f.read(end - start).splitlines():
+                    try:
+                        contents.append(json.loads(raw)[4])
+                    except (ValueError, IndexError):
+                        continue
+                # 同一块内的词只记录一次
+                index.add(block, "\n".join(contents))
+        data = {"size": segment.size, "blocks": len(segment.index_offsets), "tokens": index.to_dict()}
+        temp_path = segment.token_index_path.with_name(segment.token_index_path.name + ".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp_path, segment.token_index_path)
+
+    def _get_token_index(self, segment: LogSegment) -> Optional[LogIndex]:
+        """读取分段的词索引，尚未生成或与分段内容不一致时返回 None"""
+        with self._token_lock:
+            index = self._token_cache.get(segment.path)
+            if index is not None:
+                self._token_cache.move_to_end(segment.path)
+                return index
+        try:
+            with open(segment.token_index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("size") != segment.size or data.get("blocks") != len(segment.index_offsets):
+            return None
+        index = LogIndex.from_dict(data.get("tokens", {}))
+        with self._token_lock:
+            self._token_cache[segment.path] = index
+            while len(self._token_cache) > TOKEN_INDEX_CACHE_SIZE:
+                self._token_cache.popitem(last=False)
+        return index
+
+    def _flush_files(self):
+        for f in (self._file, self._index_file):
+            if f is not None:
+                try:
+                    f.flush()
+                except OSError:
+                    pass
+
+    def _close_files(self):
+        for f in (self._file, self._index_file):
+            if f is not None:
+                try:
+                    f.close()
+                except OSError:
+                    pass
+        self._file = None
+        self._index_file = None
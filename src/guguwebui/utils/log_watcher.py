@@ -1,34 +1,319 @@
 import re
 import time
+import asyncio
 import threading
 import os
 import logging
 import sys
-from io import StringIO
-from typing import List, Dict, Set, Optional, Any
+from typing import List, Dict, Optional, Any
 import queue
 import datetime
+from collections import OrderedDict, deque
+
+from .log_search import LogIndex, LogQuery
+from .stream_hub import StreamHub
+
+# 终端日志环形缓冲区默认容量（行）
+DEFAULT_LOG_BUFFER_SIZE = 20000
+
+# 日志去重窗口：同一条日志在窗口时间（秒）内被多个捕获路径重复捕获时只保留一次
+DEDUP_WINDOW = 2.0
+DEDUP_MAX_ENTRIES = 4096
+
+# 捕获器待处理队列容量，队列只在等待日志匹配时被读取，写满后丢弃最旧的日志
+LOG_QUEUE_SIZE = 1000
+
+
+def _put_bounded(log_queue: queue.Queue, item):
+    """放入有界队列，队列已满时丢弃最旧的一条"""
+    while True:
+        try:
+            log_queue.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                log_queue.get_nowait()
+            except queue.Empty:
+                pass
+
+# 颜色代码清理正则，模块加载时编译一次
+# Minecraft 颜色代码（§ 后面跟着一个字符），与原先一样最先清理，
+# 夹在 ANSI 代码中间的 § 代码（如 [§a3m）清理后剩余部分仍会被识别为 ANSI 代码
+_MC_COLOR_PATTERN = re.compile(r'§[0-9a-fk-or]')
+# 按原先逐条替换的顺序合并为单次扫描：ANSI 转义序列、
+# 丢失 ESC 前缀的 ANSI 代码（如 [37m、[37;2m、[0m）以及其他残留的 ANSI 代码格式。
+# 与原先的区别：只有去掉一段 ANSI 代码后才拼接出的代码（如 [3[31mm）不会被再次清理
+_ANSI_CODE_PATTERN = re.compile(
+    r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])'
+    r'|\[\d+(?:;\d+)*m'
+    r'|(?<!\[)\[\d*[a-z](?!\])'
+)
+
 
 def clean_color_codes(text):
     """清理 Minecraft 颜色代码和 ANSI 转义序列"""
-    # 清理 Minecraft 颜色代码（§ 后面跟着一个字符）
-    text = re.sub(r'§[0-9a-fk-or]', '', text)
-    
-    # 清理 ANSI 颜色代码
-    ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-    text = ansi_escape.sub('', text)
-    
-    # 清理类似 [37m, [2m, [0m 等形式的 ANSI 代码
-    text = re.sub(r'\[\d+m', '', text)
-    
-    # 清理其他形式的ANSI代码，包括组合形式如[37m[2m
-    text = re.sub(r'\[\d+(?:;\d+)*m', '', text)
-    text = re.sub(r'\[0m', '', text)
-    
-    # 清理可能残留的其他ANSI代码格式
-    text = re.sub(r'(?<!\[)\[\d*[a-z](?!\])', '', text)
-    
-    return text
+    if '§' in text:
+        text = _MC_COLOR_PATTERN.sub('', text)
+    # 快速路径：不含任何 ANSI 代码起始字符时直接返回
+    if '\x1b' not in text and '[' not in text:
+        return text
+    return _ANSI_CODE_PATTERN.sub('', text)
+
+class LogEntry:
+    """一条终端日志记录
+
+    在写入时解析并清理一次，读取接口直接切片和序列化，不再重复解析格式化后的字符串。
+    """
+
+    __slots__ = ('counter', 'timestamp_ms', 'source', 'level', 'content', 'is_command')
+
+    def __init__(self, counter: int, timestamp_ms: int, source: str, level: str, content: str):
+        self.counter = counter
+        self.timestamp_ms = timestamp_ms
+        self.source = source
+        self.level = level
+        # 已清理颜色代码的日志正文
+        self.content = content
+        # 是否是控制台输入的MCDR命令（以!!开头）
+        self.is_command = source == "InfoSource.CONSOLE" and "!!" in content
+
+    @property
+    def timestamp_str(self) -> str:
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.timestamp_ms / 1000))
+
+    @property
+    def text(self) -> str:
+        """不带计数器前缀的日志行，格式为 `[时间] [来源/级别] 内容`"""
+        return f"[{self.timestamp_str}] [{self.source}/{self.level}] {self.content}"
+
+    def format_line(self) -> str:
+        """带计数器前缀的日志行，与终端页面显示的格式一致"""
+        return f"[#{self.counter}] {self.text}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """序列化为接口返回的日志条目"""
+        timestamp_str = self.timestamp_str
+        return {
+            "line_number": self.counter - 1,
+            "counter": self.counter,
+            "timestamp": timestamp_str,
+            "timestamp_value": self.timestamp_ms / 1000,
+            "sequence_num": self.counter,
+            "content": f"[#{self.counter}] [{timestamp_str}] [{self.source}/{self.level}] {self.content}\n",
+            "source": "all",
+            "log_source": self.source,
+            "level": self.level,
+            "is_command": self.is_command
+        }
+
+class LogRingBuffer:
+    """固定容量的环形日志缓冲区，以单调递增的日志计数器作为下标
+
+    计数器为 N 的日志存放在 ``(N - 1) % capacity`` 号槽位中，
+    按计数器定位和截取区间都无需扫描，写满后自动覆盖最旧的日志。
+    """
+
+    def __init__(self, capacity: int = DEFAULT_LOG_BUFFER_SIZE, last_counter: int = 0):
+        self.capacity = max(1, int(capacity))
+        self._slots: List[Any] = [None] * self.capacity
+        self._size = 0
+        # 最新一条日志的计数器，0 表示尚未写入任何日志；从持久化日志续接时为其最后一条的计数器
+        self.last_counter = last_counter
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def first_counter(self) -> int:
+        """最早仍被保留的日志计数器，缓冲区为空时等于 last_counter + 1"""
+        return self.last_counter - self._size + 1
+
+    def append(self, item) -> int:
+        """追加一条日志，返回分配给它的计数器"""
+        self.last_counter += 1
+        self._slots[(self.last_counter - 1) % self.capacity] = item
+        if self._size < self.capacity:
+            self._size += 1
+        return self.last_counter
+
+    def get(self, counter: int):
+        """按计数器获取日志，已被覆盖或尚未写入时返回 None"""
+        if self.first_counter <= counter <= self.last_counter:
+            return self._slots[(counter - 1) % self.capacity]
+        return None
+
+    def range(self, start_counter: int, end_counter: int) -> List[Any]:
+        """获取计数器位于 [start_counter, end_counter) 且仍被保留的日志"""
+        start = max(start_counter, self.first_counter)
+        end = min(end_counter, self.last_counter + 1)
+        if start >= end:
+            return []
+        count = end - start
+        begin = (start - 1) % self.capacity
+        if begin + count <= self.capacity:
+            return self._slots[begin:begin + count]
+        return self._slots[begin:] + self._slots[:begin + count - self.capacity]
+
+    def tail(self, count: int) -> List[Any]:
+        """获取最近的 count 条日志"""
+        if count <= 0:
+            return []
+        return self.range(self.last_counter - count + 1, self.last_counter + 1)
+
+    def clear(self):
+        """清空缓冲区，计数器保持不变以免客户端重复拉取"""
+        self._slots = [None] * self.capacity
+        self._size = 0
+
+class RecentKeyWindow:
+    """有界的近期去重窗口
+
+    按出现顺序记录最近的键及其时间，超出时间窗口或容量上限的旧键从头部淘汰，
+    内存占用恒定，也不会像整体清空集合那样在清空后放过重复日志。非线程安全，由调用方加锁。
+    """
+
+    def __init__(self, max_entries: int = DEDUP_MAX_ENTRIES, window: float = DEDUP_WINDOW):
+        self.max_entries = max_entries
+        self.window = window
+        self._entries: "OrderedDict[Any, float]" = OrderedDict()
+
+    def seen(self, key, now: Optional[float] = None) -> bool:
+        """键在窗口内出现过时返回 True，否则记录该键并返回 False"""
+        if now is None:
+            now = time.monotonic()
+        entries = self._entries
+
+        # 淘汰超出时间窗口的旧键（按插入顺序即时间顺序）
+        cutoff = now - self.window
+        while entries:
+            oldest_key = next(iter(entries))
+            if entries[oldest_key] >= cutoff:
+                break
+            entries.popitem(last=False)
+
+        if key in entries:
+            return True
+
+        entries[key] = now
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        return False
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class LogWatch:
+    """一个日志监听任务
+
+    由 `LogWatcher.add_watch` 创建。每个监听有独立的模式列表、匹配条件、超时和回调，
+    可以用 `wait`（阻塞）或 `wait_async`（协程）等待结果，多个监听之间互不影响。
+    """
+
+    def __init__(self, watcher: "LogWatcher", patterns, match_all: bool = True,
+                 timeout: Optional[float] = None, callback=None):
+        self.watcher = watcher
+        self.patterns = list(patterns)
+        self.match_all = match_all
+        self.callback = callback
+        # 每个模式的匹配状态
+        self.result: Dict[Any, bool] = {pattern: False for pattern in self.patterns}
+        self.done = False
+
+        self._compiled = [(pattern, re.compile(pattern)) for pattern in self.patterns]
+        self._event = threading.Event()
+        self._async_waiters: List[tuple] = []
+        self._waiter_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        if timeout is not None:
+            # 超时后自动结束，保证只注册回调的监听也能收到结果
+            self._timer = threading.Timer(timeout, self.cancel)
+            self._timer.daemon = True
+
+    @property
+    def matched(self) -> bool:
+        """是否满足匹配条件"""
+        if not self.result:
+            return False
+        if self.match_all:
+            return all(self.result.values())
+        return any(self.result.values())
+
+    def _match(self, line: str, prefilter_hit: bool) -> bool:
+        """对一行日志进行匹配，满足条件时返回 True，调用方需持有 watcher 的锁"""
+        for pattern, compiled in self._compiled:
+            if self.result[pattern]:
+                continue
+            # 可合并的模式在组合预筛选未命中时必然不匹配，跳过
+            if not prefilter_hit and _is_prefilterable(compiled):
+                continue
+            if compiled.search(line):
+                self.result[pattern] = True
+        return self.matched
+
+    def _finish(self):
+        """标记监听结束并通知所有等待者，需在 watcher 的锁外调用"""
+        with self._waiter_lock:
+            if self.done:
+                return
+            self.done = True
+            waiters, self._async_waiters = self._async_waiters, []
+        if self._timer:
+            self._timer.cancel()
+        self._event.set()
+
+        result = dict(self.result)
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve_future, future, result)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+
+        if self.callback:
+            try:
+                self.callback(self)
+            except Exception as e:
+                if self.watcher.server_interface:
+                    self.watcher.server_interface.logger.error(f"日志监听回调出错: {e}")
+
+    def cancel(self):
+        """取消监听，等待者立即收到当前的匹配结果"""
+        self.watcher.remove_watch(self)
+        self._finish()
+
+    def wait(self, timeout: Optional[float] = None) -> Dict[Any, bool]:
+        """阻塞等待监听结束，超时后取消监听并返回当前结果"""
+        if not self._event.wait(timeout):
+            self.cancel()
+        return dict(self.result)
+
+    async def wait_async(self, timeout: Optional[float] = None) -> Dict[Any, bool]:
+        """在事件循环中等待监听结束，超时后取消监听并返回当前结果"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._waiter_lock:
+            if self.done:
+                return dict(self.result)
+            self._async_waiters.append((loop, future))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.cancel()
+            return dict(self.result)
+
+
+def _resolve_future(future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+def _is_prefilterable(compiled) -> bool:
+    """模式能否合并进组合正则：含捕获组（反向引用编号会错位）或带编译标志的模式需单独匹配"""
+    return compiled.groups == 0 and not (compiled.flags & ~re.UNICODE)
+
 
 class LogHandler(logging.Handler):
     """自定义日志处理器，用于捕获MCDR和服务器日志"""
@@ -36,29 +321,24 @@ class LogHandler(logging.Handler):
     def __init__(self):
         super().__init__()
         self.setLevel(logging.DEBUG)
-        self.log_queue = queue.Queue()
+        self.log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
         self.formatter = logging.Formatter(
             '[%(name)s] [%(asctime)s.%(msecs)03d] [%(threadName)s/%(levelname)s]: %(message)s', 
             datefmt='%Y-%m-%d %H:%M:%S'
         )
         
-        # 设置已处理的记录ID集合，避免重复处理
-        self._handled_records: Set[int] = set()
+        # 近期已处理的记录，避免同一条记录经由控制台处理器拦截和直接挂载被重复处理
+        self._handled_records = RecentKeyWindow()
         # 记录处理锁，保证线程安全
         self._lock = threading.Lock()
         
     def emit(self, record: logging.LogRecord):
         """处理日志记录"""
-        # 使用记录ID避免重复处理同一条日志
-        record_id = id(record)
+        # 使用记录的来源、创建时间和位置识别同一条日志（对象ID在回收后会被复用）
+        record_key = (record.name, record.created, record.pathname, record.lineno)
         with self._lock:
-            if record_id in self._handled_records:
+            if self._handled_records.seen(record_key):
                 return
-            self._handled_records.add(record_id)
-            
-            # 限制已处理记录集合大小，避免内存泄漏
-            if len(self._handled_records) > 10000:
-                self._handled_records.clear()
                 
         try:
             # 格式化日志消息
@@ -66,7 +346,7 @@ class LogHandler(logging.Handler):
             # 清理颜色代码
             msg = clean_color_codes(msg)
             # 将日志放入队列
-            self.log_queue.put(msg)
+            _put_bounded(self.log_queue, msg)
         except Exception:
             self.handleError(record)
     
@@ -93,14 +373,11 @@ class LogHandler(logging.Handler):
         except Exception:
             pass
 
-class MCServerLogCapture(threading.Thread):
-    """专门用于捕获Minecraft服务器日志的线程"""
+class MCServerLogCapture:
+    """专门用于捕获Minecraft服务器日志，由服务器输出事件驱动，不占用线程"""
     
     def __init__(self):
-        super().__init__(name="MC-Log-Capture")
-        self.daemon = True  # 设为守护线程，不阻止程序退出
-        self.running = True
-        self.log_queue = queue.Queue()
+        self.log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
         
         # 存储上一次收到的信息
         self._last_info = None
@@ -113,39 +390,22 @@ class MCServerLogCapture(threading.Thread):
         """设置父 LogWatcher 的引用"""
         self.log_watcher = log_watcher
         
-    def stop(self):
-        """停止捕获线程"""
-        self.running = False
-        
     def on_info(self, server, info):
         """处理新收到的服务器信息"""
         with self._lock:
-            # 获取日志类型和来源
-            source = getattr(info, 'source', 'Unknown')
-            is_user = getattr(info, 'is_user', False)
-            is_player = hasattr(info, 'player') and info.player
-            
-            # 根据不同类型构建不同格式的日志
-            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+            # 获取日志来源
+            source = str(getattr(info, 'source', 'Unknown'))
             
             # 获取内容并清理颜色代码
             content = clean_color_codes(info.content) if hasattr(info, 'content') else ''
-
-            log_line = f"[{timestamp}] [{str(source)}/INFO] {content}"
-
-            # MCDR格式的日志 - 将 source 转换为字符串
-            mcdr_log_line = f"[{timestamp}] [{str(source)}/INFO] {content}"
             
-            # 如果有父 LogWatcher，使用它的去重方法添加两种格式
+            # 如果有父 LogWatcher，使用它的去重方法添加
             if self.log_watcher and hasattr(self.log_watcher, '_add_log_line'):
-                # 添加普通格式日志
-                self.log_watcher._add_log_line(log_line)
-                # 添加MCDR格式日志
-                self.log_watcher._add_log_line(mcdr_log_line)
+                self.log_watcher._add_log_line(content, source, "INFO")
             else:
                 # 否则直接加入队列
-                self.log_queue.put(log_line)
-                self.log_queue.put(mcdr_log_line)
+                timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+                _put_bounded(self.log_queue, f"[{timestamp}] [{source}/INFO] {content}")
             
     def get_logs(self, max_count=100) -> List[str]:
         """获取捕获的日志，最多返回max_count条"""
@@ -169,48 +429,89 @@ class MCServerLogCapture(threading.Thread):
                 self.log_queue.get_nowait()
         except Exception:
             pass
-            
-    def run(self):
-        """线程主循环"""
-        while self.running:
-            # 短暂休眠以减少CPU占用
-            time.sleep(0.05)
+
+# 单行未换行输出的最大累积长度，超出后按一行处理，避免缓冲区无限增长
+STDOUT_MAX_PENDING = 64 * 1024
+
+
+class _InterceptedStream:
+    """替换 sys.stdout / sys.stderr 的包装流
+
+    写入时只把片段追加到列表，遇到换行才拼接出完整的行交给拦截器的队列，
+    每个字符只被处理一次，不会因为长行被反复拼接和分割。
+    """
+
+    def __init__(self, original_stream, interceptor):
+        self.original_stream = original_stream
+        self.interceptor = interceptor
+        self._pending: List[str] = []
+        self._pending_len = 0
+        self._lock = threading.Lock()
+
+    def write(self, message):
+        result = self.original_stream.write(message)
+        if self.interceptor.enabled and message:
+            try:
+                self._collect(message)
+            except Exception:
+                pass
+        return result
+
+    def _collect(self, message):
+        with self._lock:
+            if '\n' not in message:
+                self._pending.append(message)
+                self._pending_len += len(message)
+                if self._pending_len < STDOUT_MAX_PENDING:
+                    return
+                lines = [''.join(self._pending)]
+                self._pending.clear()
+                self._pending_len = 0
+            else:
+                lines = message.split('\n')
+                if self._pending:
+                    lines[0] = ''.join(self._pending) + lines[0]
+                    self._pending.clear()
+                # 最后一段没有换行，保留到下次写入
+                tail = lines.pop()
+                self._pending_len = len(tail)
+                if tail:
+                    self._pending.append(tail)
+        self.interceptor.line_queue.put(lines)
+
+    def flush(self):
+        self.original_stream.flush()
+
+    # 确保其他属性传递到原始流
+    def __getattr__(self, name):
+        return getattr(self.original_stream, name)
+
 
 # 标准输出拦截器
 class StdoutInterceptor:
-    """拦截标准输出和标准错误流的类"""
+    """拦截标准输出和标准错误流的类
+
+    写入方只做列表追加和换行分割，完整的行通过 SimpleQueue 交给后台线程，
+    由后台线程调用 `LogWatcher.capture_stdout_line` 解析，不拖慢控制台输出。
+    """
     
     def __init__(self, log_watcher):
         self.original_stdout = sys.stdout
         self.original_stderr = sys.stderr
         self.log_watcher = log_watcher
-        self.buffer = ""
-        self.lock = threading.Lock()
         self.enabled = True
+        self.line_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._consumer: Optional[threading.Thread] = None
         
     def start_interception(self):
         """开始拦截标准输出和标准错误"""
-        # 创建拦截器实例
-        class InterceptedStream:
-            def __init__(self, original_stream, interceptor):
-                self.original_stream = original_stream
-                self.interceptor = interceptor
-                
-            def write(self, message):
-                self.original_stream.write(message)
-                if self.interceptor.enabled:
-                    self.interceptor.process_output(message)
-                
-            def flush(self):
-                self.original_stream.flush()
-                
-            # 确保其他属性传递到原始流
-            def __getattr__(self, name):
-                return getattr(self.original_stream, name)
-                
+        self.enabled = True
+        self._consumer = threading.Thread(target=self._consume, name="GUGUWebUI-Stdout-Capture", daemon=True)
+        self._consumer.start()
+        
         # 替换标准输出和标准错误
-        sys.stdout = InterceptedStream(self.original_stdout, self)
-        sys.stderr = InterceptedStream(self.original_stderr, self)
+        sys.stdout = _InterceptedStream(self.original_stdout, self)
+        sys.stderr = _InterceptedStream(self.original_stderr, self)
         
         # 打印调试信息
         if self.log_watcher.server_interface:
@@ -221,27 +522,39 @@ class StdoutInterceptor:
         self.enabled = False
         sys.stdout = self.original_stdout
         sys.stderr = self.original_stderr
+        
+        # 通知后台线程退出
+        self.line_queue.put(None)
+        if self._consumer and self._consumer is not threading.current_thread():
+            self._consumer.join(timeout=1)
+        self._consumer = None
+        
         if self.log_watcher.server_interface:
             self.log_watcher.server_interface.logger.debug("标准输出和标准错误拦截器已停止")
         
-    def process_output(self, message):
-        """处理拦截到的输出"""
-        with self.lock:
-            # 累积缓冲区
-            self.buffer += message
-            
-            # 检查是否有完整的行
-            if '\n' in self.buffer:
-                lines = self.buffer.split('\n')
-                # 最后一行可能不完整，保留在缓冲区
-                self.buffer = lines[-1]
+    def _consume(self):
+        """后台线程：阻塞等待完整的行并交给 LogWatcher 解析"""
+        while True:
+            lines = self.line_queue.get()
+            if lines is None:
+                break
+            for line in lines:
+                try:
+                    self.log_watcher.capture_stdout_line(line.rstrip('\r'))
+                except Exception:
+                    pass
 
 class LogWatcher:
-    def __init__(self, server_interface=None):
+    def __init__(self, server_interface=None, buffer_size: int = DEFAULT_LOG_BUFFER_SIZE, log_store=None,
+                 capture_stdout: bool = False):
         self._lock = threading.Lock()
-        self._patterns = []
-        self._result = {}
-        self._watching = False
+        
+        # 活动的日志监听，以及由其中可合并模式组成的组合预筛选正则
+        self._watches: List[LogWatch] = []
+        self._watch_prefilter = None
+        self._watch_full_scan = False
+        # start_watch / get_result 使用的监听
+        self._legacy_watch: Optional[LogWatch] = None
         
         # 保存服务器接口
         self.server_interface = server_interface
@@ -253,14 +566,24 @@ class LogWatcher:
         # 设置互相引用
         self.mc_log_capture.set_log_watcher(self)
         
-        # 存储捕获的日志
-        if not hasattr(self, 'captured_logs'):
-            self.captured_logs = []
+        # 存储捕获的日志（按日志计数器寻址的环形缓冲区）
+        # 启用持久化时计数器从磁盘上最后一条日志续接，并预载最近的日志，重载后历史不丢失
+        self.log_store = log_store
+        # 待持久化的日志，在锁内按计数器顺序加入，在锁外由一个线程依次写入
+        self._persist_queue = deque()
+        self._persist_lock = threading.Lock()
+        self.captured_logs = LogRingBuffer(buffer_size)
+        # 内存中日志的倒排索引，用于 /api/logs/search
+        self.log_index = LogIndex(compact_interval=buffer_size)
+        if log_store is not None:
+            self._load_persisted_logs(buffer_size)
         self.mcdr_loggers = []
         
-        # 跟踪日志行号和去重
-        self.log_counter = 0
-        self._handled_log_hashes = set()
+        # 日志去重，所有捕获路径（StreamHandler、控制台处理器、RText、GENERAL_INFO 事件）共用
+        self._recent_logs = RecentKeyWindow()
+        
+        # 实时日志推送中心，新日志写入后推送给 /api/logs/stream 的订阅者
+        self.stream_hub = StreamHub()
         
         # 拦截标准 logging.StreamHandler 的 emit 方法，捕获所有日志
         self.original_stream_handler_emit = logging.StreamHandler.emit
@@ -271,11 +594,9 @@ class LogWatcher:
                 
                 # 捕获日志记录
                 if 'mcdreforged' in record.name.lower() or 'mcdr' in record.name.lower():
-                    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
                     formatter = logging.Formatter('%(message)s')
                     message = formatter.format(record)
-                    log_line = f"[{timestamp}] [{record.name}/{record.levelname}] {message}"
-                    self._add_log_line(log_line)
+                    self._add_log_line(clean_color_codes(message), record.name, record.levelname)
                     
                 return result
             except Exception as e:
@@ -287,13 +608,34 @@ class LogWatcher:
         if self.server_interface:
             self.server_interface.logger.debug("已拦截 logging.StreamHandler.emit 方法，可以捕获所有日志输出")
         
-        # 创建并启动标准输出拦截器
-        self.stdout_interceptor = StdoutInterceptor(self)
-        self.stdout_interceptor.start_interception()
-        
-        # 启动MC日志捕获线程
-        self.mc_log_capture.start()
+        # 按配置创建并启动标准输出拦截器（MCDR 日志已由上面的拦截捕获，默认不启用）
+        self.stdout_interceptor = None
+        if capture_stdout:
+            self.stdout_interceptor = StdoutInterceptor(self)
+            self.stdout_interceptor.start_interception()
         
+    @property
+    def log_counter(self) -> int:
+        """最新一条日志的计数器"""
+        return self.captured_logs.last_counter
+
+    def _load_persisted_logs(self, buffer_size):
+        """从持久化存储预载最近的日志到环形缓冲区"""
+        try:
+            records = self.log_store.read_tail(buffer_size)
+        except Exception as e:
+            records = []
+            if self.server_interface:
+                self.server_interface.logger.error(f"读取持久化日志失败: {e}")
+        start_counter = records[0][0] if records else self.log_store.last_counter + 1
+        self.captured_logs = LogRingBuffer(buffer_size, last_counter=start_counter - 1)
+        for record in records:
+            if record[0] != self.captured_logs.last_counter + 1:
+                # 计数器不连续时丢弃之前的日志，保证槽位与计数器一一对应
+                self.captured_logs = LogRingBuffer(buffer_size, last_counter=record[0] - 1)
+            self.captured_logs.append(LogEntry(*record))
+            self.log_index.add(record[0], record[4])
+
     def capture_stdout_line(self, line):
         """捕获标准输出中的日志行"""
         if not line.strip():
@@ -312,33 +654,29 @@ class LogWatcher:
             # 提取时间戳
             timestamp_match = re.search(r'\[(\d{2}:\d{2}:\d{2})\]', line)
             if timestamp_match:
-                timestamp = timestamp_match.group(1)
-                # 构建完整的时间戳
+                # 使用今天的日期构建完整的时间戳
                 today = time.strftime("%Y-%m-%d")
-                full_timestamp = f"{today} {timestamp}"
-                # 重新格式化为标准格式
+                try:
+                    timestamp = time.mktime(time.strptime(f"{today} {timestamp_match.group(1)}", "%Y-%m-%d %H:%M:%S"))
+                except ValueError:
+                    timestamp = None
                 if is_mcdr_log:
-                    log_line = f"[{full_timestamp}] {line}"
+                    source = "MCDR"
                 elif is_server_log:
-                    log_line = f"[{full_timestamp}] [SERVER/INFO] {line}"
+                    source = "SERVER"
                 else:
-                    log_line = f"[{full_timestamp}] [TaskExecutor/INFO] {line}"
+                    source = "TaskExecutor"
                     
                 # 添加到日志队列
-                self._add_log_line(log_line)
+                self._add_log_line(line, source, "INFO", timestamp)
                 return
         
         # 如果没有找到时间戳或不是标准格式，尝试解析一般格式
         if '[' in line and ']' in line:
-            # 添加一个通用时间戳
-            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-            log_line = f"[{timestamp}] [STDOUT/INFO] {line}"
-            self._add_log_line(log_line)
+            self._add_log_line(line, "STDOUT", "INFO")
         else:
             # 未识别的格式，添加为控制台输出
-            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-            log_line = f"[{timestamp}] [CONSOLE/INFO] {line}"
-            self._add_log_line(log_line)
+            self._add_log_line(line, "CONSOLE", "INFO")
             
     def _setup_log_capture(self):
         """设置日志捕获"""
@@ -404,13 +742,11 @@ class LogWatcher:
                     original_print = RTextBase.print
                     # 保存原始方法以便恢复
                     RTextBase._original_print = original_print
-                    def intercepted_print(self, *args, **kwargs):
-                        result = original_print(self, *args, **kwargs)
+                    log_watcher = self
+                    def intercepted_print(rtext, *args, **kwargs):
+                        result = original_print(rtext, *args, **kwargs)
                         # 捕获输出到日志
-                        text = str(self)
-                        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-                        log_line = f"[{timestamp}] [RText/INFO] {text}"
-                        self._add_log_line(log_line)
+                        log_watcher._add_log_line(clean_color_codes(str(rtext)), "RText", "INFO")
                         return result
                     RTextBase.print = intercepted_print
                     if self.server_interface:
@@ -480,20 +816,90 @@ class LogWatcher:
         
         # 处理MCDR日志，使用去重机制
         for log in mcdr_logs:
-            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-            log_line = f"[{timestamp}] [LogHandler/INFO] {log}"
-            if self._add_log_line(log_line):
-                new_logs.append(log_line)
+            entry = self._add_log_line(log, "LogHandler", "INFO")
+            if entry:
+                new_logs.append(entry.text)
         
         return new_logs
 
-    def _process_lines(self, lines):
-        """处理读取的日志行，更新匹配状态。"""
+    def add_watch(self, patterns, match_all=True, timeout=None, callback=None) -> LogWatch:
+        """
+        注册一个日志监听。
+
+        Args:
+            patterns (list): 需要匹配的正则表达式（字符串或已编译的正则）列表。
+            match_all (bool): 是否要求所有模式都匹配才算完成，否则任意一个匹配即完成。
+            timeout (float): 超时时间，单位：秒，超时后监听自动结束；为 None 时不超时。
+            callback (callable): 监听结束时以 LogWatch 为参数调用，在写入日志的线程中执行，应尽快返回。
+
+        Returns:
+            LogWatch: 监听对象，可通过 `wait` / `wait_async` 等待结果。
+        """
+        watch = LogWatch(self, patterns, match_all, timeout, callback)
         with self._lock:
-            for line in lines:
-                for pattern in self._patterns:
-                    if re.search(pattern, line):
-                        self._result[pattern] = True
+            self._watches.append(watch)
+            self._rebuild_watch_prefilter()
+        if watch._timer:
+            watch._timer.start()
+        return watch
+
+    def remove_watch(self, watch: LogWatch):
+        """移除日志监听，不通知等待者"""
+        with self._lock:
+            if watch in self._watches:
+                self._watches.remove(watch)
+                self._rebuild_watch_prefilter()
+
+    def wait_for(self, patterns, timeout=10, match_all=True) -> dict:
+        """注册监听并阻塞等待结果，等价于 `add_watch(...).wait(timeout)`"""
+        return self.add_watch(patterns, match_all).wait(timeout)
+
+    async def wait_for_async(self, patterns, timeout=10, match_all=True) -> dict:
+        """注册监听并在事件循环中等待结果，等价于 `await add_watch(...).wait_async(timeout)`"""
+        return await self.add_watch(patterns, match_all).wait_async(timeout)
+
+    def _rebuild_watch_prefilter(self):
+        """将所有活动监听中可合并的模式编译为一个组合正则，调用方需持有 self._lock"""
+        sources = []
+        self._watch_full_scan = False
+        for watch in self._watches:
+            for _, compiled in watch._compiled:
+                if _is_prefilterable(compiled):
+                    sources.append(f"(?:{compiled.pattern})")
+                else:
+                    self._watch_full_scan = True
+        self._watch_prefilter = None
+        if sources:
+            try:
+                self._watch_prefilter = re.compile("|".join(sources))
+            except re.error:
+                # 含行内全局标志等无法合并的模式时退化为逐个匹配
+                self._watch_full_scan = True
+
+    def _dispatch_watches(self, line) -> List[LogWatch]:
+        """用一行新日志匹配所有活动监听，返回已完成的监听，调用方需持有 self._lock"""
+        prefilter_hit = self._watch_prefilter is not None and self._watch_prefilter.search(line) is not None
+        if not prefilter_hit and not self._watch_full_scan and self._watch_prefilter is not None:
+            # 组合正则只扫描一次，未命中时无需逐个匹配
+            return []
+
+        finished = [watch for watch in self._watches if watch._match(line, prefilter_hit)]
+        if finished:
+            for watch in finished:
+                self._watches.remove(watch)
+            self._rebuild_watch_prefilter()
+        return finished
+
+    def start_watch(self, patterns):
+        """
+        开始监听日志，匹配结果通过 `get_result` 获取。
+
+        Args:
+            patterns (list): 需要匹配的正则表达式列表。
+        """
+        if self._legacy_watch:
+            self._legacy_watch.cancel()
+        self._legacy_watch = self.add_watch(patterns)
 
     def get_result(self, timeout=10, match_all=True) -> dict:
         """
@@ -506,36 +912,30 @@ class LogWatcher:
         Returns:
             dict: 每个模式的匹配状态，`True`表示匹配成功，`False`表示未匹配。
         """
-        start_time = time.time()
-        end_time = start_time + timeout
-
-        while time.time() < end_time:
-            new_lines = self._read_new_logs()
-            self._process_lines(new_lines)
+        watch = self._legacy_watch
+        if watch is None:
+            return {}
 
-            with self._lock:
-                if not self._watching:
-                    break
-                
-                if match_all:
-                    if all(self._result.values()):
-                        self._watching = False
-                        return self._result
-                else:
-                    if any(self._result.values()):
-                        self._watching = False
-                        return self._result
+        # 处理捕获器队列中积压的日志，之后新写入的日志在 _add_log_line 中即时匹配
+        self._read_new_logs()
 
-            time.sleep(0.1)
+        with self._lock:
+            watch.match_all = match_all
+            ready = watch.matched
+            if ready and watch in self._watches:
+                self._watches.remove(watch)
+                self._rebuild_watch_prefilter()
+        if ready:
+            watch._finish()
 
-        self._watching = False
-        return self._result
+        return watch.wait(timeout)
 
     def _cleanup(self):
         """清理资源，释放状态。"""
-        self._patterns = []
-        self._result = {}
-        self.captured_logs = []
+        with self._lock:
+            self.captured_logs.clear()
+            self.log_index.clear()
+            self._recent_logs.clear()
         
         # 清空日志队列
         self.mcdr_log_handler.clear_logs()
@@ -555,44 +955,55 @@ class LogWatcher:
         self._read_new_logs()
         
         # 返回最近的日志行
-        if len(self.captured_logs) > lines_count:
-            return self.captured_logs[-lines_count:]
-        else:
-            return self.captured_logs
+        with self._lock:
+            entries = self.captured_logs.tail(lines_count)
+        return [entry.format_line() for entry in entries]
             
     def get_logs_after_line(self, start_line=0, max_lines=100):
         """
         获取指定行之后的日志内容
         
+        行号即日志计数器减一，缓冲区覆盖旧日志后行号保持不变。
+        
         Args:
             start_line (int): 开始行号（从0开始计数）
             max_lines (int): 最大返回行数，防止返回过多数据
             
         Returns:
-            dict: 包含日志行和当前总行数的字典
+            dict: 包含日志行、当前总行数以及因缓冲区覆盖而缺失的行数的字典
         """
         try:
             # 首先获取最新日志
             self._read_new_logs()
             
-            # 获取日志总行数
-            total_lines = len(self.captured_logs)
-            
-            # 如果start_line超出范围，从最后返回max_lines行
-            if start_line >= total_lines:
-                start_line = max(0, total_lines - max_lines)
+            with self._lock:
+                # 获取日志总行数
+                total_lines = self.log_counter
+                first_line = self.captured_logs.first_counter - 1
+                
+                # 如果start_line超出范围，从最后返回max_lines行
+                if start_line >= total_lines:
+                    start_line = max(first_line, total_lines - max_lines)
+                
+                # 客户端落后于最早保留的日志时，从最早保留的一行开始返回
+                missed_lines = max(0, first_line - start_line)
+                start_line = max(start_line, first_line)
+                    
+                # 确保不超过最大行数限制
+                end_line = min(total_lines, start_line + max_lines)
                 
-            # 确保不超过最大行数限制
-            end_line = min(total_lines, start_line + max_lines)
+                logs = self.captured_logs.range(start_line + 1, end_line + 1)
             
-            # 清理颜色代码并添加换行符，保持与原实现的一致性
-            logs_with_newline = [clean_color_codes(log) + '\n' for log in self.captured_logs[start_line:end_line]]
+            # 添加换行符，保持与原实现的一致性
+            logs_with_newline = [entry.format_line() + '\n' for entry in logs]
             
             return {
                 "logs": logs_with_newline,
                 "total_lines": total_lines,
                 "start_line": start_line,
-                "end_line": end_line
+                "end_line": end_line,
+                "first_line": first_line,
+                "missed_lines": missed_lines
             }
         except Exception as e:
             return {
@@ -611,71 +1022,36 @@ class LogWatcher:
             max_lines (int): 最大返回行数，防止返回过多数据
             
         Returns:
-            dict: 包含新日志行、当前总行数和最新日志计数器的字典
+            dict: 包含新日志行、当前总行数和最新日志计数器的字典。
+                客户端落后于缓冲区中最早的日志时，`missed_count` 为被覆盖而无法返回的行数。
         """
         try:
-            # 首先获取最新日志
-            # self._read_new_logs()
-            
-            # 获取日志总行数
-            total_lines = len(self.captured_logs)
-            
-            # 查找从last_counter之后的日志
-            new_logs = []
-            current_counter = last_counter
-            
-            for log in self.captured_logs:
-                # 从日志行中提取计数器ID，格式如 [#123]
-                counter_match = re.search(r'\[#(\d+)\]', log)
-                if counter_match:
-                    log_counter = int(counter_match.group(1))
-                    # 只添加ID更大的日志
-                    if log_counter > last_counter:
-                        # 清理颜色代码
-                        cleaned_log = clean_color_codes(log)
-                        
-                        # 尝试解析时间戳
-                        timestamp_match = re.search(r'\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?)\]', log)
-                        timestamp = None
-                        timestamp_value = 0
-                        if timestamp_match:
-                            try:
-                                timestamp_str = timestamp_match.group(1)
-                                if '.' in timestamp_str:
-                                    timestamp = datetime.datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
-                                    timestamp_value = timestamp.timestamp()
-                                else:
-                                    timestamp = datetime.datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
-                                    timestamp_value = timestamp.timestamp()
-                            except Exception:
-                                pass
-                        
-                        # 检查是否是用户命令
-                        is_command = "InfoSource.CONSOLE/INFO" in log and "!!" in log
-                        
-                        # 添加日志条目
-                        new_logs.append({
-                            "line_number": self.captured_logs.index(log),
-                            "counter": log_counter,
-                            "timestamp": timestamp.strftime("%Y-%m-%d %H:%M:%S") if timestamp else None,
-                            "timestamp_value": timestamp_value,
-                            "content": cleaned_log + '\n',
-                            "source": "all",
-                            "is_command": is_command
-                        })
-                        
-                        # 更新当前计数器
-                        current_counter = max(current_counter, log_counter)
-                        
-                        # 限制返回日志数量
-                        if len(new_logs) >= max_lines:
-                            break
+            with self._lock:
+                # 获取日志总行数
+                total_lines = self.log_counter
+                first_counter = self.captured_logs.first_counter
+                
+                if last_counter > total_lines:
+                    # 计数器比服务端还新（日志监视器已重建），从最近的日志重新同步
+                    start_counter = max(first_counter, total_lines - max_lines + 1)
+                    missed_count = 0
+                else:
+                    # 直接定位到 last_counter 之后的槽位
+                    start_counter = max(last_counter + 1, first_counter)
+                    missed_count = start_counter - (last_counter + 1)
+                
+                logs = self.captured_logs.range(start_counter, start_counter + max_lines)
+            
+            new_logs = [entry.to_dict() for entry in logs]
+            current_counter = new_logs[-1]["counter"] if new_logs else min(last_counter, total_lines)
             
             return {
                 "logs": new_logs,
                 "total_lines": total_lines,
                 "last_counter": current_counter,
-                "new_logs_count": len(new_logs)
+                "new_logs_count": len(new_logs),
+                "first_counter": first_counter,
+                "missed_count": missed_count
             }
         except Exception as e:
             import traceback
@@ -689,6 +1065,115 @@ class LogWatcher:
                 "new_logs_count": 1
             }
 
+    def get_logs_before_counter(self, before_counter, max_lines=100):
+        """
+        获取指定日志计数器ID之前的历史日志，用于向前翻页
+
+        内存缓冲区中仍保留的部分直接截取，更早的部分从持久化分段中按索引读取。
+
+        Args:
+            before_counter (int): 返回计数器小于该值的日志
+            max_lines (int): 最大返回行数
+
+        Returns:
+            dict: 包含日志条目、最早可获取的计数器以及是否还有更早日志的字典
+        """
+        with self._lock:
+            total_lines = self.log_counter
+            memory_first = self.captured_logs.first_counter
+            end_counter = min(before_counter, total_lines + 1)
+            start_counter = max(1, end_counter - max_lines)
+            entries = self.captured_logs.range(max(start_counter, memory_first), end_counter)
+
+        first_counter = memory_first
+        if self.log_store is not None:
+            first_counter = min(first_counter, self.log_store.first_counter)
+            if start_counter < memory_first:
+                # 内存中不足的部分从磁盘读取
+                records = self.log_store.read_range(start_counter, min(end_counter, memory_first))
+                entries = [LogEntry(*record) for record in records] + entries
+
+        logs = [entry.to_dict() for entry in entries]
+        oldest = logs[0]["counter"] if logs else end_counter
+        return {
+            "logs": logs,
+            "total_lines": total_lines,
+            "first_counter": first_counter,
+            "has_more": oldest > first_counter
+        }
+
+    @staticmethod
+    def _collect_matches(entries, query: LogQuery, limit, results) -> int:
+        """按顺序匹配日志并追加到 results，达到 limit 时返回最后一条的计数器，否则返回 0"""
+        for entry in entries:
+            if entry is None:
+                # 已被环形缓冲区覆盖（索引尚未清理），更早的候选同样已被覆盖
+                break
+            if query.match(entry.timestamp_ms, entry.source, entry.level, entry.content):
+                results.append(entry)
+                if len(results) >= limit:
+                    return entry.counter
+        return 0
+
+    def search_logs(self, query: LogQuery, before_counter=0, limit=100):
+        """
+        搜索日志，结果按计数器从新到旧排列
+
+        内存缓冲区中的日志通过倒排索引从新到旧筛选候选（正则搜索时逐条匹配），
+        更早的日志从持久化分段中搜索，已封存的分段通过各自的词索引只读取候选块，
+        每次请求最多搜索有限个分段，通过 next_before_counter 继续。
+
+        Args:
+            query (LogQuery): 搜索条件
+            before_counter (int): 只搜索计数器小于该值的日志，0 表示从最新的日志开始
+            limit (int): 最大返回条数
+
+        Returns:
+            dict: 包含匹配的日志条目和继续搜索用的计数器（0 表示已搜索完毕）的字典
+        """
+        results = []
+        next_before = 0
+        with self._lock:
+            first_counter = self.captured_logs.first_counter
+            end_counter = self.log_counter + 1
+            if before_counter > 0:
+                end_counter = min(before_counter, end_counter)
+
+            candidates = None
+            if query.uses_index and end_counter > first_counter:
+                candidates = self.log_index.iter_candidates(query.text, end_counter)
+            if candidates is None:
+                # 无法使用索引时复制区间，在锁外逐条匹配
+                entries = self.captured_logs.range(first_counter, end_counter)
+            else:
+                # 倒排列表在写入时会被修改，需在锁内迭代
+                next_before = self._collect_matches(
+                    (self.captured_logs.get(counter) for counter in candidates), query, limit, results
+                )
+
+        if candidates is None:
+            entries.reverse()
+            next_before = self._collect_matches(entries, query, limit, results)
+
+        if len(results) < limit:
+            # 内存中的日志已搜索完，继续搜索持久化分段中更早的日志
+            disk_before = min(end_counter, first_counter)
+            if self.log_store is not None and disk_before > self.log_store.first_counter:
+                records, next_before = self.log_store.scan_backwards(
+                    disk_before, query.raw_prefilter, query.since_ms,
+                    index_text=query.text if query.uses_index else None
+                )
+                for record in query.filter_records(records):
+                    results.append(LogEntry(*record))
+                    if len(results) >= limit:
+                        next_before = record[0]
+                        break
+
+        return {
+            "logs": [entry.to_dict() for entry in results],
+            "next_before_counter": next_before
+        }
+
     def get_latest_logs(self, max_lines=500):
         """
         获取最新的日志内容（从文件末尾向前读取）
@@ -703,14 +1188,16 @@ class LogWatcher:
             # 首先获取最新日志
             self._read_new_logs()
             
-            # 获取日志总行数
-            total_lines = len(self.captured_logs)
+            with self._lock:
+                # 获取日志总行数
+                total_lines = self.log_counter
+                logs = self.captured_logs.tail(max_lines)
             
             # 从末尾开始读取指定行数
-            start_line = max(0, total_lines - max_lines)
+            start_line = total_lines - len(logs)
             
-            # 清理颜色代码并添加换行符，保持与原实现的一致性
-            logs_with_newline = [clean_color_codes(log) + '\n' for log in self.captured_logs[start_line:total_lines]]
+            # 添加换行符，保持与原实现的一致性
+            logs_with_newline = [entry.format_line() + '\n' for entry in logs]
             
             return {
                 "logs": logs_with_newline,
@@ -778,83 +1265,29 @@ class LogWatcher:
 
     def get_merged_logs(self, max_lines=500):
         """
-        获取所有日志（不再合并或排序）
+        获取最近的日志（不再合并或排序）
         
         Args:
-            mcdr_log_path (str): MCDR日志文件路径（不再使用，保留参数兼容性）
-            mc_log_path (str): Minecraft日志文件路径（不再使用，保留参数兼容性）
             max_lines (int): 要获取的最大日志行数，默认500行
             
         Returns:
             dict: 包含所有日志行和总行数的字典
         """
         try:
-            # 先获取最新日志
-            # self._read_new_logs()
-            
-            # 获取日志总行数
-            total_lines = len(self.captured_logs)
+            with self._lock:
+                # 获取日志总行数
+                total_lines = self.log_counter
+                # 直接截取缓冲区末尾的日志
+                logs = self.captured_logs.tail(max_lines)
             
-            # 从末尾开始读取指定行数
-            start_line = max(0, total_lines - max_lines)
+            start_line = total_lines - len(logs)
             end_line = total_lines
             
-            # 准备日志列表
-            logs = []
-            
-            # 读取日志行并解析时间戳
-            log_entries = []
-            for i in range(start_line, end_line):
-                log_line = self.captured_logs[i]
-                # 清理颜色代码
-                cleaned_log = clean_color_codes(log_line)
-                
-                # 尝试解析时间戳以便排序 - 首先尝试带毫秒的格式
-                timestamp_match = re.search(r'\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?)\]', log_line)
-                timestamp = None
-                timestamp_value = 0
-                if timestamp_match:
-                    try:
-                        timestamp_str = timestamp_match.group(1)
-                        if '.' in timestamp_str:
-                            # 包含毫秒
-                            timestamp = datetime.datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
-                            timestamp_value = timestamp.timestamp()
-                        else:
-                            # 不包含毫秒
-                            timestamp = datetime.datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
-                            timestamp_value = timestamp.timestamp()
-                    except Exception:
-                        pass
-                
-                # 检查是否是用户命令，MCDR命令通常以!!开头
-                is_command = "InfoSource.CONSOLE/INFO" in log_line and "!!" in log_line
-                
-                # 尝试从行号中提取顺序信息（格式如 [#123]）以作为次要排序依据
-                sequence_match = re.search(r'\[#(\d+)\]', log_line)
-                sequence_num = float('inf')
-                if sequence_match:
-                    try:
-                        sequence_num = int(sequence_match.group(1))
-                    except:
-                        pass
-                
-                # 添加日志条目，包含解析的时间戳和命令标记
-                log_entries.append({
-                    "line_number": i,
-                    "timestamp": timestamp.strftime("%Y-%m-%d %H:%M:%S") if timestamp else None,
-                    "timestamp_value": timestamp_value,
-                    "sequence_num": sequence_num,
-                    "content": cleaned_log + '\n',
-                    "source": "all",
-                    "is_command": is_command
-                })
-            
-            # 转换回简单格式
-            logs = log_entries
+            # 行号与计数器一一对应：第 i 行的计数器为 i + 1
+            log_entries = [entry.to_dict() for entry in logs]
             
             return {
-                "logs": logs,
+                "logs": log_entries,
                 "total_lines": total_lines,
                 "start_line": start_line,
                 "end_line": end_line
@@ -871,53 +1304,77 @@ class LogWatcher:
                 "end_line": 1
             }
 
-    def _add_log_line(self, log_line):
-        """添加日志行，避免重复"""
-        # 计算日志内容的哈希值用于去重
-        log_hash = hash(log_line)
+    def _add_log_line(self, content, source="STDOUT", level="INFO", timestamp=None):
+        """
+        添加一条日志，避免重复
+        
+        Args:
+            content (str): 已清理颜色代码的日志内容
+            source (str): 日志来源
+            level (str): 日志级别
+            timestamp (float): Unix时间戳（秒），默认为当前时间
+            
+        Returns:
+            LogEntry: 新添加的日志记录，重复日志返回 None
+        """
+        if timestamp is None:
+            timestamp = time.time()
         
         with self._lock:
-            # 如果日志已经存在，不添加
-            if log_hash in self._handled_log_hashes:
-                return False
-                
-            # 添加到已处理集合
-            self._handled_log_hashes.add(log_hash)
+            # 去重窗口内内容相同的日志视为重复。同一条日志经不同途径捕获时来源和级别的写法不同
+            # （如 logger 名称与 InfoSource、记录级别与默认的 INFO），因此只比较去除首尾空白后的内容
+            if self._recent_logs.seen(content.strip()):
+                return None
             
-            # 限制集合大小，避免内存泄漏
-            if len(self._handled_log_hashes) > 10000:
-                self._handled_log_hashes.clear()
+            # 分配计数器并添加日志记录，缓冲区满时覆盖最旧的日志
+            entry = LogEntry(self.captured_logs.last_counter + 1, int(timestamp * 1000), source, level, content)
+            self.captured_logs.append(entry)
+            if self.log_store is not None:
+                self._persist_queue.append(entry)
             
-            # 增加计数器并添加带序号的日志
-            self.log_counter += 1
-            numbered_log = f"[#{self.log_counter}] {log_line}"
-            self.captured_logs.append(numbered_log)
+            # 更新倒排索引，定期清理已被覆盖的日志
+            self.log_index.add(entry.counter, content)
+            if self.log_index.needs_compact():
+                self.log_index.compact(self.captured_logs.first_counter)
             
-            return True
+            # 有活动监听时立即匹配
+            finished = self._dispatch_watches(entry.text) if self._watches else None
+        
+        # 在锁外写入磁盘、通知已完成的监听并推送，没有订阅者时立即返回
+        if self.log_store is not None:
+            self._drain_persist_queue()
+        if finished:
+            for watch in finished:
+                watch._finish()
+        self.stream_hub.publish(entry)
+        return entry
+
+    def _drain_persist_queue(self):
+        """把待持久化的日志按计数器顺序写入存储；已有线程在写入时直接返回，由该线程继续写入"""
+        while self._persist_queue:
+            if not self._persist_lock.acquire(blocking=False):
+                return
+            try:
+                while True:
+                    try:
+                        entry = self._persist_queue.popleft()
+                    except IndexError:
+                        break
+                    self.log_store.append(entry.counter, entry.timestamp_ms, entry.source, entry.level, entry.content)
+            finally:
+                self._persist_lock.release()
 
     def on_mcdr_info(self, server, info):
         """当MCDR信息事件触发时调用此方法"""
         # 将日志添加到日志队列
         if hasattr(info, 'content'):
-            # 使用带毫秒的时间戳格式
-            now = datetime.datetime.now()
-            timestamp = now.strftime("%Y-%m-%d %H:%M:%S")  # 只保留3位毫秒数
-            
             # 修复：使用 info.source 属性而不是 get 方法，并确保转换为字符串
             source = getattr(info, 'source', 'Unknown')
-            # 确保日志格式与 MCDR 格式一致，将 source 转换为字符串
             # 清理颜色代码
             content = clean_color_codes(info.content)
-            log_line = f"[{timestamp}] [{str(source)}/INFO] {content}"
             
-            # 添加日志并避免重复
-            if self._add_log_line(log_line):
-                # 同时处理模式匹配，仅当日志是新的时才处理
-                with self._lock:
-                    if self._watching:
-                        for pattern in self._patterns:
-                            if re.search(pattern, log_line):
-                                self._result[pattern] = True
+            # 添加日志并避免重复，模式匹配在 _add_log_line 中完成
+            self._add_log_line(content, str(source), "INFO")
 
     def on_server_output(self, server, info):
         """当服务器输出事件触发时调用此方法"""
@@ -956,14 +1413,13 @@ class LogWatcher:
                     
     def stop(self):
         """停止监控并释放资源"""
+        # 结束所有实时日志推送连接，客户端会携带断点重连到新的实例
+        self.stream_hub.close()
+        
         # 停止标准输出拦截
         if hasattr(self, 'stdout_interceptor') and self.stdout_interceptor:
             self.stdout_interceptor.stop_interception()
             
-        # 停止MC日志捕获线程
-        if self.mc_log_capture and self.mc_log_capture.running:
-            self.mc_log_capture.stop()
-            
         # 移除日志处理器
         for logger in self.mcdr_loggers:
             if logger.handlers and self.mcdr_log_handler in logger.handlers:
@@ -1005,6 +1461,20 @@ class LogWatcher:
             if self.server_interface:
                 self.server_interface.logger.error(f"恢复 RTextBase.print 方法失败: {e}")
         
+        # 结束所有监听并唤醒等待者
+        with self._lock:
+            watches, self._watches = self._watches, []
+            self._watch_prefilter = None
+        for watch in watches:
+            watch._finish()
+        
         # 清理状态
         self._cleanup()
-        self._watching = False
+        
+        # 写入剩余日志并关闭持久化存储
+        if self.log_store is not None:
+            with self._persist_lock:
+                while self._persist_queue:
+                    entry = self._persist_queue.popleft()
+                    self.log_store.append(entry.counter, entry.timestamp_ms, entry.source, entry.level, entry.content)
+            self.log_store.close()
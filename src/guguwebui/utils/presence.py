@@ -0,0 +1,179 @@
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+def parse_list_feedback(feedback) -> List[str]:
+    """解析 RCON `list` 命令的返回，如 "There are 2 of a max of 20 players online: Steve, Alex" """
+    if not isinstance(feedback, str) or ":" not in feedback:
+        return []
+    names_part = feedback.split(":", 1)[1].strip()
+    return [name.strip() for name in names_part.split(",") if name.strip()]
+
+
+class PresenceService:
+    """在线状态服务
+
+    在内存中维护游戏在线、假人和Web在线三个集合，聊天接口只读取快照。
+    玩家进出事件直接更新游戏在线集合，后台线程每隔 refresh_interval 秒（或收到刷新请求时）
+    通过 RCON `list` 校正一次，只对新出现的玩家判断是否为假人。
+    """
+
+    def __init__(self, server_interface=None, refresh_interval: float = 60):
+        self.server_interface = server_interface
+        self.refresh_interval = refresh_interval
+
+        self._lock = threading.Lock()
+        self._game: Dict[str, None] = {}
+        # 玩家名 → 是否为假人，玩家离线后删除，下次上线重新判断
+        self._bot_flags: Dict[str, bool] = {}
+        # Web在线：玩家ID → 过期时间（Unix秒）
+        self._web: Dict[str, float] = {}
+        # 游戏在线和假人列表的快照，集合变化时重建
+        self._game_list: List[str] = []
+        self._bot_list: List[str] = []
+        # 每次游戏在线或假人列表变化时递增
+        self.version = 0
+
+        self._wakeup = threading.Event()
+        # 下次唤醒时是否需要通过 RCON 校正（玩家加入只需判断假人）
+        self._full_refresh = True
+        self._thread = None
+        self._stopped = False
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._refresh_loop, name="GUGUWebUI-Presence", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout=2)
+        self._thread = None
+
+    def snapshot(self) -> Dict[str, List[str]]:
+        """返回 {"web": [...], "game": [...], "bot": [...]}，不执行任何查询"""
+        now = time.time()
+        with self._lock:
+            return {
+                "web": [pid for pid, until in self._web.items() if until >= now],
+                "game": list(self._game_list),
+                "bot": list(self._bot_list),
+            }
+
+    def touch_web(self, player_id: Optional[str], ttl: float = 5):
+        """记录Web在线心跳，ttl 秒内视为在线"""
+        if not isinstance(player_id, str) or not player_id:
+            return
+        now = time.time()
+        with self._lock:
+            self._web[player_id] = max(self._web.get(player_id, 0), now + ttl)
+            # 顺带清理过期很久的心跳
+            if len(self._web) > 64:
+                for pid in [pid for pid, until in self._web.items() if until < now - 60]:
+                    del self._web[pid]
+
+    def player_joined(self, player: str):
+        with self._lock:
+            if player in self._game:
+                return
+            self._game[player] = None
+            self._rebuild_locked()
+        # 在后台判断是否为假人
+        self._wakeup.set()
+
+    def player_left(self, player: str):
+        with self._lock:
+            if player not in self._game:
+                return
+            del self._game[player]
+            self._bot_flags.pop(player, None)
+            self._rebuild_locked()
+
+    def server_stopped(self):
+        with self._lock:
+            self._game.clear()
+            self._bot_flags.clear()
+            self._rebuild_locked()
+
+    def request_refresh(self):
+        """请求后台线程立即通过 RCON 校正在线列表"""
+        self._full_refresh = True
+        self._wakeup.set()
+
+    def _rebuild_locked(self):
+        game_list = list(self._game)
+        bot_list = [name for name in game_list if self._bot_flags.get(name)]
+        if game_list != self._game_list or bot_list != self._bot_list:
+            self._game_list = game_list
+            self._bot_list = bot_list
+            self.version += 1
+
+    def _refresh_loop(self):
+        while not self._stopped:
+            full_refresh, self._full_refresh = self._full_refresh, False
+            try:
+                self._refresh(full_refresh)
+            except Exception as e:
+                if self.server_interface:
+                    self.server_interface.logger.debug(f"刷新在线列表失败: {e}")
+            if not self._wakeup.wait(self.refresh_interval):
+                # 定时校正
+                self._full_refresh = True
+            self._wakeup.clear()
+
+    def _refresh(self, full_refresh: bool = True):
+        server = self.server_interface
+        names = None
+        if full_refresh and server is not None and hasattr(server, "is_rcon_running") and server.is_rcon_running():
+            names = parse_list_feedback(server.rcon_query("list"))
+
+        with self._lock:
+            if names is not None:
+                self._game = dict.fromkeys(names)
+                for name in [name for name in self._bot_flags if name not in self._game]:
+                    del self._bot_flags[name]
+            unchecked = [name for name in self._game if name not in self._bot_flags]
+            self._rebuild_locked()
+
+        if not unchecked:
+            return
+        # 假人判断可能调用其他插件，在锁外执行
+        from .utils import is_player
+        flags = {name: not is_player(name, server) for name in unchecked}
+        with self._lock:
+            for name, is_bot in flags.items():
+                if name in self._game:
+                    self._bot_flags[name] = is_bot
+            self._rebuild_locked()
+
+
+_presence_service = None
+_presence_service_lock = threading.Lock()
+
+
+def get_presence_service(server_interface=None) -> PresenceService:
+    """获取共享的 PresenceService 实例，首次调用时启动后台刷新线程"""
+    global _presence_service
+    if _presence_service is None:
+        with _presence_service_lock:
+            if _presence_service is None:
+                service = PresenceService(server_interface)
+                service.start()
+                _presence_service = service
+    return _presence_service
+
+
+def close_presence_service():
+    """停止共享实例的后台线程，插件卸载时调用"""
+    global _presence_service
+    with _presence_service_lock:
+        service = _presence_service
+        _presence_service = None
+    if service is not None:
+        service.stop()
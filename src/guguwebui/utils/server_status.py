@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import javaproperties
+from mcstatus import JavaServer
+
+# 状态缓存的有效期（秒），期间所有请求共用一次查询结果
+SERVER_STATUS_TTL = 5
+# 等待其他线程正在进行的查询的最长时间（秒）
+SERVER_STATUS_WAIT = 5
+
+
+class ServerStatusCache:
+    """Minecraft 服务器状态缓存
+
+    server.properties 只在修改时间或大小变化时重新解析；状态查询结果（包括失败）缓存 ttl 秒，
+    过期后同一时间只有一个线程发起查询，其余线程等待并共用结果。
+    服务器启停、玩家进出时调用 invalidate 使缓存立即失效。
+    """
+
+    def __init__(
+        self,
+        properties_path,
+        ttl: float = SERVER_STATUS_TTL,
+        ping: Optional[Callable[[int], Dict]] = None,
+    ):
+        self.properties_path = properties_path
+        self.ttl = ttl
+        self._ping = ping or ping_java_server
+
+        self._lock = threading.Lock()
+        self._properties: Dict[str, str] = {}
+        self._properties_key = None
+        self._status: Dict = {}
+        self._expire = 0.0
+        # 缓存失效次数，查询期间失效时结果不写入缓存
+        self._generation = 0
+        # 正在进行的查询，完成时置位
+        self._inflight: Optional[threading.Event] = None
+
+    def get_properties(self) -> Dict[str, str]:
+        """返回 server.properties 的内容，文件未变化时直接返回上次的解析结果"""
+        try:
+            stat = os.stat(self.properties_path)
+            key = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            key = None
+        with self._lock:
+            if key == self._properties_key:
+                return self._properties
+        properties = {}
+        if key is not None:
+            with open(self.properties_path, "r", encoding="UTF-8") as f:
+                properties = javaproperties.load(f)
+        with self._lock:
+            self._properties = properties
+            self._properties_key = key
+        return properties
+
+    def get_port(self) -> int:
+        return int(self.get_properties()["server-port"])
+
+    def get_status(self) -> Dict:
+        """
+        获取服务器状态
+
+        Returns:
+            Dict: server_version、server_player_count、server_maxinum_player_count，
+                  服务器未运行或查询失败时为空字典
+        """
+        while True:
+            with self._lock:
+                if time.monotonic() < self._expire:
+                    return dict(self._status)
+                event = self._inflight
+                if event is None:
+                    event = self._inflight = threading.Event()
+                    generation = self._generation
+                    break
+            # 其他线程正在查询，等待其结果
+            if not event.wait(SERVER_STATUS_WAIT):
+                return {}
+            with self._lock:
+                if self._inflight is None and time.monotonic() >= self._expire:
+                    # 查询期间缓存已失效，结果未写入，由本线程重新查询
+                    continue
+                return dict(self._status)
+
+        try:
+            status = self._ping(self.get_port())
+        except Exception:
+            status = {}
+        with self._lock:
+            if generation == self._generation:
+                self._status = status
+                self._expire = time.monotonic() + self.ttl
+            self._inflight = None
+        event.set()
+        return dict(status)
+
+    def invalidate(self):
+        """使缓存的状态立即失效，下次获取时重新查询"""
+        with self._lock:
+            self._generation += 1
+            self._expire = 0.0
+
+
+def ping_java_server(port: int) -> Dict:
+    """通过 Server List Ping 查询本机服务器状态"""
+    # original code from https://github.com/Spark-Code-China/MC-Server-Info
+    status = JavaServer.lookup(f"127.0.0.1:{port}").status()
+    return {
+        "server_version": status.version.name,
+        "server_player_count": status.players.online,
+        "server_maxinum_player_count": status.players.max,
+    }
+
+
+_server_status_cache = None
+_server_status_cache_lock = threading.Lock()
+
+
+def get_server_status_cache() -> ServerStatusCache:
+    """获取共享的 ServerStatusCache 实例"""
+    global _server_status_cache
+    if _server_status_cache is None:
+        with _server_status_cache_lock:
+            if _server_status_cache is None:
+                from .constant import SERVER_PROPERTIES_PATH
+                _server_status_cache = ServerStatusCache(SERVER_PROPERTIES_PATH)
+    return _server_status_cache
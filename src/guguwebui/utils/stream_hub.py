@@ -0,0 +1,101 @@
+import asyncio
+import threading
+from typing import Any, Optional, Set
+
+# 订阅结束标记：推送中心关闭时投递给所有订阅者
+STREAM_CLOSED = object()
+
+
+class StreamSubscription:
+    """推送中心的一个订阅者，持有所在事件循环中的有界队列"""
+
+    def __init__(self, hub: "StreamHub", loop: asyncio.AbstractEventLoop, max_queue: int):
+        self.hub = hub
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        # 队列写满时置位，消费者应断开并由客户端携带断点重连
+        self.overflowed = False
+
+    def _deliver(self, item: Any):
+        """在订阅者的事件循环线程中执行，将数据放入队列"""
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout: Optional[float] = None) -> Any:
+        """等待下一条数据，超时返回 None"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def get_nowait(self) -> Any:
+        """取出一条已到达的数据，队列为空时返回 None"""
+        try:
+            return self.queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return None
+
+    def close(self):
+        """取消订阅"""
+        self.hub.unsubscribe(self)
+
+
+class StreamHub:
+    """线程安全的 asyncio 扇出推送中心
+
+    `publish` 可以在任意线程（如 MCDR 的事件线程）中调用，数据通过
+    `call_soon_threadsafe` 投递到每个订阅者所在的事件循环；没有订阅者时发布操作立即返回。
+    """
+
+    def __init__(self, max_queue: int = 1000):
+        self.max_queue = max_queue
+        self._subscribers: Set[StreamSubscription] = set()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @property
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
+
+    def subscribe(self) -> StreamSubscription:
+        """在当前运行的事件循环中创建订阅，必须在协程中调用"""
+        subscription = StreamSubscription(self, asyncio.get_running_loop(), self.max_queue)
+        with self._lock:
+            if self._closed:
+                subscription._deliver(STREAM_CLOSED)
+            else:
+                self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: StreamSubscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, item: Any):
+        """向所有订阅者发布一条数据"""
+        if not self._subscribers:
+            return
+        with self._lock:
+            subscribers = tuple(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._deliver, item)
+            except RuntimeError:
+                # 事件循环已关闭，移除失效的订阅者
+                self.unsubscribe(subscription)
+
+    def close(self):
+        """关闭推送中心，通知所有订阅者结束"""
+        with self._lock:
+            self._closed = True
+            subscribers = tuple(self._subscribers)
+            self._subscribers.clear()
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._deliver, STREAM_CLOSED)
+            except RuntimeError:
+                pass
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
+import io
 import json
 import os
+import threading
+import time
 
 from pathlib import Path
 from ruamel.yaml import YAML
@@ -10,17 +13,32 @@ yaml.preserve_quotes = True
 class table(object):    
     """A json/yml file reader with save function.
     It also can auto-save when first level for dict changes.
+    Files are written to a temp file and then renamed, so a crash never leaves a half-written file.
 
     Args:
         path (str, Path): path for the config, will generate one if not exist
         default_content (Optional[dict]): default value when generating
         yaml (Optional[bool]): store it as yaml file
+        write_behind (Optional[bool]): save() only serializes the table, a background
+            thread writes it after flush_delay seconds; call flush() / close() to write immediately
+        flush_delay (Optional[float]): seconds to collect changes before a write-behind flush
     """
-    def __init__(self, path:str="./default.json", default_content:dict=None, yaml:bool=False) -> None:
+    def __init__(self, path:str="./default.json", default_content:dict=None, yaml:bool=False,
+                 write_behind:bool=False, flush_delay:float=1.0) -> None:
         self.yaml = yaml
         self.path = path if not self.yaml else path.replace(".json", ".yml")
         self.path = Path(self.path)
         self.default_content = default_content
+        self.write_behind = write_behind
+        self.flush_delay = flush_delay
+
+        self._dirty = False
+        self._pending = None
+        self._closed = False
+        self._write_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._flusher = None
         self.load()    
 
     def load(self) -> None: # loading
@@ -32,16 +50,73 @@ class table(object):
                     self.data = json.load(f)
         else: # file not exists -> create new one
             self.data = self.default_content if self.default_content else {}
-            self.save()
+            self._dirty = True
+            self.flush()
+
+    def save(self) -> None: # saving (deferred in write-behind mode)
+        if not self.write_behind or self._closed:
+            self._dirty = True
+            self.flush()
+            return
+        # serialize on the caller's thread, the flusher only writes the snapshot
+        with self._pending_lock:
+            self._pending = self._dump()
+            self._dirty = True
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._flush_loop, name=f"GUGUWebUI-Save-{self.path.name}", daemon=True)
+            self._flusher.start()
+        self._wakeup.set()
 
-    def save(self) -> None: # saving
-        self.path.parents[0].mkdir(parents=True, exist_ok=True)
+    def flush(self) -> None: # write pending changes now
+        with self._write_lock:
+            with self._pending_lock:
+                if not self._dirty:
+                    return
+                content = self._pending if self._pending is not None else self._dump()
+                self._pending = None
+                self._dirty = False
+            try:
+                self.path.parents[0].mkdir(parents=True, exist_ok=True)
+                temp_path = self.path.with_name(self.path.name + ".tmp")
+                with open(temp_path, 'w', encoding='UTF-8') as f:
+                    f.write(content)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.path)
+            except Exception:
+                with self._pending_lock:
+                    if not self._dirty:
+                        self._pending = content
+                        self._dirty = True
+                raise
+
+    def close(self) -> None: # flush and stop the write-behind thread
+        self._closed = True
+        self._wakeup.set()
+        flusher = self._flusher
+        if flusher is not None:
+            flusher.join(timeout=5)
+        self.flush()
+
+    def _dump(self) -> str:
         if self.yaml:
-            with open(self.path, 'w', encoding='UTF-8') as f:
-                yaml.dump(self.data, f)        
-        else:
-            with open(self.path, 'w', encoding='UTF-8') as f:
-                json.dump(self.data, f, ensure_ascii= False)        
+            stream = io.StringIO()
+            yaml.dump(self.data, stream)
+            return stream.getvalue()
+        return json.dumps(self.data, ensure_ascii= False)
+
+    def _flush_loop(self) -> None:
+        while not self._closed:
+            self._wakeup.wait()
+            if self._closed:
+                break
+            # collect changes made within flush_delay into one write
+            time.sleep(self.flush_delay)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Failed to save {self.path}: {e}")
     
     def __getitem__(self, key:str): # get item like dict[key]
         return self.data[key]    
@@ -1,6 +1,5 @@
 import copy
 import importlib
-import javaproperties
 import json
 import os
 import string
@@ -9,9 +8,7 @@ import zipfile
 import datetime
 import secrets
 
-import requests
 import re
-import time
 from threading import Thread, Lock
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
@@ -19,9 +16,11 @@ from mcdreforged.plugin.meta.metadata import Metadata
 from mcdreforged.api.all import RAction, RColor, PluginServerInterface, RText, RTextList, RTextBase
 from pathlib import Path
 from ruamel.yaml.comments import CommentedSeq
-from mcstatus import JavaServer
 
-from .constant import user_db, pwd_context, SERVER_PROPERTIES_PATH
+from .constant import user_db, pwd_context
+from .uuid_resolver import get_uuid_resolver
+from .server_status import get_server_status_cache
+from .executor import run_blocking
 
 #============================================================#
 # verify password
@@ -1036,30 +1035,13 @@ def build_json_i18n_translations(json_obj: dict) -> dict:
     return {"default": default_lang, "translations": translations}
 #============================================================#
 # read server status
-import socket
-
 # Get server port
 def get_server_port()->int:
-    with open(SERVER_PROPERTIES_PATH, "r", encoding="UTF-8") as f:
-        data = javaproperties.load(f)
-    return int( data["server-port"] )
+    return get_server_status_cache().get_port()
 
-# Get java MC status
-# original code from https://github.com/Spark-Code-China/MC-Server-Info
+# Get java MC status（带缓存，多个请求共用一次查询）
 def get_java_server_info():
-    temp_ip = "127.0.0.1"
-    port = get_server_port()
-    result_dict = {}
-    server = JavaServer.lookup(f"{temp_ip}:{port}")
-    status = server.status()
-    try:
-        if status:
-            result_dict["server_version"] = status.version.name
-            result_dict["server_player_count"] = status.players.online
-            result_dict["server_maxinum_player_count"] = status.players.max
-        return result_dict
-    except socket.error as e:
-        return result_dict
+    return get_server_status_cache().get_status()
 
  
 #============================================================#
@@ -1300,113 +1282,27 @@ def get_minecraft_path(server_interface=None, path_type="working_directory"):
 
 #============================================================#
 
-def get_player_uuid(player_name, server_interface=None, use_api=True):
+def get_player_uuid(player_name, server_interface=None, use_api=True, timeout=10):
     """
-    获取指定玩家的UUID
+    获取指定玩家的UUID，查询顺序见 UUIDResolver
     
     Args:
         player_name: 玩家名称
         server_interface: MCDR服务器接口，用于获取配置
         use_api: 是否使用Mojang API在线查询（如果本地查询失败）
+        timeout: 等待在线查询的秒数，0 表示不等待（在线查询仍在后台进行，结果供之后的调用使用）
         
     Returns:
         str: 玩家的UUID，如果获取失败返回None
     """
     try:
-        import json
-        import requests
-        from pathlib import Path
-        
-        # 首先尝试从本地usercache.json读取
-        try:
-            usercache_path = Path(get_minecraft_path(server_interface, "usercache"))
-            if usercache_path.exists():
-                with open(usercache_path, 'r', encoding='utf-8') as f:
-                    usercache_data = json.load(f)
-                
-                # 在usercache中查找玩家
-                for entry in usercache_data:
-                    if entry.get('name') == player_name:
-                        uuid = entry.get('uuid')
-                        if uuid:
-                            # 格式化UUID，添加连字符
-                            return format_uuid(uuid)
-        except Exception as e:
-            # 本地查询失败，记录调试信息
-            if server_interface:
-                server_interface.logger.debug(f"从usercache.json获取UUID失败: {e}")
-        
-        # 如果本地查询失败且允许使用API，尝试在线查询
-        if use_api:
-            try:
-                # 使用Mojang API查询
-                api_url = f"https://api.mojang.com/users/profiles/minecraft/{player_name}"
-                response = requests.get(api_url, timeout=10)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    uuid = data.get('id')
-                    if uuid:
-                        # 格式化UUID，添加连字符
-                        return format_uuid(uuid)
-                elif response.status_code == 404:
-                    # 玩家不存在
-                    if server_interface:
-                        server_interface.logger.debug(f"玩家 {player_name} 不存在")
-                    return None
-                else:
-                    # API请求失败
-                    if server_interface:
-                        server_interface.logger.debug(f"Mojang API请求失败: {response.status_code}")
-                    
-            except requests.exceptions.Timeout:
-                if server_interface:
-                    server_interface.logger.debug(f"Mojang API请求超时")
-            except Exception as e:
-                if server_interface:
-                    server_interface.logger.debug(f"Mojang API查询失败: {e}")
-        
-        # 所有方法都失败了
-        return None
-        
+        return get_uuid_resolver(server_interface).resolve(player_name, timeout=timeout, use_api=use_api)
     except Exception as e:
         if server_interface:
             server_interface.logger.error(f"获取玩家UUID时发生错误: {e}")
         return None
 
 
-def format_uuid(uuid_string):
-    """
-    格式化UUID字符串，添加连字符
-    
-    Args:
-        uuid_string: 原始UUID字符串（32位无连字符）
-        
-    Returns:
-        str: 格式化后的UUID字符串（带连字符）
-    """
-    try:
-        # 移除可能存在的连字符
-        uuid_clean = uuid_string.replace('-', '')
-        
-        # 检查是否为有效的32位十六进制字符串
-        if len(uuid_clean) == 32 and all(c in '0123456789abcdefABCDEF' for c in uuid_clean):
-            # 添加连字符：xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx
-            formatted_uuid = f"{uuid_clean[:8]}-{uuid_clean[8:12]}-{uuid_clean[12:16]}-{uuid_clean[16:20]}-{uuid_clean[20:32]}"
-            return formatted_uuid.lower()  # 转换为小写
-        
-        # 如果已经是格式化后的UUID，直接返回
-        if len(uuid_string) == 36 and uuid_string.count('-') == 4:
-            return uuid_string.lower()
-        
-        # 无效格式，返回原字符串
-        return uuid_string
-        
-    except Exception:
-        # 格式化失败，返回原字符串
-        return uuid_string
-
-
 def get_player_info(player_name, server_interface=None, include_uuid=True):
     """
     获取玩家信息，包括UUID和在线状态
@@ -1671,8 +1567,8 @@ def send_message_to_webui(server_interface, source: str, message, message_type:
         if player_count <= 0:
             # 仅记录到聊天日志
             try:
-                from guguwebui.utils.chat_logger import ChatLogger
-                chat_logger = ChatLogger()
+                from guguwebui.utils.chat_logger import get_chat_logger
+                chat_logger = get_chat_logger()
                 # 记录RText格式的消息，标记为插件消息
                 final_rtext_data = rtext_data if rtext_data else (rtext_message.to_json_object() if hasattr(rtext_message, 'to_json_object') else None)
                 chat_logger.add_message(source, processed_message, rtext_data=final_rtext_data, message_type=2, server=server_interface)
@@ -1684,19 +1580,13 @@ def send_message_to_webui(server_interface, source: str, message, message_type:
         server_interface.broadcast(rtext_message)
 
         # 记录Web在线心跳（发送者计为在线5秒）
-        try:
-            # 尝试获取WEB_ONLINE_PLAYERS，如果无法获取则跳过
-            import sys
-            if hasattr(sys.modules.get('guguwebui.api.chat', None), 'WEB_ONLINE_PLAYERS'):
-                from guguwebui.api.chat import WEB_ONLINE_PLAYERS
-                WEB_ONLINE_PLAYERS[source] = int(time.time()) + 5
-        except Exception:
-            pass
+        from .presence import get_presence_service
+        get_presence_service(server_interface).touch_web(source)
 
         # 记录到聊天日志
         try:
-            from guguwebui.utils.chat_logger import ChatLogger
-            chat_logger = ChatLogger()
+            from guguwebui.utils.chat_logger import get_chat_logger
+            chat_logger = get_chat_logger()
             # 记录RText格式的消息，标记为插件消息，这样前端显示时就能正确渲染
             final_rtext_data = rtext_data if rtext_data else (rtext_message.to_json_object() if hasattr(rtext_message, 'to_json_object') else None)
             chat_logger.add_message(source, processed_message, rtext_data=final_rtext_data, message_type=2, server=server_interface)
@@ -1893,38 +1783,43 @@ async def pip_task(task_id, action, package):
             }
             return
 
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1
-        )
+        def run_pip():
+            """启动pip并逐行收集输出，返回退出码（阻塞）"""
+            process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                bufsize=1
+            )
 
-        # 更新初始状态
-        pip_tasks[task_id] = {
-            "completed": False,
-            "success": False,
-            "output": output.copy(),
-        }
+            # 更新初始状态
+            pip_tasks[task_id] = {
+                "completed": False,
+                "success": False,
+                "output": output.copy(),
+            }
 
-        # 读取输出
-        while True:
-            stdout_line = process.stdout.readline()
-            if stdout_line:
-                output.append(stdout_line.strip())
-                pip_tasks[task_id]["output"] = output.copy()
+            # 读取输出
+            while True:
+                stdout_line = process.stdout.readline()
+                if stdout_line:
+                    output.append(stdout_line.strip())
+                    pip_tasks[task_id]["output"] = output.copy()
 
-            stderr_line = process.stderr.readline()
-            if stderr_line:
-                output.append(stderr_line.strip())
-                pip_tasks[task_id]["output"] = output.copy()
+                stderr_line = process.stderr.readline()
+                if stderr_line:
+                    output.append(stderr_line.strip())
+                    pip_tasks[task_id]["output"] = output.copy()
 
-            if not stdout_line and not stderr_line and process.poll() is not None:
-                break
+                if not stdout_line and not stderr_line and process.poll() is not None:
+                    break
+
+            # 获取最终退出码
+            return process.wait()
 
-        # 获取最终退出码
-        exit_code = process.wait()
+        # pip 运行期间一直阻塞读取输出，放到线程池中执行
+        exit_code = await run_blocking(run_pip)
         success = exit_code == 0
 
         if success:
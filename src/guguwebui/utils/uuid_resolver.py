@@ -0,0 +1,229 @@
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+import requests
+
+# Mojang 批量查询接口，每次最多10个玩家名
+MOJANG_BULK_URL = "https://api.minecraftservices.com/minecraft/profile/lookup/bulk/byname"
+MOJANG_BULK_LIMIT = 10
+
+
+def format_uuid(uuid_string: str) -> str:
+    """32位无连字符的UUID转换为带连字符的小写格式，其他格式原样返回"""
+    if not isinstance(uuid_string, str):
+        return uuid_string
+    uuid_clean = uuid_string.replace('-', '')
+    if len(uuid_clean) == 32 and all(c in '0123456789abcdefABCDEF' for c in uuid_clean):
+        return f"{uuid_clean[:8]}-{uuid_clean[8:12]}-{uuid_clean[12:16]}-{uuid_clean[16:20]}-{uuid_clean[20:32]}".lower()
+    return uuid_string
+
+
+def mojang_bulk_lookup(names: List[str], timeout: float = 10) -> Dict[str, str]:
+    """
+    通过 Mojang 批量接口查询玩家UUID
+
+    Returns:
+        Dict: 小写玩家名 → 带连字符的UUID，不存在的玩家不出现在结果中
+    """
+    response = requests.post(MOJANG_BULK_URL, json=names, timeout=timeout)
+    if response.status_code == 404:
+        return {}
+    response.raise_for_status()
+    return {
+        profile['name'].lower(): format_uuid(profile['id'])
+        for profile in response.json()
+        if profile.get('name') and profile.get('id')
+    }
+
+
+class UUIDResolver:
+    """玩家UUID解析服务
+
+    依次查询：usercache.json（文件修改时间变化时才重新解析）→ 在线查询结果的缓存 →
+    查询失败的短期缓存。都未命中时交给后台线程批量在线查询并立即返回 None，
+    调用方不会因网络请求阻塞；之后的调用可以直接命中缓存。
+    lookup 可以替换为本地实现，如离线服务器或测试时不访问 Mojang 接口。
+    """
+
+    def __init__(
+        self,
+        usercache_path: Callable[[], Optional[str]],
+        lookup: Callable[[List[str]], Dict[str, str]] = mojang_bulk_lookup,
+        negative_ttl: float = 600,
+        error_ttl: float = 60,
+        batch_delay: float = 0.2,
+    ):
+        self._usercache_path = usercache_path
+        self._lookup = lookup
+        self.negative_ttl = negative_ttl
+        self.error_ttl = error_ttl
+        self.batch_delay = batch_delay
+
+        self._lock = threading.Lock()
+        self._usercache: Dict[str, str] = {}
+        self._usercache_key = None
+        self._usercache_checked = 0.0
+        # 在线查询到的UUID，键为小写玩家名
+        self._resolved: Dict[str, str] = {}
+        # 玩家名 → 失效时间，期间不再在线查询
+        self._missing: Dict[str, float] = {}
+        # 等待查询的玩家名 → 查询完成事件
+        self._pending: Dict[str, threading.Event] = {}
+        self._wakeup = threading.Event()
+        self._worker = None
+        self._stopped = False
+
+    def resolve(self, player_name: str, timeout: float = 0, use_api: bool = True) -> Optional[str]:
+        """
+        获取玩家UUID
+
+        Args:
+            player_name: 玩家名，不区分大小写
+            timeout: 未命中缓存时等待在线查询的秒数，0 表示不等待
+            use_api: 未命中缓存时是否在线查询
+
+        Returns:
+            str: 带连字符的UUID，未知时返回 None
+        """
+        if not player_name:
+            return None
+        key = player_name.lower()
+        self._refresh_usercache()
+        with self._lock:
+            uuid = self._usercache.get(key) or self._resolved.get(key)
+            if uuid or not use_api:
+                return uuid
+            expire = self._missing.get(key)
+            if expire is not None:
+                if expire > time.time():
+                    return None
+                del self._missing[key]
+            event = self._pending.get(key)
+            if event is None:
+                event = self._pending[key] = threading.Event()
+                self._ensure_worker()
+                self._wakeup.set()
+        if timeout <= 0 or not event.wait(timeout):
+            return None
+        with self._lock:
+            return self._resolved.get(key)
+
+    def resolve_many(self, player_names: Iterable[str]) -> Dict[str, Optional[str]]:
+        """批量获取UUID，不等待在线查询"""
+        return {name: self.resolve(name) for name in set(player_names)}
+
+    def close(self):
+        """停止后台查询线程，插件卸载时调用"""
+        self._stopped = True
+        self._wakeup.set()
+        worker = self._worker
+        if worker is not None:
+            worker.join(timeout=2)
+
+    def _refresh_usercache(self):
+        """每秒最多检查一次 usercache.json，修改时间或大小变化时重新建立索引"""
+        now = time.monotonic()
+        if now - self._usercache_checked < 1:
+            return
+        self._usercache_checked = now
+        try:
+            path = self._usercache_path()
+            stat = os.stat(path) if path else None
+        except OSError:
+            stat = None
+        key = (path, stat.st_mtime_ns, stat.st_size) if stat else None
+        if key == self._usercache_key:
+            return
+        usercache = {}
+        if stat is not None:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    for entry in json.load(f):
+                        name, uuid = entry.get('name'), entry.get('uuid')
+                        if name and uuid:
+                            usercache[name.lower()] = format_uuid(uuid)
+            except (OSError, ValueError, AttributeError) as e:
+                print(f"读取 usercache.json 失败: {e}")
+                return
+        with self._lock:
+            self._usercache = usercache
+            self._usercache_key = key
+
+    def _ensure_worker(self):
+        # 调用方需持有 self._lock
+        if self._stopped or (self._worker is not None and self._worker.is_alive()):
+            return
+        self._worker = threading.Thread(target=self._worker_loop, name="GUGUWebUI-UUID-Resolver", daemon=True)
+        self._worker.start()
+
+    def _worker_loop(self):
+        while not self._stopped:
+            self._wakeup.wait()
+            if self._stopped:
+                break
+            # 稍等片刻，把同一时间到达的查询合并为一批
+            time.sleep(self.batch_delay)
+            with self._lock:
+                self._wakeup.clear()
+                names = list(self._pending)[:MOJANG_BULK_LIMIT]
+                if len(self._pending) > len(names):
+                    self._wakeup.set()
+            if names:
+                self._lookup_batch(names)
+        # 唤醒所有仍在等待的调用方
+        with self._lock:
+            for event in self._pending.values():
+                event.set()
+            self._pending.clear()
+
+    def _lookup_batch(self, names: List[str]):
+        try:
+            found = self._lookup(names)
+            ttl = self.negative_ttl
+        except Exception as e:
+            print(f"在线查询玩家UUID失败: {e}")
+            found = {}
+            ttl = self.error_ttl
+        expire = time.time() + ttl
+        with self._lock:
+            for name in names:
+                uuid = found.get(name)
+                if uuid:
+                    self._resolved[name] = uuid
+                else:
+                    self._missing[name] = expire
+                event = self._pending.pop(name, None)
+                if event is not None:
+                    event.set()
+            # 清理已过期的失败记录
+            now = time.time()
+            for name in [n for n, t in self._missing.items() if t <= now]:
+                del self._missing[name]
+
+
+_uuid_resolver = None
+_uuid_resolver_lock = threading.Lock()
+
+
+def get_uuid_resolver(server_interface=None) -> UUIDResolver:
+    """获取共享的 UUIDResolver 实例"""
+    global _uuid_resolver
+    if _uuid_resolver is None:
+        with _uuid_resolver_lock:
+            if _uuid_resolver is None:
+                from .utils import get_minecraft_path
+                _uuid_resolver = UUIDResolver(lambda: get_minecraft_path(server_interface, "usercache"))
+    return _uuid_resolver
+
+
+def close_uuid_resolver():
+    """停止共享实例的后台线程，插件卸载时调用"""
+    global _uuid_resolver
+    with _uuid_resolver_lock:
+        resolver = _uuid_resolver
+        _uuid_resolver = None
+    if resolver is not None:
+        resolver.close()
@@ -33,6 +33,7 @@ from starlette.exceptions import HTTPException as StarletteHTTPException
 from starlette.middleware.sessions import SessionMiddleware
 
 from .utils.log_watcher import LogWatcher
+from .utils.log_store import LogSegmentStore
 from .utils.PIM import PluginInstaller, create_installer, initialize_pim  # 修改导入，添加 initialize_pim
 
 from .utils.constant import *
@@ -47,9 +48,14 @@ from .api.chat import (
     generate_chat_verification_code, check_chat_verification_status,
     set_chat_user_password, chat_user_login, check_chat_session,
     chat_user_logout, get_chat_messages_handler, get_new_chat_messages_handler,
-    clear_chat_messages_handler, send_chat_message_handler,
-    WEB_ONLINE_PLAYERS, RCON_ONLINE_CACHE,
-    on_player_joined, on_player_left
+    clear_chat_messages_handler, send_chat_message_handler, search_chat_messages_handler,
+    stream_chat_messages, chat_json_response,
+    on_player_joined, on_player_left, on_server_startup, on_server_stop
+)
+from .utils.presence import get_presence_service
+from .utils.server_status import get_server_status_cache
+from .utils.executor import (
+    run_blocking, configure_blocking_executor, LoopLagMonitor, LoopLagMiddleware
 )
 
 # 导入插件API模块
@@ -69,7 +75,7 @@ from .api.config import (
 # 导入服务器API模块
 from .api.server import (
     get_server_status, control_server, get_server_logs,
-    get_new_logs, get_command_suggestions, send_command, get_rcon_status
+    get_new_logs, stream_logs, search_logs, get_command_suggestions, send_command, get_rcon_status
 )
 
 # 获取插件真实版本号已移至 utils.py
@@ -91,6 +97,9 @@ templates = Jinja2Templates(directory=f"{STATIC_PATH}/templates")
 # 全局LogWatcher实例
 log_watcher = LogWatcher()
 
+# 事件循环卡顿检测，阈值由配置 loop_lag_warn_ms 设置
+loop_lag_monitor = LoopLagMonitor()
+
 # 用于保存pip任务状态的字典
 pip_tasks = {}
 
@@ -102,6 +111,26 @@ migrate_old_config()
 
 
 # 初始化函数，在应用程序启动时调用
+def open_log_store(server_instance, server_config):
+    """根据配置打开终端日志持久化存储，未启用或打开失败时返回 None"""
+    if not server_config.get("log_persist", DEFALUT_CONFIG["log_persist"]):
+        return None
+    mb = 1024 * 1024
+    try:
+        return LogSegmentStore(
+            LOG_STORE_PATH,
+            segment_bytes=server_config.get("log_segment_size_mb", DEFALUT_CONFIG["log_segment_size_mb"]) * mb,
+            max_bytes=server_config.get("log_retention_mb", DEFALUT_CONFIG["log_retention_mb"]) * mb,
+            max_age_days=server_config.get("log_retention_days", DEFALUT_CONFIG["log_retention_days"]),
+        ).open()
+    except Exception as e:
+        server_instance.logger.error(f"打开终端日志存储失败，将不保存历史日志: {e}")
+        return None
+
+def on_server_status_changed(server, *args):
+    """服务器启停或玩家进出时使服务器状态缓存失效"""
+    get_server_status_cache().invalidate()
+
 def init_app(server_instance):
     """初始化应用程序，注册事件监听器"""
     global log_watcher
@@ -127,8 +156,19 @@ def init_app(server_instance):
         log_watcher.stop()
     
     # 初始化LogWatcher实例，将 server_instance 传递给它
-    log_watcher = LogWatcher(server_interface=server_instance)
+    server_config = server_instance.load_config_simple("config.json", DEFALUT_CONFIG, echo_in_console=False)
+    log_watcher = LogWatcher(
+        server_interface=server_instance,
+        buffer_size=server_config.get("log_buffer_size", DEFALUT_CONFIG["log_buffer_size"]),
+        log_store=open_log_store(server_instance, server_config),
+        capture_stdout=server_config.get("log_capture_stdout", DEFALUT_CONFIG["log_capture_stdout"])
+    )
     
+    # 阻塞操作线程池和事件循环卡顿检测
+    configure_blocking_executor(server_config.get("blocking_pool_size", DEFALUT_CONFIG["blocking_pool_size"]))
+    loop_lag_monitor.logger = server_instance.logger
+    loop_lag_monitor.threshold_ms = server_config.get("loop_lag_warn_ms", DEFALUT_CONFIG["loop_lag_warn_ms"])
+
     # 设置日志捕获 - 直接调用此方法确保与MCDR内部日志系统连接
     log_watcher._setup_log_capture()
     
@@ -137,9 +177,16 @@ def init_app(server_instance):
     # USER_INFO应该映射到on_server_output，处理用户输入的命令
     server_instance.register_event_listener(MCDRPluginEvents.GENERAL_INFO, on_mcdr_info)
     server_instance.register_event_listener(MCDRPluginEvents.USER_INFO, on_server_output)
-    # 注册玩家进出事件，刷新RCON在线缓存
+    # 启动在线状态服务，玩家进出和服务器启停事件直接更新在线列表
+    get_presence_service(server_instance)
     server_instance.register_event_listener(MCDRPluginEvents.PLAYER_JOINED, on_player_joined)
     server_instance.register_event_listener(MCDRPluginEvents.PLAYER_LEFT, on_player_left)
+    server_instance.register_event_listener(MCDRPluginEvents.SERVER_STARTUP, on_server_startup)
+    server_instance.register_event_listener(MCDRPluginEvents.SERVER_STOP, on_server_stop)
+    # 服务器启停和玩家进出时使服务器状态缓存失效
+    for event in (MCDRPluginEvents.SERVER_STARTUP, MCDRPluginEvents.SERVER_STOP,
+                  MCDRPluginEvents.PLAYER_JOINED, MCDRPluginEvents.PLAYER_LEFT):
+        server_instance.register_event_listener(event, on_server_status_changed)
     
     # 初始化PIM模块
     try:
@@ -320,8 +367,9 @@ async def login(
         if disable_other_admin and account != super_admin_account:
             return JSONResponse({"status": "error", "message": "只有超级管理才能登录。"}, status_code=403)
 
-        if account in user_db["user"] and verify_password(
-            password, user_db["user"][account]
+        # argon2 校验耗时较长，在线程池中执行
+        if account in user_db["user"] and await run_blocking(
+            verify_password, password, user_db["user"][account]
         ):
             # token Generation
             token = secrets.token_hex(16)
@@ -423,6 +471,7 @@ def logout(request: Request):
     return response
 
 app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY)
+app.add_middleware(LoopLagMiddleware, monitor=loop_lag_monitor)
 # ============================================================#
 # Pages
 @app.get("/index", response_class=HTMLResponse)
@@ -760,10 +809,9 @@ async def load_config_file(request: Request, path: str):
     if not request.session.get("logged_in"):
         return JSONResponse({"status": "error", "message": "User not logged in"}, status_code=401)
     try:
-        with open(path, "r", encoding="utf-8") as file:
-            return file.read()
+        return await run_blocking(Path(path).read_text, encoding="utf-8")
     except FileNotFoundError:
-        raise HTTPException(status_code=404, detail=f"{file} file not found")
+        raise HTTPException(status_code=404, detail=f"{path} file not found")
 
 # save config file
 @app.post("/api/save_config_file")
@@ -799,7 +847,7 @@ async def api_control_server(request: Request, control_info: server_control):
 
 # 获取服务器日志
 @app.get("/api/server_logs")
-async def api_get_server_logs(request: Request, start_line: int = 0, max_lines: int = 100):
+async def api_get_server_logs(request: Request, start_line: int = 0, max_lines: int = 100, before_counter: int = 0):
     """获取服务器日志（函数已迁移至 api/server.py）"""
     if not request.session.get("logged_in"):
         return JSONResponse(
@@ -807,7 +855,7 @@ async def api_get_server_logs(request: Request, start_line: int = 0, max_lines:
         )
     server = app.state.server_interface
     global log_watcher
-    return await get_server_logs(request, start_line, max_lines, server, log_watcher)
+    return await get_server_logs(request, start_line, max_lines, server, log_watcher, before_counter)
 
 # 获取新增日志（基于计数器）
 @app.get("/api/new_logs")
@@ -821,6 +869,44 @@ async def api_get_new_logs(request: Request, last_counter: int = 0, max_lines: i
     global log_watcher
     return await get_new_logs(request, last_counter, max_lines, server, log_watcher)
 
+# 搜索日志
+@app.get("/api/logs/search")
+async def api_search_logs(
+    request: Request,
+    q: str = "",
+    regex: bool = False,
+    case_sensitive: bool = False,
+    level: str = "",
+    source: str = "",
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    before_counter: int = 0,
+    limit: int = 100
+):
+    """搜索服务器日志（函数已迁移至 api/server.py）"""
+    if not request.session.get("logged_in"):
+        return JSONResponse(
+            {"status": "error", "message": "User not logged in"}, status_code=401
+        )
+    server = app.state.server_interface
+    global log_watcher
+    return await search_logs(
+        request, q, regex, case_sensitive, level, source, since, until,
+        before_counter, limit, server, log_watcher
+    )
+
+# 实时日志流（SSE）
+@app.get("/api/logs/stream")
+async def api_stream_logs(request: Request, last_counter: int = 0):
+    """推送实时日志（函数已迁移至 api/server.py）"""
+    if not request.session.get("logged_in"):
+        return JSONResponse(
+            {"status": "error", "message": "User not logged in"}, status_code=401
+        )
+    server = app.state.server_interface
+    global log_watcher
+    return await stream_logs(request, last_counter, server, log_watcher)
+
 @app.get("/terminal")
 async def terminal_page(request: Request):
     """提供终端日志页面
@@ -1082,7 +1168,7 @@ async def api_pip_list(request: Request, token_valid: bool = Depends(verify_toke
     if not token_valid:
         return {"status": "error", "message": "未授权访问"}
     
-    return get_installed_pip_packages()
+    return await run_blocking(get_installed_pip_packages)
 
 @app.post("/api/pip/install")
 async def api_pip_install(
@@ -1197,7 +1283,7 @@ async def chat_set_password(request: Request):
 		code = data.get("code", "")
 		password = data.get("password", "")
 		server:PluginServerInterface = app.state.server_interface
-		result = set_chat_user_password(code, password, server)
+		result = await set_chat_user_password(code, password, server)
 
 		status_code = 400 if result.get("status") == "error" else 200
 		return JSONResponse(result, status_code=status_code)
@@ -1223,7 +1309,7 @@ async def chat_login(request: Request):
             client_ip = "unknown"
 
         server:PluginServerInterface = app.state.server_interface
-        result = chat_user_login(player_id, password, client_ip, server)
+        result = await chat_user_login(player_id, password, client_ip, server)
 
         status_code = 400 if result.get("status") == "error" else 200
         if status_code == 400 and "IP已达上限" in result.get("message", ""):
@@ -1283,9 +1369,10 @@ async def get_chat_messages(request: Request):
         before_id = data.get("before_id")  # 新增：获取历史消息
 
         server:PluginServerInterface = app.state.server_interface
-        result = get_chat_messages_handler(limit=limit, offset=offset, after_id=after_id, before_id=before_id, server=server)
+        # 历史消息可能需要读取磁盘上的归档，在线程池中执行
+        result = await run_blocking(get_chat_messages_handler, limit=limit, offset=offset, after_id=after_id, before_id=before_id, server=server)
 
-        return JSONResponse(result)
+        return chat_json_response(result)
 
     except Exception as e:
         server:PluginServerInterface = app.state.server_interface
@@ -1305,9 +1392,9 @@ async def get_new_chat_messages(request: Request):
         player_id_heartbeat = data.get("player_id")
 
         server:PluginServerInterface = app.state.server_interface
-        result = get_new_chat_messages_handler(after_id=after_id, player_id_heartbeat=player_id_heartbeat, server=server)
+        result = await run_blocking(get_new_chat_messages_handler, after_id=after_id, player_id_heartbeat=player_id_heartbeat, server=server)
 
-        return JSONResponse(result)
+        return chat_json_response(result)
 
     except Exception as e:
         server:PluginServerInterface = app.state.server_interface
@@ -1318,6 +1405,46 @@ async def get_new_chat_messages(request: Request):
             "message": f"获取新聊天消息失败: {e}"
         }, status_code=500)
 
+@app.get("/api/chat/stream")
+async def chat_stream_messages(request: Request, after_id: int = 0, player_id: str = ""):
+    """推送新聊天消息和在线列表变化（SSE），替代 get_new_messages 的定时轮询"""
+    server:PluginServerInterface = app.state.server_interface
+    return await stream_chat_messages(request, after_id=after_id, player_id=player_id, server=server)
+
+@app.get("/api/chat/search")
+async def chat_search_messages(
+    request: Request,
+    player: str = "",
+    q: str = "",
+    source: str = "",
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    before_id: int = 0,
+    limit: int = 50
+):
+    """搜索聊天记录（管理员）"""
+    if not request.session.get("logged_in"):
+        return JSONResponse(
+            {"status": "error", "message": "User not logged in"}, status_code=401
+        )
+    try:
+        # 搜索需要读取和解码磁盘上的消息，在线程池中执行
+        result = await run_blocking(
+            search_chat_messages_handler,
+            player=player, q=q, source=source, since=since, until=until,
+            before_id=before_id, limit=limit
+        )
+        status_code = 200
+        if result.get("status") == "error":
+            status_code = 503 if result.get("indexing") else 400
+        return chat_json_response(result, status_code=status_code)
+
+    except Exception as e:
+        server:PluginServerInterface = app.state.server_interface
+        if server:
+            server.logger.error(f"搜索聊天消息失败: {e}")
+        return JSONResponse({"status": "error", "message": f"搜索聊天消息失败: {e}"}, status_code=500)
+
 @app.post("/api/chat/clear_messages")
 async def chat_clear_messages(request: Request):
     """清空聊天消息"""
@@ -1343,7 +1470,7 @@ async def send_chat_message(request: Request):
         session_id = data.get("session_id", "")
 
         server:PluginServerInterface = app.state.server_interface
-        result = send_chat_message_handler(message=message, player_id=player_id, session_id=session_id, server=server)
+        result = await send_chat_message_handler(message=message, player_id=player_id, session_id=session_id, server=server)
 
         status_code = 400 if result.get("status") == "error" else 200
         if status_code == 400 and "过于频繁" in result.get("message", ""):
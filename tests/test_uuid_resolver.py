@@ -0,0 +1,172 @@
+"""UUIDResolver 测试，查询函数替换为本地桩，不访问 Mojang 接口
+
+在仓库根目录运行：python -m pytest tests
+"""
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+
+UUID_RESOLVER_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'guguwebui', 'utils', 'uuid_resolver.py'
+)
+
+
+def load_uuid_resolver():
+    """直接按文件加载 uuid_resolver，避免导入插件包时依赖 MCDR 和 FastAPI"""
+    spec = importlib.util.spec_from_file_location('_test_uuid_resolver', UUID_RESOLVER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+uuid_resolver = load_uuid_resolver()
+
+STEVE_UUID = '8667ba71-b85a-4004-af54-457a9734eed7'
+
+
+class StubLookup:
+    """记录每次批量查询的玩家名，返回 known 中存在的玩家"""
+
+    def __init__(self, known=None, error=None):
+        self.known = known or {}
+        self.error = error
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, names):
+        with self._lock:
+            self.calls.append(list(names))
+        if self.error is not None:
+            raise self.error
+        return {name: self.known[name] for name in names if name in self.known}
+
+
+def fake_uuid(index: int) -> str:
+    return f'00000000-0000-0000-0000-{index:012d}'
+
+
+@pytest.fixture
+def usercache(tmp_path):
+    path = tmp_path / 'usercache.json'
+    path.write_text(json.dumps([{'name': 'Steve', 'uuid': STEVE_UUID.replace('-', '')}]), encoding='utf-8')
+    return str(path)
+
+
+def make_resolver(usercache, lookup, **kwargs):
+    kwargs.setdefault('batch_delay', 0.05)
+    return uuid_resolver.UUIDResolver(lambda: usercache, lookup=lookup, **kwargs)
+
+
+def test_usercache_hit_skips_lookup(usercache):
+    lookup = StubLookup()
+    resolver = make_resolver(usercache, lookup)
+    try:
+        assert resolver.resolve('steve') == STEVE_UUID
+        assert resolver.resolve('STEVE', timeout=1) == STEVE_UUID
+        assert lookup.calls == []
+    finally:
+        resolver.close()
+
+
+def test_online_result_is_cached(usercache):
+    lookup = StubLookup({'alex': fake_uuid(1)})
+    resolver = make_resolver(usercache, lookup)
+    try:
+        assert resolver.resolve('Alex', timeout=2) == fake_uuid(1)
+        assert resolver.resolve('alex') == fake_uuid(1)
+        assert lookup.calls == [['alex']]
+    finally:
+        resolver.close()
+
+
+def test_miss_does_not_wait(usercache):
+    lookup = StubLookup({'alex': fake_uuid(1)})
+    resolver = make_resolver(usercache, lookup, batch_delay=0.5)
+    try:
+        start = time.monotonic()
+        assert resolver.resolve('alex') is None
+        assert time.monotonic() - start < 0.1
+    finally:
+        resolver.close()
+
+
+def test_negative_ttl(usercache):
+    lookup = StubLookup()
+    resolver = make_resolver(usercache, lookup, negative_ttl=0.3)
+    try:
+        assert resolver.resolve('nobody', timeout=2) is None
+        assert resolver.resolve('nobody', timeout=2) is None
+        assert len(lookup.calls) == 1
+
+        time.sleep(0.35)
+        assert resolver.resolve('nobody', timeout=2) is None
+        assert len(lookup.calls) == 2
+    finally:
+        resolver.close()
+
+
+def test_lookup_error_uses_error_ttl(usercache):
+    lookup = StubLookup(error=RuntimeError('network down'))
+    resolver = make_resolver(usercache, lookup, negative_ttl=600, error_ttl=0.3)
+    try:
+        assert resolver.resolve('alex', timeout=2) is None
+        assert resolver.resolve('alex', timeout=2) is None
+        assert len(lookup.calls) == 1
+
+        time.sleep(0.35)
+        lookup.error = None
+        lookup.known = {'alex': fake_uuid(1)}
+        assert resolver.resolve('alex', timeout=2) == fake_uuid(1)
+    finally:
+        resolver.close()
+
+
+def test_concurrent_misses_are_batched(usercache):
+    names = [f'player{i}' for i in range(uuid_resolver.MOJANG_BULK_LIMIT + 5)]
+    lookup = StubLookup({name: fake_uuid(i) for i, name in enumerate(names)})
+    resolver = make_resolver(usercache, lookup, batch_delay=0.2)
+    try:
+        for name in names:
+            assert resolver.resolve(name) is None
+        for i, name in enumerate(names):
+            assert resolver.resolve(name, timeout=2) == fake_uuid(i)
+
+        assert [len(call) for call in lookup.calls] == [uuid_resolver.MOJANG_BULK_LIMIT, 5]
+        assert sorted(sum(lookup.calls, [])) == sorted(names)
+    finally:
+        resolver.close()
+
+
+def test_close_stops_worker_and_wakes_waiters(usercache):
+    release = threading.Event()
+
+    def slow_lookup(names):
+        release.wait(2)
+        return {}
+
+    resolver = make_resolver(usercache, slow_lookup)
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(resolver.resolve('alex', timeout=5)))
+    waiter.start()
+    time.sleep(0.1)
+    assert resolver.resolve('bob') is None
+
+    release.set()
+    resolver.close()
+    waiter.join(3)
+    assert not waiter.is_alive()
+    assert results == [None]
+    assert resolver._worker is None or not resolver._worker.is_alive()
+
+    # 关闭后不再启动后台线程，缓存仍可查询
+    assert resolver.resolve('carol') is None
+    assert resolver._worker is None or not resolver._worker.is_alive()
+    assert resolver.resolve('steve') == STEVE_UUID
@@ -0,0 +1,80 @@
+"""clean_color_codes 微基准
+
+对比旧的逐条 re.sub 实现与当前的预编译实现（§ 代码和 ANSI 代码各扫描一次），并校验两者输出一致。
+在仓库根目录运行：python tool/bench_clean_color_codes.py
+"""
+import importlib.util
+import os
+import re
+import sys
+import timeit
+
+LOG_WATCHER_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'guguwebui', 'utils', 'log_watcher.py'
+)
+
+
+def load_clean_color_codes():
+    """直接按文件加载 log_watcher，避免导入插件包时依赖 MCDR 和 FastAPI"""
+    package_dir = os.path.dirname(LOG_WATCHER_PATH)
+    package = type(sys)('_bench_utils')
+    package.__path__ = [package_dir]
+    sys.modules['_bench_utils'] = package
+    spec = importlib.util.spec_from_file_location('_bench_utils.log_watcher', LOG_WATCHER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module.clean_color_codes
+
+
+def legacy_clean_color_codes(text):
+    """优化前的实现"""
+    text = re.sub(r'§[0-9a-fk-or]', '', text)
+    ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+    text = ansi_escape.sub('', text)
+    text = re.sub(r'\[\d+m', '', text)
+    text = re.sub(r'\[\d+(?:;\d+)*m', '', text)
+    text = re.sub(r'\[0m', '', text)
+    text = re.sub(r'(?<!\[)\[\d*[a-z](?!\])', '', text)
+    return text
+
+
+SAMPLES = [
+    'Preparing spawn area: 42%',
+    'Player123 joined the game',
+    '<Steve> hello world',
+    'Done (12.345s)! For help, type "help"',
+    '[Server thread/INFO]: Saving chunks for level \'ServerLevel[world]\'/minecraft:overworld',
+    '\x1b[37m[\x1b[2m12:00:00\x1b[0m\x1b[37m] [MainThread/INFO]\x1b[0m: Server is running',
+    '§6[MCDR] §a插件 §b§lguguwebui§r 加载完成',
+    '[37m[2m[MCDR][0m [37;1mTaskExecutor[0m: 正在处理任务',
+    'Can\'t keep up! Is the server overloaded? Running 2034ms or 40 ticks behind',
+    '\x1b[1;31mERROR\x1b[0m Exception in thread "main" java.lang.NullPointerException',
+]
+
+# 只校验输出、不计入耗时的边界情况：§ 代码夹在 ANSI 代码中间
+EDGE_CASES = [
+    '[§a3m',
+    '\x1b§a[31m',
+]
+
+
+def main():
+    clean_color_codes = load_clean_color_codes()
+
+    for sample in SAMPLES + EDGE_CASES:
+        expected = legacy_clean_color_codes(sample)
+        actual = clean_color_codes(sample)
+        if expected != actual:
+            print(f'输出不一致: {sample!r}\n  旧: {expected!r}\n  新: {actual!r}')
+            sys.exit(1)
+
+    rounds = 20000
+    for name, func in (('legacy', legacy_clean_color_codes), ('current', clean_color_codes)):
+        elapsed = timeit.timeit(lambda: [func(s) for s in SAMPLES], number=rounds)
+        per_line = elapsed / (rounds * len(SAMPLES)) * 1e6
+        print(f'{name:>8}: {elapsed:.3f}s, {per_line:.2f} us/line')
+
+
+if __name__ == '__main__':
+    main()
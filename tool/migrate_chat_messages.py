@@ -0,0 +1,57 @@
+"""聊天记录格式迁移
+
+把旧版（v1/v2）guguwebui_static/chat_messages.bin 转换为带文件头、帧标记和 CRC 的 v3 格式，
+原文件保留为 chat_messages.bin.legacy.bak。插件启动时也会自动完成同样的转换，本脚本用于在
+停服状态下提前迁移或检查大文件。请先停止 MCDR，在服务器根目录运行：
+
+    python <仓库或插件目录>/tool/migrate_chat_messages.py [guguwebui_static 目录]
+"""
+import importlib.util
+import os
+import sys
+import time
+
+CHAT_LOGGER_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'guguwebui', 'utils', 'chat_logger.py'
+)
+
+
+def load_chat_logger():
+    """直接按文件加载 chat_logger，避免导入插件包时依赖 MCDR 和 FastAPI"""
+    package_dir = os.path.dirname(CHAT_LOGGER_PATH)
+    package = type(sys)('_migrate_utils')
+    package.__path__ = [package_dir]
+    sys.modules['_migrate_utils'] = package
+    spec = importlib.util.spec_from_file_location('_migrate_utils.chat_logger', CHAT_LOGGER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def main():
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else 'guguwebui_static'
+    path = os.path.join(data_dir, 'chat_messages.bin')
+    if not os.path.isfile(path):
+        print(f'未找到聊天记录文件: {path}')
+        sys.exit(1)
+
+    chat_logger = load_chat_logger()
+    with open(path, 'rb') as f:
+        header = f.read(chat_logger.FILE_HEADER.size)
+    if chat_logger.is_current_format(header):
+        print('聊天记录已是当前格式，无需迁移')
+        return
+
+    start = time.perf_counter()
+    count = chat_logger.migrate_chat_file(path)
+    # 位置索引指向旧文件的偏移，删除后由插件启动时重建
+    positions_path = os.path.join(data_dir, 'message_positions.bin')
+    if os.path.exists(positions_path):
+        os.remove(positions_path)
+    print(f'已转换 {count} 条消息，用时 {time.perf_counter() - start:.2f}s，'
+          f'原文件备份为 {path}{chat_logger.LEGACY_BACKUP_SUFFIX}')
+
+
+if __name__ == '__main__':
+    main()